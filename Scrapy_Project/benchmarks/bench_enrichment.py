@@ -0,0 +1,181 @@
+"""
+Ext_* spec enrichment of a dataset: the rule table compiled into
+SpecExtractor against the hand-written finders it replaced, applied per row
+with DataFrame.apply like enrich_dataframe did before.
+
+Both must return the same Ext_RAM/Ext_SSD/Ext_CPU/Ext_GPU for every row of
+the datasets in data/ (and any --dataset given). The only accepted
+differences are values of rules the old finders did not have (AMD RX GPUs,
+Apple M chips) where they found nothing. Timing runs on --rows rows sampled
+from those datasets, every row with its own title and description so no
+work is shared between repeated texts; --repeated keeps the sampled texts
+as they are. Run inside Scrapy_Project/:
+
+    python -m benchmarks.bench_enrichment
+    python -m benchmarks.bench_enrichment --rows 100000
+"""
+
+import argparse
+import glob
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+
+from dataset_viewer.feature_extractor import enrich_dataframe
+from ebay_scraper.storage import load_listings
+
+LEGACY_COLUMNS = ['Ext_RAM', 'Ext_SSD', 'Ext_CPU', 'Ext_GPU']
+# Values only rules added after the old finders can produce
+NEW_RULE_VALUES = ("AMD RX ", "Apple M")
+
+
+def legacy_find_ram(text):
+    if not isinstance(text, str): return None
+    for m in re.findall(r'\b(\d{1,3})\s*GB(?:\s*(?:RAM|DDR|Arbeitsspeicher)|$)', text, re.IGNORECASE):
+        if 4 <= int(m) <= 128:
+            return int(m)
+    return None
+
+
+def legacy_find_ssd(text):
+    if not isinstance(text, str): return None
+    match_tb = re.search(r'\b(\d{1,2})\s*TB', text, re.IGNORECASE)
+    if match_tb:
+        return int(match_tb.group(1)) * 1000
+    for m in re.findall(r'\b(\d{3,4})\s*GB', text, re.IGNORECASE):
+        if int(m) >= 120:
+            return int(m)
+    return None
+
+
+def legacy_find_cpu_gen(text):
+    if not isinstance(text, str): return None
+    match_intel = re.search(r'i[3579][\s-]*(\d{3,5})', text, re.IGNORECASE)
+    if match_intel:
+        model_str = match_intel.group(1)
+        if len(model_str) == 3:
+            return "Intel Gen 01"
+        prefix_2 = int(model_str[:2])
+        return f"Intel Gen {prefix_2}" if 10 <= prefix_2 <= 19 else f"Intel Gen 0{model_str[0]}"
+    match_amd = re.search(r'Ryzen(?:[\s-]*[3579])?[\s-]+(\d{4})', text, re.IGNORECASE)
+    if match_amd:
+        return f"AMD Ryzen {match_amd.group(1)[0]}000 Series"
+    return None
+
+
+def legacy_find_gpu(text):
+    if not isinstance(text, str): return None
+    t = text.upper()
+    for series, pattern in (("RTX", r'RTX\s*-?(\d{4})(?:\s*(TI|SUPER))?'), ("GTX", r'GTX\s*-?(\d{3,4})(?:\s*(TI|SUPER))?')):
+        match = re.search(pattern, t)
+        if match:
+            return f"NVIDIA {series} {match.group(1)}" + (f" {match.group(2)}" if match.group(2) else "")
+    return None
+
+
+def legacy_enrich(df):
+    """enrich_dataframe before the rule table: the old finders, one apply call per row."""
+
+    def extract_row(row):
+        title = str(row.get('Artikelstitel', ''))
+        desc = str(row.get('Artikelsbeschreibung', ''))
+
+        def find_spec(func):
+            res = func(title)
+            if not res: res = func(desc)
+            return res
+
+        return pd.Series([find_spec(legacy_find_ram), find_spec(legacy_find_ssd),
+                          find_spec(legacy_find_cpu_gen), find_spec(legacy_find_gpu)])
+
+    df[LEGACY_COLUMNS] = df.apply(extract_row, axis=1)
+    return df
+
+
+def check_equivalence(name, df):
+    """(mismatches, RX/Apple values in the legacy columns, Ext_Display values) of one dataset."""
+    expected = legacy_enrich(df.copy())[LEGACY_COLUMNS]
+    enriched = enrich_dataframe(df.copy())
+    actual = enriched[LEGACY_COLUMNS]
+    mismatches = added = 0
+    for column in LEGACY_COLUMNS:
+        for row, (old, new) in enumerate(zip(expected[column], actual[column])):
+            if (pd.isna(old) and pd.isna(new)) or old == new:
+                continue
+            if pd.isna(old) and isinstance(new, str) and new.startswith(NEW_RULE_VALUES):
+                added += 1
+                continue
+            mismatches += 1
+            print(f"!!! Mismatch in {name}, row {row}, {column}: legacy {old!r}, rule table {new!r}")
+        if expected[column].dtype != actual[column].dtype:
+            mismatches += 1
+            print(f"!!! {name}, {column}: dtype {expected[column].dtype} vs {actual[column].dtype}")
+    return mismatches, added, int(enriched['Ext_Display'].notna().sum())
+
+
+def sample_rows(listings, rows, unique, seed=0):
+    rng = random.Random(seed)
+    sample = []
+    for number in range(rows):
+        listing = dict(rng.choice(listings))
+        if unique:
+            # Numbers that none of the patterns match, at both ends so every text is distinct
+            listing['Artikelstitel'] = f"{listing.get('Artikelstitel', '')} #{number}"
+            listing['Artikelsbeschreibung'] = f"#{number} {listing.get('Artikelsbeschreibung', '')}"
+        sample.append(listing)
+    return pd.DataFrame(sample)
+
+
+def timed(enrich, df):
+    start = time.perf_counter()
+    enrich(df.copy())
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark spec enrichment of datasets")
+    parser.add_argument("--dataset", action="append", default=[], help="Extra dataset file (repeatable)")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows of the timed dataset")
+    parser.add_argument("--repeated", action="store_true", help="Keep the repeated texts of the sample")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the rule table")
+    args = parser.parse_args(argv)
+
+    mismatches = added = displays = 0
+    listings = []
+    for filename in sorted(glob.glob("data/*.json")) + args.dataset:
+        dataset = load_listings(filename)
+        if not dataset:
+            continue
+        listings += dataset
+        dataset_mismatches, dataset_added, dataset_displays = check_equivalence(filename, pd.DataFrame(dataset))
+        mismatches += dataset_mismatches
+        added += dataset_added
+        displays += dataset_displays
+    if not listings:
+        print("No datasets found in data/")
+        return 1
+
+    df = sample_rows(listings, args.rows, not args.repeated)
+    fast = timed(enrich_dataframe, df)
+    legacy = None if args.skip_legacy else timed(legacy_enrich, df)
+
+    print("==========================================")
+    print("Spec Enrichment Benchmark")
+    print("==========================================")
+    print(f"Equivalence:  {len(listings)} shipped rows, {mismatches} mismatches, "
+          f"{added} RX/Apple values in the legacy columns")
+    print(f"Ext_Display:  {displays} of {len(listings)} rows with a value (no legacy finder)")
+    print(f"Timed:        {len(df)} rows ({'sampled' if args.repeated else 'unique'} texts)")
+    if legacy is not None:
+        print(f"Row apply:    {legacy:8.3f} s")
+    print(f"Rule table:   {fast:8.3f} s")
+    if legacy is not None and fast:
+        print(f"Speed-up:     {legacy / fast:.1f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
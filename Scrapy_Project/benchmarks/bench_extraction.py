@@ -0,0 +1,192 @@
+"""
+CPU cost per article page: the single-pass extract_article() against the
+per-field XPath chain parse_article_page used before.
+
+Pages come from the recorded-page templates in benchmarks/fixtures/ (plus
+an older-layout and a JSON-LD variant of each), and from every *.html file
+in --pages-dir, e.g. article pages saved from the browser. Both extractors
+must return the same fields for every HTML-only page, and decimal prices
+(JSON-LD "149.99", HTML "149,99 €") must be stored as whole euros. Run inside
+Scrapy_Project/:
+
+    python -m benchmarks.bench_extraction --articles 500 --repeat 5
+    python -m benchmarks.bench_extraction --pages-dir ~/saved_articles
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+from scrapy.http import HtmlResponse
+
+from benchmarks.fixtures import NEW_BASE, FixtureSite, ad_details
+from ebay_scraper.extraction import extract_article
+from ebay_scraper.items import EbayScraperItem
+
+
+def legacy_extract(response):
+    """The per-field XPath chain of parse_article_page before extract_article()."""
+    article_title = response.xpath("//h1[@id='viewad-title']/text()").get()
+    if not article_title:
+        article_title = response.xpath("//h1[@class='boxedarticle--title']//text()").get()
+    if not article_title:
+        return None
+    article_title = article_title.strip()
+
+    article_price = response.xpath("//h2[@id='viewad-price']/text()").get()
+    if not article_price:
+        article_price = response.xpath("//h2[@class='boxedarticle--price']//text()").get()
+    if article_price:
+        article_price = re.sub(r"[€VB\s]", "", article_price).strip().replace(".", "")
+        if article_price == "":
+            article_price = "0"
+    else:
+        article_price = "0"
+
+    desc_lines = response.xpath("//div[@id='viewad-description-text']//text()").extract()
+    if not desc_lines:
+        desc_lines = response.xpath("//p[@itemprop='description']//text()").extract()
+    article_description = " ".join([line.strip() for line in desc_lines if line.strip()])
+
+    locality = response.xpath('//span[@id="viewad-locality"]/text()').get()
+    if locality:
+        locality = locality.strip()
+    else:
+        loc_raw = response.xpath('//div[@itemprop="address"]/span[@itemprop="locality"]/text()').get()
+        locality = loc_raw.strip() if loc_raw else "Unknown"
+
+    date = response.xpath('//div[@id="viewad-extra-info"]/div/span/text()').get()
+    if date:
+        date = date.strip()
+
+    seller_link = response.xpath("//a[contains(@href, 'userId=')]/@href").get()
+    seller_id = seller_link.split("userId=")[-1].split("&")[0] if seller_link else "0"
+
+    return {
+        "Preis": article_price,
+        "Seller_ID": seller_id,
+        "Artikelstitel": article_title,
+        "Artikelsbeschreibung": article_description,
+        "Date": date,
+        "Place": locality,
+    }
+
+
+def older_layout(html):
+    # Same page without the viewad-* ids, only the boxedarticle classes/itemprops
+    html = html.replace(' id="viewad-title" class="boxedarticle--title"', ' class="boxedarticle--title"')
+    html = html.replace(' id="viewad-price" class="boxedarticle--price"', ' class="boxedarticle--price"')
+    html = html.replace(' id="viewad-locality"', '')
+    return html
+
+
+def with_json_ld(html, number, price=None):
+    details = ad_details(number)
+    data = {
+        "@context": "https://schema.org",
+        "@type": "Product",
+        "name": details["Artikelstitel"],
+        "description": details["Artikelsbeschreibung"],
+        "offers": {"@type": "Offer", "price": price or str(details["Preis"]), "priceCurrency": "EUR"},
+    }
+    script = f'<script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+    return html.replace("</head>", f"    {script}\n</head>")
+
+
+def build_pages(articles, pages_dir=None):
+    """(name, url, html, structured) for every page of the run."""
+    site = FixtureSite()
+    pages = []
+    for i in range(articles):
+        number = NEW_BASE + i
+        url = ad_details(number)["URL"]
+        html = site.article_page(number)
+        variant = i % 3
+        if variant == 0:
+            pages.append(("fixture", url, html, False))
+        elif variant == 1:
+            pages.append(("fixture-older-layout", url, older_layout(html), False))
+        else:
+            pages.append(("fixture-json-ld", url, with_json_ld(html, number), True))
+
+    if pages_dir:
+        for filename in sorted(glob.glob(os.path.join(os.path.expanduser(pages_dir), "*.html"))):
+            with open(filename, 'r', encoding='utf-8') as page_file:
+                html = page_file.read()
+            url = f"https://www.kleinanzeigen.de/s-anzeige/recorded/{os.path.basename(filename)}"
+            pages.append(("recorded", url, html, '"application/ld+json"' in html))
+    return pages
+
+
+def run(extractor, pages, repeat):
+    # A fresh response per call: HTML parsing is part of the cost per article
+    bodies = [(url, html.encode("utf-8")) for _, url, html, _ in pages]
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        for url, body in bodies:
+            extractor(HtmlResponse(url=url, body=body, encoding="utf-8"))
+    return time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+
+def check_equivalence(pages):
+    mismatches = 0
+    for name, url, html, structured in pages:
+        if structured:
+            continue
+        response = HtmlResponse(url=url, body=html.encode("utf-8"), encoding="utf-8")
+        expected, actual = legacy_extract(response), extract_article(response)
+        if expected != actual:
+            mismatches += 1
+            print(f"!!! Mismatch on {name} page {url}:\n    legacy: {expected}\n    fast:   {actual}")
+    return mismatches
+
+
+def check_decimal_prices():
+    """Decimal prices of both page kinds, stored through EbayScraperItem like the spider does."""
+    site = FixtureSite()
+    number = NEW_BASE
+    html = site.article_page(number)
+    html_price = re.sub(r'(id="viewad-price"[^>]*>)[^<]*', r'\g<1>149,99 € VB', html)
+    pages = [("json-ld-decimal", with_json_ld(html, number, "149.99")), ("html-decimal", html_price)]
+    mismatches = 0
+    for name, page in pages:
+        url = ad_details(number)["URL"]
+        raw = extract_article(HtmlResponse(url=url, body=page.encode("utf-8"), encoding="utf-8"))
+        item = EbayScraperItem.from_raw(ID="decimal", URL=url, **raw)
+        if item.Preis != 150:
+            mismatches += 1
+            print(f"!!! Decimal price on {name} page stored as {item.Preis}, expected 150")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark article page extraction")
+    parser.add_argument("--articles", type=int, default=300, help="Fixture article pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pages-dir", help="Folder with saved article pages (*.html)")
+    args = parser.parse_args(argv)
+
+    pages = build_pages(args.articles, args.pages_dir)
+    mismatches = check_equivalence(pages) + check_decimal_prices()
+
+    calls = len(pages) * args.repeat
+    legacy_cpu, legacy_wall = run(legacy_extract, pages, args.repeat)
+    fast_cpu, fast_wall = run(extract_article, pages, args.repeat)
+
+    print("==========================================")
+    print("Article Extraction Benchmark")
+    print("==========================================")
+    print(f"Pages:        {len(pages)} ({args.repeat}x), {mismatches} mismatches")
+    print(f"{'':<14}{'CPU/article':>14}{'wall/article':>14}")
+    print(f"{'XPath chain':<14}{1e6 * legacy_cpu / calls:>11.0f} us{1e6 * legacy_wall / calls:>11.0f} us")
+    print(f"{'single pass':<14}{1e6 * fast_cpu / calls:>11.0f} us{1e6 * fast_wall / calls:>11.0f} us")
+    print(f"Speed-up:     {legacy_cpu / fast_cpu:.2f}x CPU" if fast_cpu else "")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
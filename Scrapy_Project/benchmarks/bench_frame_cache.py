@@ -0,0 +1,121 @@
+"""
+The viewer's on-disk frame cache (dataset_viewer/frame_cache.py) on a
+synthetic dataset of --rows listings sampled from data/*.json, each with its
+own ID and texts.
+
+Times a load without the cache (parse + enrich, what every viewer start did
+before), the first load that writes the cache, a cache hit, a hit after only
+the mtime changed, and an incremental update after --append new listings and
+--changed price changes. The updated frame must equal a full rebuild. The
+frame is built with enrich_dataframe, the viewer's build_frame needs
+streamlit. Run inside Scrapy_Project/ (pyarrow required):
+
+    python -m benchmarks.bench_frame_cache --rows 100000
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from dataset_viewer import frame_cache
+from dataset_viewer.feature_extractor import EXTRACTOR_VERSION, enrich_dataframe
+from ebay_scraper.storage import load_listings
+
+
+def build(listings):
+    return enrich_dataframe(pd.DataFrame(listings)) if listings else pd.DataFrame()
+
+
+def synthetic_listings(templates, rows, seed=0):
+    rng = random.Random(seed)
+    listings = []
+    for number in range(rows):
+        listing = dict(rng.choice(templates))
+        listing['ID'] = f"bench-{number}"
+        listing['Artikelstitel'] = f"{listing.get('Artikelstitel', '')} #{number}"
+        listing['Artikelsbeschreibung'] = f"#{number} {listing.get('Artikelsbeschreibung', '')}"
+        listings.append(listing)
+    return listings
+
+
+def write_dataset(filename, listings):
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump(listings, file, ensure_ascii=False, indent=4)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def same_frame(actual, expected):
+    if list(actual.columns) != list(expected.columns) or len(actual) != len(expected):
+        return False
+    for column in expected.columns:
+        for new, old in zip(actual[column], expected[column]):
+            if not ((pd.isna(new) and pd.isna(old)) or new == old):
+                return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the viewer's on-disk frame cache")
+    parser.add_argument("--rows", type=int, default=100000, help="Listings in the dataset")
+    parser.add_argument("--append", type=int, default=200, help="New listings for the incremental update")
+    parser.add_argument("--changed", type=int, default=50, help="Price changes for the incremental update")
+    args = parser.parse_args(argv)
+
+    if frame_cache.pa is None:
+        print("pyarrow is not installed, the frame cache is disabled")
+        return 1
+    templates = [listing for filename in sorted(glob.glob("data/*.json")) for listing in load_listings(filename)]
+    if not templates:
+        print("No datasets found in data/")
+        return 1
+
+    listings = synthetic_listings(templates, args.rows + args.append)
+    with tempfile.TemporaryDirectory(prefix="ka_frame_cache_") as workdir:
+        filename = os.path.join(workdir, "bench.json")
+        write_dataset(filename, listings[:args.rows])
+        dataset_mb = os.path.getsize(filename) / 1e6
+
+        _, uncached = timed(lambda: build(load_listings(filename)))
+        _, first = timed(frame_cache.load_frame, filename, build, EXTRACTOR_VERSION)
+        _, hit = timed(frame_cache.load_frame, filename, build, EXTRACTOR_VERSION)
+        os.utime(filename)
+        _, touched = timed(frame_cache.load_frame, filename, build, EXTRACTOR_VERSION)
+
+        updated = listings[:args.rows + args.append]
+        for listing in random.Random(1).sample(updated[:args.rows], min(args.changed, args.rows)):
+            listing['Preis'] = 1
+        write_dataset(filename, updated)
+        incremental_df, incremental = timed(frame_cache.load_frame, filename, build, EXTRACTOR_VERSION)
+        equal = same_frame(incremental_df, build(load_listings(filename)))
+
+        meta_file, _ = frame_cache.cache_files(filename)
+        cache_mb = sum(os.path.getsize(os.path.join(os.path.dirname(meta_file), name))
+                       for name in os.listdir(os.path.dirname(meta_file))) / 1e6
+
+    print("==========================================")
+    print("Viewer Frame Cache Benchmark")
+    print("==========================================")
+    print(f"Dataset:      {args.rows} listings, {dataset_mb:.1f} MB JSON, cache {cache_mb:.1f} MB")
+    print(f"No cache:     {uncached:8.3f} s  (parse + enrich)")
+    print(f"First load:   {first:8.3f} s  (build + write cache)")
+    print(f"Cache hit:    {hit:8.3f} s")
+    print(f"Touched:      {touched:8.3f} s  (mtime changed, same content hash)")
+    print(f"Incremental:  {incremental:8.3f} s  (+{args.append} listings, {args.changed} price changes)")
+    print(f"Equivalence:  {'incremental frame equals full rebuild' if equal else '!!! incremental frame differs from full rebuild'}")
+    return 0 if equal else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Offline end-to-end benchmark of KleinanzeigenSpider.
+
+Runs the spider with the project's pipeline against a synthetic FixtureSite
+served by ReplayDownloadHandler, on top of a pre-filled dataset of any size,
+and reports throughput, time spent per callback and persistence time.
+Nothing is sent to kleinanzeigen.de. Run inside Scrapy_Project/:
+
+    python -m benchmarks.bench_spider --pages 40 --existing 10000 --known-ratio 0.3
+    python -m benchmarks.bench_spider --storage sqlite --json results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from benchmarks.fixtures import FixtureSite, existing_listings
+from ebay_scraper.duplicates import DuplicateIndex
+from ebay_scraper.enrichment import enrich_listings
+from ebay_scraper.spiders.kleinanzeigen_spider import KleinanzeigenSpider
+from ebay_scraper.storage import STORAGE_ENGINES, open_listing_store
+
+
+class TimedKleinanzeigenSpider(KleinanzeigenSpider):
+    """Measures start-up (dataset + index load) and the time spent inside each callback."""
+
+    name = "kleinanzeigen_benchmark"
+
+    def __init__(self, *args, **kwargs):
+        start = time.perf_counter()
+        super(TimedKleinanzeigenSpider, self).__init__(*args, **kwargs)
+        self.startup_time = time.perf_counter() - start
+        self.callback_times = defaultdict(list)
+
+    def _timed(self, name, results):
+        # Callbacks are generators, the work happens while they are consumed
+        start = time.perf_counter()
+        results = list(results or [])
+        self.callback_times[name].append(time.perf_counter() - start)
+        return results
+
+    def parse(self, response, **kwargs):
+        return self._timed("parse", super(TimedKleinanzeigenSpider, self).parse(response, **kwargs))
+
+    def parse_article_page(self, response):
+        return self._timed("parse_article_page", super(TimedKleinanzeigenSpider, self).parse_article_page(response))
+
+
+def prepare_job(workdir, site, args):
+    output_filename = "bench.jsonl" if args.storage == "jsonl" else "bench.json"
+    data_dir = os.path.join(workdir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    store = open_listing_store(os.path.join(data_dir, output_filename), args.storage)
+    # Stored listings are enriched already, the crawl must not redo them all
+    listings = enrich_listings(existing_listings(args.existing), geocode=False)
+    store.add_listings(listings)
+    store.close()
+    # A job's duplicate index is kept up to date as it stores listings, seed it like that
+    duplicate_index = DuplicateIndex(os.path.join(workdir, "state", "duplicates.sqlite"))
+    duplicate_index.add_many(listings)
+    duplicate_index.close()
+    fill_time = time.perf_counter() - start
+
+    config = {
+        "task_name": "Benchmark",
+        "output_filename": output_filename,
+        "storage": args.storage,
+        "scrape_next_pages": True,
+        "pagination_mode": args.pagination,
+        "detail_mode": args.detail_mode,
+        # The fixture's template ads are near-duplicates of each other
+        "skip_duplicate_details": args.skip_duplicate_details,
+        # Crawl every page, the stop rules are not what is measured here
+        "stop_after_known": 10 ** 9,
+        "stop_after_known_unsorted": 10 ** 9,
+        "start_urls": [site.start_url],
+    }
+    job_file = os.path.join(workdir, "job_benchmark.json")
+    with open(job_file, 'w', encoding='utf-8') as file:
+        json.dump(config, file)
+    return job_file, data_dir, fill_time
+
+
+def summarize(spider, stats, args, fill_time):
+    elapsed = stats.get("elapsed_time_seconds") or 0.0
+    responses = stats.get("downloader/response_count", 0)
+    items = stats.get("item_scraped_count", 0)
+    callbacks = {}
+    for name, times in spider.callback_times.items():
+        callbacks[name] = {
+            "calls": len(times),
+            "total_s": sum(times),
+            "mean_ms": 1000 * sum(times) / len(times) if times else 0.0,
+            "max_ms": 1000 * max(times) if times else 0.0,
+        }
+    return {
+        "config": vars(args),
+        "existing_listings": args.existing,
+        "dataset_fill_s": fill_time,
+        "startup_s": spider.startup_time,
+        "elapsed_s": elapsed,
+        "responses": responses,
+        "items": items,
+        "pages_per_s": responses / elapsed if elapsed else 0.0,
+        "items_per_s": items / elapsed if elapsed else 0.0,
+        "callbacks": callbacks,
+        "persistence": {
+            "flushes": stats.get("persistence/flushes", 0),
+            "total_s": stats.get("persistence/flush_time", 0.0),
+            "listings_added": stats.get("persistence/listings_added", 0),
+            "prices_updated": stats.get("persistence/prices_updated", 0),
+            "duplicates_found": stats.get("duplicates/found", 0),
+        },
+    }
+
+
+def print_report(result):
+    print("==========================================")
+    print("Spider Benchmark (offline replay)")
+    print("==========================================")
+    print(f"Dataset:      {result['existing_listings']} existing listings ({result['config']['storage']}), "
+          f"filled in {result['dataset_fill_s']:.2f}s")
+    print(f"Start-up:     {result['startup_s'] * 1000:.1f} ms (store + index load)")
+    print(f"Crawl:        {result['responses']} responses, {result['items']} items in {result['elapsed_s']:.2f}s")
+    print(f"Throughput:   {result['pages_per_s']:.1f} pages/s, {result['items_per_s']:.1f} items/s")
+    for name, timing in sorted(result["callbacks"].items()):
+        print(f"Callback:     {name:<20} {timing['calls']:>6} calls  total {timing['total_s']:.3f}s  "
+              f"mean {timing['mean_ms']:.2f} ms  max {timing['max_ms']:.2f} ms")
+    persistence = result["persistence"]
+    print(f"Persistence:  {persistence['flushes']} flushes, {persistence['total_s']:.3f}s total, "
+          f"{persistence['listings_added']} added, {persistence['prices_updated']} prices updated, "
+          f"{persistence['duplicates_found']} duplicates")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for KleinanzeigenSpider")
+    parser.add_argument("--pages", type=int, default=20, help="Search result pages")
+    parser.add_argument("--ads-per-page", type=int, default=25)
+    parser.add_argument("--existing", type=int, default=10000, help="Listings already in the dataset")
+    parser.add_argument("--known-ratio", type=float, default=0.3, help="Share of search cards that are already known")
+    parser.add_argument("--storage", choices=STORAGE_ENGINES, default="jsonl")
+    parser.add_argument("--pagination", choices=("sequential", "fanout"), default="fanout")
+    parser.add_argument("--detail-mode", choices=("full", "card"), default="full")
+    parser.add_argument("--skip-duplicate-details", action="store_true",
+                        help="Store cards of known duplicates without fetching their page")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    site = FixtureSite(pages=args.pages, ads_per_page=args.ads_per_page, existing=args.existing, known_ratio=args.known_ratio)
+
+    settings = get_project_settings()
+    settings.set("LOG_LEVEL", "WARNING")
+    settings.set("TELNETCONSOLE_ENABLED", False)
+    # Every page has to go through the spider, not come from an earlier run
+    settings.set("HTTPCACHE_ENABLED", False)
+    settings.set("CONCURRENT_REQUESTS", args.concurrency)
+    settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", args.concurrency)
+    settings.set("DOWNLOAD_HANDLERS", {
+        "http": "benchmarks.replay.ReplayDownloadHandler",
+        "https": "benchmarks.replay.ReplayDownloadHandler",
+    })
+    settings.set("REPLAY_SITE", site)
+
+    # The spider writes its run log and state relative to the working directory
+    project_dir = os.getcwd()
+    sys.path.insert(0, project_dir)
+
+    with tempfile.TemporaryDirectory(prefix="ka_bench_") as workdir:
+        job_file, data_dir, fill_time = prepare_job(workdir, site, args)
+        os.chdir(workdir)
+        try:
+            process = CrawlerProcess(settings)
+            crawler = process.create_crawler(TimedKleinanzeigenSpider)
+            process.crawl(crawler, job_config=job_file, output_dir=data_dir, state_dir=os.path.join(workdir, "state"))
+            process.start()
+        finally:
+            os.chdir(project_dir)
+
+        result = summarize(crawler.spider, crawler.stats.get_stats(), args, fill_time)
+
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
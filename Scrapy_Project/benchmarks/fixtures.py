@@ -0,0 +1,168 @@
+"""
+Synthetic, scalable stand-in for kleinanzeigen.de.
+
+Pages are rendered from the HTML templates in benchmarks/fixtures/ (modelled
+on saved search and article pages, replace them with fresh recordings when
+the site layout changes). Every ad is derived deterministically from its
+number, so search cards, article pages and the pre-existing dataset agree
+with each other for any size.
+"""
+
+import os
+import re
+from string import Template
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASE_URL = "https://www.kleinanzeigen.de"
+
+# Ads of the existing dataset and new ads live in separate number ranges
+EXISTING_BASE = 2000000000
+NEW_BASE = 3000000000
+
+BRANDS = ["Lenovo ThinkPad", "HP Omen", "Asus ROG Strix", "Acer Nitro 5", "MSI Katana", "Dell XPS", "Medion Erazer"]
+CPUS = ["i5-8265U", "i7 12700H", "i9-13980HX", "Ryzen 7 5800H", "Ryzen 5 7535HS", "i5 1135G7", ""]
+GPUS = ["RTX 4060", "RTX 3070 Ti", "GTX 1660 Super", "RTX 4090", "", "RTX 3060"]
+RAMS = [8, 16, 32, 64]
+SSDS = ["512 GB SSD", "1 TB SSD", "256GB SSD", "2TB NVMe"]
+PLACES = ["28307 Bremen - Osterholz", "10115 Berlin - Mitte", "80331 München - Altstadt", "50667 Köln - Innenstadt", "20095 Hamburg - Altstadt"]
+FILLER = (
+    "Verkaufe hier meinen gut erhaltenen Laptop. Er wurde nur wenig genutzt und hat keine Kratzer. "
+    "Windows 11 ist frisch installiert. Abholung oder Versand möglich, Bezahlung per PayPal oder bar. "
+)
+
+
+def _template(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'r', encoding='utf-8') as template_file:
+        return Template(template_file.read())
+
+
+def ad_id(number):
+    return f"{number}-278-{1000 + number % 900}"
+
+
+def ad_price(number):
+    return 100 + (number * 37) % 1900
+
+
+def ad_details(number):
+    """Title, description etc. of ad `number`, identical on every call."""
+    brand = BRANDS[number % len(BRANDS)]
+    cpu = CPUS[number % len(CPUS)]
+    gpu = GPUS[(number // 3) % len(GPUS)]
+    ram = RAMS[(number // 7) % len(RAMS)]
+    ssd = SSDS[(number // 11) % len(SSDS)]
+    title = f"{brand} {cpu} {gpu} {ram}GB RAM".replace("  ", " ").strip()
+    description = f"{FILLER}Ausstattung: {cpu} Prozessor, {gpu} Grafik, {ram} GB DDR4 Arbeitsspeicher, {ssd}. " * 3
+    return {
+        "ID": ad_id(number),
+        "URL": f"{BASE_URL}/s-anzeige/{re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')}/{ad_id(number)}",
+        "Preis": ad_price(number),
+        "Seller_ID": 10000000 + number % 50000,
+        "Artikelstitel": title,
+        "Artikelsbeschreibung": description.strip(),
+        "Date": f"{1 + number % 28:02d}.{1 + number % 12:02d}.2025",
+        "Place": PLACES[number % len(PLACES)],
+    }
+
+
+def existing_listings(count):
+    """The dataset a job already holds before the benchmark crawl."""
+    return [ad_details(EXISTING_BASE + i) for i in range(count)]
+
+
+class FixtureSite:
+    """
+    Search results for one query with `pages` pages of `ads_per_page` ads.
+    `known_ratio` of the cards show ads from the existing dataset, every
+    `price_change_every`-th of those with a changed price.
+    """
+
+    def __init__(self, pages=20, ads_per_page=25, existing=0, known_ratio=0.0,
+                 price_change_every=10, top_ads=1, query="laptop-17-zoll"):
+        self.pages = pages
+        self.ads_per_page = ads_per_page
+        self.existing = existing
+        self.known_ratio = known_ratio if existing else 0.0
+        self.price_change_every = price_change_every
+        self.top_ads = top_ads
+        self.query = query
+
+        self.page_template = _template("search_page.html")
+        self.card_template = _template("search_card.html")
+        self.article_template = _template("article_page.html")
+
+    @property
+    def start_url(self):
+        return self.search_url(1)
+
+    def search_url(self, page):
+        if page == 1:
+            return f"{BASE_URL}/s-anzeige:angebote/{self.query}/k0"
+        return f"{BASE_URL}/s-anzeige:angebote/seite:{page}/{self.query}/k0"
+
+    def card_number(self, index):
+        """Ad number shown at position `index` of the whole result list."""
+        if self.known_ratio and (index % 100) < self.known_ratio * 100:
+            return EXISTING_BASE + (index * 7919) % self.existing
+        return NEW_BASE + index
+
+    def _card(self, number, index, top_ad=False):
+        details = ad_details(number)
+        price = details["Preis"]
+        if number < NEW_BASE and self.price_change_every and index % self.price_change_every == 0:
+            price += 10
+        return self.card_template.substitute(
+            li_class="is-topad badge-topad" if top_ad else "",
+            ad_id=number,
+            href=details["URL"][len(BASE_URL):],
+            place=details["Place"],
+            card_date=details["Date"],
+            title=details["Artikelstitel"],
+            snippet=details["Artikelsbeschreibung"][:160] + "...",
+            price_text=f"{price} € VB",
+        )
+
+    def search_page(self, page):
+        cards = []
+        for top in range(self.top_ads):
+            cards.append(self._card(NEW_BASE + 9000000 + top, top, top_ad=True))
+        first = (page - 1) * self.ads_per_page
+        for index in range(first, first + self.ads_per_page):
+            cards.append(self._card(self.card_number(index), index))
+
+        shown = range(max(1, page - 4), min(self.pages, page + 5) + 1)
+        page_links = "\n".join(
+            f'                <a class="pagination-page" href="{self.search_url(p)[len(BASE_URL):]}">{p}</a>'
+            if p != page else f'                <span class="pagination-current">{p}</span>'
+            for p in shown
+        )
+        next_link = ""
+        if page < self.pages:
+            next_link = f'            <a class="pagination-next" href="{self.search_url(page + 1)[len(BASE_URL):]}"></a>'
+
+        return self.page_template.substitute(query=self.query, cards="\n".join(cards), page_links=page_links, next_link=next_link)
+
+    def article_page(self, number):
+        details = ad_details(number)
+        return self.article_template.substitute(
+            title=details["Artikelstitel"],
+            price_text=f"{details['Preis']} € VB",
+            place=details["Place"],
+            date=details["Date"],
+            description=details["Artikelsbeschreibung"],
+            seller_id=details["Seller_ID"],
+            seller_name=f"Verkäufer {details['Seller_ID']}",
+        )
+
+    def render(self, url):
+        """Returns (status, html) for a URL of this site."""
+        path = url[len(BASE_URL):] if url.startswith(BASE_URL) else url
+        article = re.search(r"/s-anzeige/[^/]+/(\d+)-", path)
+        if article:
+            return 200, self.article_page(int(article.group(1)))
+        if self.query in path:
+            page = re.search(r"seite:(\d+)", path)
+            page = int(page.group(1)) if page else 1
+            if 1 <= page <= self.pages:
+                return 200, self.search_page(page)
+        return 404, "<html><body>Seite nicht gefunden</body></html>"
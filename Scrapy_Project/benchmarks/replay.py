@@ -0,0 +1,30 @@
+"""
+Download handler that answers every request from a FixtureSite instead of
+the network. Enable it with DOWNLOAD_HANDLERS for http/https and hand the
+site over in the REPLAY_SITE setting.
+"""
+
+from scrapy.http import HtmlResponse
+from twisted.internet import defer
+
+
+class ReplayDownloadHandler:
+    lazy = False
+
+    def __init__(self, site, stats=None):
+        self.site = site
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.get("REPLAY_SITE"), crawler.stats)
+
+    def download_request(self, request, spider):
+        status, html = self.site.render(request.url)
+        if self.stats is not None:
+            self.stats.inc_value("replay/bytes", len(html))
+        response = HtmlResponse(url=request.url, status=status, body=html.encode("utf-8"), encoding="utf-8", request=request)
+        return defer.succeed(response)
+
+    def close(self):
+        pass
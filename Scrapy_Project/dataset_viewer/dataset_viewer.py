@@ -2,18 +2,28 @@ import streamlit as st
 import pandas as pd
 import json
 import os
+import sys
 import gpxpy
 import pgeocode
 import numpy as np
 import datetime
 from scipy.spatial import cKDTree
 
-# --- IMPORT FEATURE EXTRACTOR ---
-from feature_extractor import enrich_dataframe
-
 # --- CONFIGURATION ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_FOLDER = os.path.join(SCRIPT_DIR, "..", "data")
+PROJECT_DIR = os.path.join(SCRIPT_DIR, "..")
+DATA_FOLDER = os.path.join(PROJECT_DIR, "data")
+# Price_Drop column: price decrease in % within this many days
+PRICE_DROP_DAYS = 7
+
+# --- IMPORT FEATURE EXTRACTOR & DATASET READER ---
+from feature_extractor import EXTRACTOR_VERSION, SPEC_COLUMNS, enrich_dataframe
+
+# The scraper package holds the dataset readers (JSON and JSON Lines)
+sys.path.append(PROJECT_DIR)
+from ebay_scraper.price_history import PriceHistory, price_history_filename
+# On-disk cache of the prepared frames, reads the datasets with ebay_scraper.storage
+from frame_cache import load_frame
 
 # Initialize Geocoding (Germany)
 nomi = pgeocode.Nominatim('de')
@@ -22,33 +32,62 @@ dist_calc = pgeocode.GeoDistance('de')
 def get_json_files(folder):
     if not os.path.exists(folder):
         return []
-    files = [f for f in os.listdir(folder) if f.endswith('.json')]
+    files = [f for f in os.listdir(folder) if f.endswith(('.json', '.jsonl'))]
     return sorted(files)
 
+def build_frame(data):
+    """Listings -> cleaned and enriched DataFrame, the part of load_data kept in the on-disk cache."""
+    if not data: return pd.DataFrame()
+    df = pd.DataFrame(data)
+
+    # 1. Standard Cleaning
+    # Preis is an int since EbayScraperItem; only older datasets still hold strings like "1.299" or "VB"
+    if 'Preis' in df.columns:
+        if df['Preis'].dtype == object:
+            df['Preis'] = df['Preis'].astype(str).str.replace(r'[^\d]', '', regex=True).replace('', '0')
+        df['Preis'] = df['Preis'].fillna(0).astype(int)
+    # Seller_ID is a string since EbayScraperItem, older datasets hold ints
+    if 'Seller_ID' in df.columns:
+        df['Seller_ID'] = df['Seller_ID'].map(lambda value: None if pd.isna(value) else str(int(value)) if isinstance(value, float) else str(value))
+    
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'], format='%d.%m.%Y', errors='coerce')
+    
+    # 2. RUN HEURISTIC EXTRACTION
+    # The scraper stores the Ext_* values with each listing (ebay_scraper/enrichment.py),
+    # only rows without them or from an older extractor version are extracted here
+    if 'Ext_Version' in df.columns:
+        stale = df['Ext_Version'] != EXTRACTOR_VERSION
+    else:
+        stale = pd.Series(True, index=df.index)
+    if stale.all():
+        df = enrich_dataframe(df)
+    elif stale.any():
+        enriched = enrich_dataframe(df.loc[stale].copy())
+        for column in SPEC_COLUMNS:
+            df.loc[stale, column] = enriched[column]
+
+    # 3. EXTRACT ZIP CODE (PLZ), where it is not stored yet
+    if 'Place' in df.columns:
+        plz = df['Place'].astype(str).str.extract(r'^(\d{5})')[0]
+        df['PLZ'] = df['PLZ'].fillna(plz) if 'PLZ' in df.columns else plz
+    else:
+        df['PLZ'] = None
+
+    return df
+
 @st.cache_data
 def load_data(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        if not data: return pd.DataFrame()
-        df = pd.DataFrame(data)
-        
-        # 1. Standard Cleaning
-        if 'Preis' in df.columns:
-            df['Preis'] = df['Preis'].astype(str).str.replace(r'[^\d]', '', regex=True).replace('', '0').astype(int)
-        
-        if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'], format='%d.%m.%Y', errors='coerce')
-        
-        # 2. RUN HEURISTIC EXTRACTION
-        df = enrich_dataframe(df)
-
-        # 3. EXTRACT ZIP CODE (PLZ)
-        if 'Place' in df.columns:
-            df['PLZ'] = df['Place'].astype(str).str.extract(r'^(\d{5})')
-        else:
-            df['PLZ'] = None
+        # Cleaned and enriched frame, read from data/.viewer_cache/ unless the dataset changed
+        df = load_frame(file_path, build_frame, EXTRACTOR_VERSION)
+        if df.empty: return df
+
+        # 4. PRICE DROP (from the job's price history, no listing scan)
+        # Not cached: it depends on the .prices file and on today's date
+        if 'ID' in df.columns:
+            drops = PriceHistory(price_history_filename(file_path)).price_drops(days=PRICE_DROP_DAYS)
+            df['Price_Drop'] = df['ID'].map({doc_id: drop for doc_id, (_, _, drop) in drops.items()}).fillna(0.0).round(1)
         
         return df
     except Exception as e:
@@ -78,8 +117,16 @@ def parse_gpx_to_points(gpx_file):
 def geocode_dataframe(df):
     if 'PLZ' not in df.columns or df.empty:
         return df
-    
-    unique_zips = df['PLZ'].dropna().unique()
+
+    # Coordinates stored at ingest are kept, only the missing ones are looked up
+    for column in ('Item_Lat', 'Item_Lon'):
+        if column not in df.columns:
+            df[column] = np.nan
+    missing = df.loc[df['Item_Lat'].isna() & df['PLZ'].notna(), 'PLZ']
+    if missing.empty:
+        return df
+
+    unique_zips = missing.unique()
     geo_results = nomi.query_postal_code(unique_zips)
     zip_map = geo_results.set_index('postal_code')[['latitude', 'longitude']].to_dict('index')
     
@@ -89,7 +136,9 @@ def geocode_dataframe(df):
             return pd.Series([d['latitude'], d['longitude']])
         return pd.Series([None, None])
 
-    df[['Item_Lat', 'Item_Lon']] = df['PLZ'].apply(get_coords)
+    coords = missing.apply(get_coords)
+    df.loc[missing.index, 'Item_Lat'] = coords[0].astype(float)
+    df.loc[missing.index, 'Item_Lon'] = coords[1].astype(float)
     return df
 
 # --- HELPER: DISTANCE TO ROUTE ---
@@ -179,7 +228,7 @@ with st.sidebar:
     # 1. Visible Columns
     all_cols = df.columns.tolist()
     # Removed 'ID' from defaults
-    defaults = ['Preis', 'Artikelstitel', 'Ext_GPU', 'Ext_CPU', 'Place', 'Date', 'URL']
+    defaults = ['Preis', 'Price_Drop', 'Artikelstitel', 'Ext_GPU', 'Ext_CPU', 'Place', 'Date', 'URL']
     
     if 'Route_Dist' in df.columns: defaults.insert(1, 'Route_Dist')
     if 'Dist_Zip' in df.columns: defaults.insert(1, 'Dist_Zip')
@@ -189,7 +238,7 @@ with st.sidebar:
     
     # 2. Sorting
     st.subheader("Sorting")
-    sort_options = ['Preis', 'Date', 'Place', 'Ext_GPU', 'Ext_CPU', 'Ext_RAM']
+    sort_options = ['Preis', 'Price_Drop', 'Date', 'Place', 'Ext_GPU', 'Ext_CPU', 'Ext_RAM', 'Ext_Display']
     
     if 'Route_Dist' in df.columns: sort_options.insert(0, 'Route_Dist')
     if 'Dist_Zip' in df.columns: sort_options.insert(0, 'Dist_Zip')
@@ -212,6 +261,7 @@ with st.sidebar:
     # 3. Standard Filters
     st.subheader("Basic Filters")
     search_query = st.text_input("🔍 Quick Search", "")
+    hide_reposts = 'Duplicate_Of' in df.columns and st.checkbox("Hide reposts (keep newest)", value=True)
     
     # Price
     max_price = int(df['Preis'].max()) if 'Preis' in df.columns else 3000
@@ -264,6 +314,14 @@ if 'Preis' in filtered_df.columns and user_max != SLIDER_MAX:
 elif 'Preis' in filtered_df.columns:
     filtered_df = filtered_df[filtered_df['Preis'] >= user_min]
 
+# Reposts: one row per duplicate cluster, the newest listing
+if hide_reposts:
+    cluster = filtered_df['Duplicate_Of'].fillna(filtered_df['ID'])
+    newest_first = filtered_df.assign(_cluster=cluster)
+    if 'Date' in newest_first.columns:
+        newest_first = newest_first.sort_values('Date', ascending=False, na_position='last')
+    filtered_df = newest_first.drop_duplicates('_cluster').drop(columns=['_cluster']).sort_index()
+
 # Search
 if search_query:
     mask = filtered_df.astype(str).apply(lambda row: row.str.contains(search_query, case=False).any(), axis=1)
@@ -309,6 +367,7 @@ col_config = {
     "URL": st.column_config.LinkColumn("Link"),
     "Preis": st.column_config.NumberColumn("Price", format="%d €"),
     "Date": st.column_config.DateColumn("Date", format="DD.MM.YYYY"),
+    "Price_Drop": st.column_config.NumberColumn(f"Drop ({PRICE_DROP_DAYS}d)", format="%.0f %%"),
 }
 if 'Dist_Zip' in filtered_df.columns:
     col_config["Dist_Zip"] = st.column_config.NumberColumn("Dist (Home)", format="%.1f km")
@@ -1,143 +1,291 @@
+import numpy as np
 import pandas as pd
 import re
 
-class SpecExtractor:
-    """
-    Heuristics to extract PC specs from unstructured text.
-    """
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
 
-    @staticmethod
-    def _find_ram(text):
-        if not isinstance(text, str): return None
-        pattern = r'\b(\d{1,3})\s*GB(?:\s*(?:RAM|DDR|Arbeitsspeicher)|$)'
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for m in matches:
-            val = int(m)
-            if 4 <= val <= 128:
-                return val
-        return None
+# --- Value normalizers: regex match -> spec value (None = not plausible) ---
 
-    @staticmethod
-    def _find_ssd(text):
-        if not isinstance(text, str): return None
-        
-        # 1. Check for TB
-        tb_pattern = r'\b(\d{1,2})\s*TB'
-        match_tb = re.search(tb_pattern, text, re.IGNORECASE)
-        if match_tb:
-            return int(match_tb.group(1)) * 1000
-
-        # 2. Check for GB (>= 120GB to distinguish from RAM)
-        gb_pattern = r'\b(\d{3,4})\s*GB'
-        matches_gb = re.findall(gb_pattern, text, re.IGNORECASE)
-        for m in matches_gb:
-            val = int(m)
-            if val >= 120:
-                return val
-        return None
+def _number(match):
+    return int(match.group(1))
+
+def _terabytes(match):
+    return int(match.group(1)) * 1000
+
+def _inches(match):
+    return float(match.group(1).replace(',', '.'))
+
+def _intel_generation(match):
+    model_str = match.group(1)
+    if len(model_str) == 3:
+        gen = "01"
+    else:
+        # i7-12700H -> 12, i5-8250U -> 08
+        prefix_2 = int(model_str[:2])
+        gen = str(prefix_2) if 10 <= prefix_2 <= 19 else "0" + model_str[0]
+    return f"Intel Gen {gen}"
+
+def _ryzen_series(match):
+    return f"AMD Ryzen {match.group(1)[0]}000 Series"
+
+def _apple_chip(match):
+    variant = match.group(2)
+    return f"Apple M{match.group(1)}" + (f" {variant.capitalize()}" if variant else "")
+
+def _nvidia(series):
+    def name(match):
+        suffix = match.group(2)
+        return f"NVIDIA {series} {match.group(1)}" + (f" {suffix.upper()}" if suffix else "")
+    return name
 
-    @staticmethod
-    def _find_cpu_gen(text):
-        if not isinstance(text, str): return None
-        
-        # --- 1. INTEL GENERATION ---
-        intel_pattern = r'i[3579][\s-]*(\d{3,5})'
-        match_intel = re.search(intel_pattern, text, re.IGNORECASE)
-        
-        if match_intel:
-            model_str = match_intel.group(1)
-            length = len(model_str)
-            gen = None
-
-            if length == 3:
-                gen = "01"
-            elif length >= 4:
-                prefix_2 = int(model_str[:2])
-                if 10 <= prefix_2 <= 19:
-                    gen = str(prefix_2)
-                else:
-                    gen = "0" + model_str[0]
-            
-            if gen:
-                return f"Intel Gen {gen}"
-
-        # --- 2. AMD RYZEN SERIES ---
-        amd_pattern = r'Ryzen(?:[\s-]*[3579])?[\s-]+(\d{4})'
-        match_amd = re.search(amd_pattern, text, re.IGNORECASE)
-        
-        if match_amd:
-            model_str = match_amd.group(1)
-            series = model_str[0]
-            return f"AMD Ryzen {series}000 Series"
+def _radeon(match):
+    model = match.group(1) + (match.group(2) or "").upper()
+    suffix = match.group(3)
+    return f"AMD RX {model}" + (f" {suffix.upper()}" if suffix else "")
 
+# --- Rule table ---
+# One row per pattern. Rows of a spec are tried in order: the first row with a
+# plausible match decides, later rows only run if it has none (TB before GB,
+# Intel before Ryzen, ...). Within a row the first plausible match counts.
+# Anchors are lowercase words every match contains: a rule only runs on texts
+# that contain one of them. Patterns are matched case-insensitively.
+SPEC_RULES = [
+    # spec,        pattern,                                                          anchors,                          value,              plausible (min, max)
+    ('Ext_RAM',     r'\b(\d{1,3})\s*GB(?:\s*(?:RAM|DDR|Arbeitsspeicher)|$)',          ('gb',),                          _number,            (4, 128)),
+    ('Ext_SSD',     r'\b(\d{1,2})\s*TB',                                              ('tb',),                          _terabytes,         None),
+    ('Ext_SSD',     r'\b(\d{3,4})\s*GB',                                              ('gb',),                          _number,            (120, None)),
+    ('Ext_CPU',     r'i[3579][\s-]*(\d{3,5})',                                        ('i3', 'i5', 'i7', 'i9'),         _intel_generation,  None),
+    ('Ext_CPU',     r'Ryzen(?:[\s-]*[3579])?[\s-]+(\d{4})',                           ('ryzen',),                       _ryzen_series,      None),
+    ('Ext_CPU',     r'(?:\bApple|\bMacBook(?:\s*(?:Air|Pro))?|\bMac\s*mini|\biMac)[\s:-]*M([1-4])(?:\s*(Pro|Max|Ultra))?\b',
+                                                                                      ('m1', 'm2', 'm3', 'm4'),         _apple_chip,        None),
+    ('Ext_CPU',     r'\bM([1-4])(?:\s*(Pro|Max|Ultra))?[\s-]*Chip',                   ('chip',),                        _apple_chip,        None),
+    ('Ext_GPU',     r'RTX\s*-?(\d{4})(?:\s*(TI|SUPER))?',                             ('rtx',),                         _nvidia("RTX"),     None),
+    ('Ext_GPU',     r'GTX\s*-?(\d{3,4})(?:\s*(TI|SUPER))?',                           ('gtx',),                         _nvidia("GTX"),     None),
+    ('Ext_GPU',     r'\bRX\s*-?(\d{3,4})([SM])?(?:\s*(XTX|XT))?\b',                   ('rx',),                          _radeon,            None),
+    ('Ext_Display', r'\b(\d{2}(?:[.,]\d{1,2})?)\s*-?\s*(?:"|”|″|\'\'|Zoll|inch)',     ('"', '”', '″', "''", 'zoll', 'inch'), _inches,        (10, 49)),
+]
+
+# RE2 (pyarrow) knows \s, \d and \b in their ASCII meaning only, and its
+# case folding doesn't take İ and ı for i. For the column-wise search they are
+# widened to what re accepts in str patterns. \b before an ASCII letter holds
+# wherever it holds for re, every other \b is dropped. The RE2 pattern thus
+# matches everywhere re does, and re confirms the match.
+_RE2_SPACE = r'\s\x0b\x1c-\x1f\x85\p{Z}'
+_RE2_DIGIT = r'\p{Nd}'
+
+def _re2_pattern(pattern):
+    result, in_class, position = [], False, 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            token = pattern[position:position + 2]
+            position += 2
+            if token == '\\s':
+                result.append(_RE2_SPACE if in_class else f'[{_RE2_SPACE}]')
+            elif token == '\\d':
+                result.append(_RE2_DIGIT)
+            elif token == '\\b' and not re.match(r'[a-hjlmnopqrt-zA-HJLMNOPQRT-Z]', pattern[position:position + 1]):
+                continue
+            else:
+                result.append(token)
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '$' and not in_class:
+            # re's $ also matches before a final newline
+            char = r'\n?\z'
+        elif char in ('i', 'I') and not in_class:
+            char = '[iİı]'
+        result.append(char)
+        position += 1
+    return '(?i)' + ''.join(result)
+
+# Stored with the Ext_* values of every listing (Ext_Version, see
+# ebay_scraper/enrichment.py). Bump it when the rules or normalizers change:
+# listings stamped with an older version are enriched again.
+EXTRACTOR_VERSION = 1
+
+
+class SpecRule:
+
+    def __init__(self, spec, pattern, anchors, value, plausible=None):
+        self.spec = spec
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.re2_pattern = _re2_pattern(pattern)
+        self.anchors = anchors
+        self.value = value
+        self.low, self.high = plausible or (None, None)
+
+    def plausible(self, value):
+        if value is None:
+            return False
+        if self.low is not None and value < self.low:
+            return False
+        if self.high is not None and value > self.high:
+            return False
+        return True
+
+    def first(self, text):
+        # Non-overlapping matches in order, like re.findall
+        for match in self.pattern.finditer(text):
+            value = self.value(match)
+            if self.plausible(value):
+                return value
         return None
 
-    @staticmethod
-    def _find_gpu(text):
+    def first_in_column(self, texts, column, rows):
         """
-        Detects specific NVIDIA RTX and GTX models.
-        Returns strings like 'NVIDIA RTX 4060', 'NVIDIA RTX 3070 Ti', etc.
+        first() of texts[row] for the given rows, column holds all texts as an
+        Arrow array. One RE2 search over the rows finds where a match can
+        start, re only confirms it there. Returns {row: value}.
         """
-        if not isinstance(text, str): return None
-        
-        t = text.upper() # Normalize to uppercase for easier matching
-        
-        # --- 1. NVIDIA RTX (20xx, 30xx, 40xx, 50xx) ---
-        # Regex Explanation:
-        # RTX          -> Literal match
-        # \s*-?        -> Optional space or hyphen
-        # (\d{4})      -> Group 1: Captures the 4-digit model (e.g. 4060)
-        # (?: ... )?   -> Non-capturing optional group for the suffix
-        # \s*          -> Optional space
-        # (TI|SUPER)   -> Group 2: Captures 'TI' or 'SUPER'
-        rtx_pattern = r'RTX\s*-?(\d{4})(?:\s*(TI|SUPER))?'
-        rtx_match = re.search(rtx_pattern, t)
-        
-        if rtx_match:
-            model = rtx_match.group(1)
-            suffix = rtx_match.group(2)
-            
-            full_name = f"NVIDIA RTX {model}"
-            if suffix:
-                full_name += f" {suffix}"
-            return full_name
-
-        # --- 2. NVIDIA GTX (9xx, 10xx, 16xx) ---
-        # Matches: GTX 1060, GTX 1660 Super, GTX 970
-        gtx_pattern = r'GTX\s*-?(\d{3,4})(?:\s*(TI|SUPER))?'
-        gtx_match = re.search(gtx_pattern, t)
-        
-        if gtx_match:
-            model = gtx_match.group(1)
-            suffix = gtx_match.group(2)
-            
-            full_name = f"NVIDIA GTX {model}"
-            if suffix:
-                full_name += f" {suffix}"
-            return full_name
+        if len(rows) < len(column):
+            column = column.take(pa.array(rows))
+        starts = pc.find_substring_regex(column, self.re2_pattern).to_numpy(zero_copy_only=False)
+        hits = starts >= 0
+        found = {}
+        for row, start in zip(rows[hits].tolist(), starts[hits].tolist()):
+            text = texts[row]
+            if not text.isascii():
+                # RE2 gives a byte offset
+                start = len(text.encode('utf-8')[:start].decode('utf-8'))
+            match = self.pattern.match(text, start)
+            value = self.value(match) if match else None
+            if not self.plausible(value):
+                # Not a match for re after all, or a later match is the plausible one
+                value = self.first(text)
+            if value is not None:
+                found[row] = value
+        return found
 
-        return None
+
+class SpecExtractor:
+    """
+    Heuristics to extract PC specs from unstructured text, compiled from a
+    rule table. A text is lowercased once and its anchor words looked up once;
+    only rules whose anchors occur run their pattern, and a spec stops at its
+    first rule with a value. New rules cost nothing on texts without their
+    anchors. Many texts at once go through extract_column instead, one
+    search per rule over the whole column.
+    """
+
+    def __init__(self, rules):
+        self.rules = [SpecRule(*rule) for rule in rules]
+        self.specs = list(dict.fromkeys(rule.spec for rule in self.rules))
+        self.rules_by_spec = {spec: [rule for rule in self.rules if rule.spec == spec] for spec in self.specs}
+
+    def extract(self, text, specs=None):
+        """{spec: value} of the specs found in the text (all specs, or the given ones)."""
+        if not isinstance(text, str):
+            return {}
+        lower = text.lower()
+        present = {}
+        found = {}
+        for spec in self.specs if specs is None else specs:
+            for rule in self.rules_by_spec.get(spec, ()):
+                hit = False
+                for anchor in rule.anchors:
+                    if anchor not in present:
+                        present[anchor] = anchor in lower
+                    if present[anchor]:
+                        hit = True
+                        break
+                if not hit:
+                    continue
+                value = rule.first(text)
+                if value is not None:
+                    found[spec] = value
+                    break
+        return found
+
+    def extract_column(self, texts, wanted=None):
+        """
+        {spec: {row: value}} of a list of texts. wanted maps a spec to the rows
+        it is needed for (default: all specs, all rows). With pyarrow every rule
+        is one RE2 search over the rows its spec still lacks; without it, every
+        text goes through extract() for its wanted specs.
+        """
+        if wanted is None:
+            wanted = {spec: range(len(texts)) for spec in self.specs}
+        found = {spec: {} for spec in wanted}
+        if pa is None:
+            specs_by_row = {}
+            for spec, rows in wanted.items():
+                for row in rows:
+                    specs_by_row.setdefault(row, []).append(spec)
+            for row, specs in specs_by_row.items():
+                for spec, value in self.extract(texts[row], specs).items():
+                    found[spec][row] = value
+            return found
+
+        column = pa.array(texts, pa.large_string())
+        for spec, rows in wanted.items():
+            rows = np.asarray(rows, dtype=np.int64)
+            for rule in self.rules_by_spec.get(spec, ()):
+                if not len(rows):
+                    break
+                hits = rule.first_in_column(texts, column, rows)
+                found[spec].update(hits)
+                rows = rows[~np.isin(rows, list(hits))]
+        return found
+
+
+SPEC_EXTRACTOR = SpecExtractor(SPEC_RULES)
+# Output columns, in rule table order
+SPEC_COLUMNS = SPEC_EXTRACTOR.specs
+
+def extract_specs(text, specs=None):
+    """Specs of a single text, e.g. at scrape time."""
+    return SPEC_EXTRACTOR.extract(text, specs)
+
+def extract_listing_specs(title, description, specs=None):
+    """Title first, then description for the specs the title lacks (0 counts as lacking)."""
+    found = {spec: value for spec, value in extract_specs(title, specs).items() if value}
+    wanted = [spec for spec in (specs or SPEC_COLUMNS) if spec not in found]
+    if wanted:
+        for spec, value in extract_specs(description, wanted).items():
+            found[spec] = value
+    return found
+
+# --- DataFrame enrichment ---
+
+def _text_column(df, column):
+    # str() of every value like the old per-row extraction, a missing column is ''
+    if column not in df.columns:
+        return [''] * len(df)
+    return [str(value) for value in df[column]]
 
 def enrich_dataframe(df):
-    
-    def extract_row(row):
-        title = str(row.get('Artikelstitel', ''))
-        desc = str(row.get('Artikelsbeschreibung', ''))
-        
-        # Helper to search title first, then desc
-        def find_spec(func):
-            res = func(title)
-            if not res: res = func(desc)
-            return res
-
-        ram = find_spec(SpecExtractor._find_ram)
-        ssd = find_spec(SpecExtractor._find_ssd)
-        cpu = find_spec(SpecExtractor._find_cpu_gen)
-        gpu = find_spec(SpecExtractor._find_gpu)
-        
-        return pd.Series([ram, ssd, cpu, gpu])
-
-    # Add columns
-    df[['Ext_RAM', 'Ext_SSD', 'Ext_CPU', 'Ext_GPU']] = df.apply(extract_row, axis=1)
-    
-    return df
\ No newline at end of file
+    """
+    Adds one Ext_* column per spec, title first, then description. Each rule
+    runs over the column of distinct titles (SpecExtractor.extract_column);
+    the distinct descriptions are only searched for the specs their rows'
+    titles left empty.
+    """
+    title_codes, titles = pd.factorize(np.array(_text_column(df, 'Artikelstitel'), dtype=object))
+    description_codes, descriptions = pd.factorize(np.array(_text_column(df, 'Artikelsbeschreibung'), dtype=object))
+    title_codes, description_codes = title_codes.tolist(), description_codes.tolist()
+
+    title_specs = SPEC_EXTRACTOR.extract_column(titles.tolist())
+    columns = {}
+    wanted = {}
+    for spec in SPEC_COLUMNS:
+        found = title_specs[spec]
+        # A falsy title value (0) counts as not found, like in extract_listing_specs
+        columns[spec] = [found.get(code) or None for code in title_codes]
+        wanted[spec] = list(dict.fromkeys(code for code, value in zip(description_codes, columns[spec]) if value is None))
+    description_specs = SPEC_EXTRACTOR.extract_column(descriptions.tolist(), wanted)
+
+    for spec, values in columns.items():
+        found = description_specs[spec]
+        values = [found.get(code) if value is None else value for code, value in zip(description_codes, values)]
+        numeric = pd.api.types.infer_dtype(values, skipna=True) in ('integer', 'floating', 'mixed-integer-float')
+        df[spec] = pd.Series(values, index=df.index, dtype=float) if numeric else values
+
+    return df
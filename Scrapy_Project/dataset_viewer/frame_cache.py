@@ -0,0 +1,217 @@
+"""
+On-disk cache of the viewer's prepared DataFrame, one per dataset.
+
+st.cache_data only lasts as long as the Streamlit process. This cache keeps
+the cleaned and enriched frame next to the dataset, in Arrow IPC files
+(uncompressed Feather v2), so that a cold start reads it memory-mapped
+instead of parsing and enriching the whole dataset again:
+
+    data/.viewer_cache/<dataset>.meta.json      key + segment list
+    data/.viewer_cache/<dataset>.0.arrow        rows, one segment per rebuild or append
+
+The key is the dataset file's size, mtime and SHA-256, plus the extractor
+version. If size and mtime are unchanged, the cache is used without reading
+the dataset. If only the mtime changed and the hash is the same, the key is
+refreshed. If the content changed, the dataset is read again, and only
+listings with a new ID or a changed row hash are built. They are appended
+as another segment; like the JSON Lines store, the last row per ID wins.
+A new extractor version, removed IDs or too many segments rewrite the cache.
+
+Arrow needs one type per column: object columns whose values have several
+types (e.g. int Seller_IDs of old listings next to str ones) are stored as
+str. pyarrow is optional. Without it the frame is simply built every time.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+from ebay_scraper.storage import load_listings
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_FOLDER = ".viewer_cache"
+# Appended segments before the cache is rewritten as one
+MAX_SEGMENTS = 8
+ROW_HASH = "_Row_Hash"
+_ENCODER = json.JSONEncoder(sort_keys=True, default=str)
+
+
+def cache_files(file_path):
+    """(meta file, segment file prefix) of a dataset."""
+    folder = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_FOLDER)
+    name = os.path.basename(file_path)
+    return os.path.join(folder, name + ".meta.json"), os.path.join(folder, name)
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hash(listing):
+    # Any change of a stored listing (price, status, backfill, enrichment) changes it
+    return hashlib.blake2b(_ENCODER.encode(listing).encode('ascii'), digest_size=8).hexdigest()
+
+
+def _read_meta(meta_file):
+    try:
+        with open(meta_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_file, meta):
+    tmp_file = meta_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=2)
+    os.replace(tmp_file, meta_file)
+
+
+def _uniform_columns(df):
+    # Values of several types in one object column (ints and floats mix fine) -> str
+    for column in df.columns[df.dtypes == object]:
+        types = {type(value) for value in df[column] if value is not None and value == value}
+        if len(types) > 1 and not types <= {int, float}:
+            df[column] = df[column].map(lambda value: value if value is None or value != value else str(value))
+    return df
+
+
+def _read_segments(prefix, segments):
+    frames = []
+    for segment in segments:
+        with pa.memory_map(f"{prefix}.{segment}.arrow", 'r') as source:
+            frames.append(pa.ipc.open_file(source).read_all().to_pandas())
+    if len(frames) == 1:
+        return frames[0]
+    # Appended rows replace older ones of the same ID
+    df = pd.concat(frames, ignore_index=True).drop_duplicates('ID', keep='last').reset_index(drop=True)
+    # A small segment may have no value at all in a column (object of None), keep the dtypes of the largest
+    for column, dtype in max(frames, key=len).dtypes.items():
+        if df[column].dtype != dtype:
+            try:
+                df[column] = df[column].astype(dtype)
+            except (TypeError, ValueError):
+                pass
+    return _uniform_columns(df)
+
+
+def _read_cached(prefix, segments):
+    """The cached rows, or None if a segment is missing or corrupt."""
+    try:
+        return _read_segments(prefix, segments)
+    except (OSError, pa.ArrowInvalid) as e:
+        logger.warning(f"Viewer cache {prefix} is unreadable, rebuilding it: {e}")
+        return None
+
+
+def _write_segment(prefix, segment, df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    filename = f"{prefix}.{segment}.arrow"
+    with pa.OSFile(filename + ".tmp", 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(filename + ".tmp", filename)
+
+
+def _remove_segments(prefix, keep):
+    folder, name = os.path.split(prefix)
+    for filename in os.listdir(folder):
+        if filename.startswith(name + ".") and filename.endswith(".arrow") and filename[len(name) + 1:-len(".arrow")] not in keep:
+            os.remove(os.path.join(folder, filename))
+
+
+def _build(listings, build):
+    df = _uniform_columns(build(listings))
+    if not df.empty:
+        df[ROW_HASH] = [row_hash(listing) for listing in listings]
+    return df
+
+
+def load_frame(file_path, build, version):
+    """
+    The prepared frame of a dataset. build(listings) turns a list of listings
+    into the frame; it runs for all listings on a rebuild and only for the
+    new or changed ones on an append. version is part of the cache key.
+    """
+    if pa is None or not os.path.exists(file_path):
+        return build(load_listings(file_path))
+
+    meta_file, prefix = cache_files(file_path)
+    stat = os.stat(file_path)
+    meta = _read_meta(meta_file)
+    if meta is not None and meta.get("version") != version:
+        meta = None
+
+    if meta is not None and meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns:
+        cached = _read_cached(prefix, meta["segments"])
+        if cached is not None:
+            return cached.drop(columns=[ROW_HASH], errors='ignore')
+        meta = None
+
+    content_hash = file_hash(file_path)
+    key = {"version": version, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash}
+    if meta is not None and meta["sha256"] == content_hash:
+        cached = _read_cached(prefix, meta["segments"])
+        if cached is not None:
+            _write_meta(meta_file, dict(meta, **key))
+            return cached.drop(columns=[ROW_HASH], errors='ignore')
+        meta = None
+
+    listings = load_listings(file_path)
+    df = None
+    try:
+        os.makedirs(os.path.dirname(meta_file), exist_ok=True)
+        cached = _read_cached(prefix, meta["segments"]) if meta is not None else None
+        if cached is not None:
+            ids = [listing.get("ID") for listing in listings]
+            if ROW_HASH in cached.columns and set(cached['ID']) <= set(ids):
+                known = dict(zip(cached['ID'], cached[ROW_HASH]))
+                changed = [listing for listing in listings if known.get(listing.get("ID")) != row_hash(listing)]
+                segments = list(meta["segments"])
+                if changed:
+                    segment = str(int(segments[-1]) + 1)
+                    _write_segment(prefix, segment, _build(changed, build))
+                    segments.append(segment)
+                    cached = _read_segments(prefix, segments)
+                # Rows in dataset order, appended ones were written at the end
+                position = {doc_id: number for number, doc_id in enumerate(ids)}
+                df = cached.iloc[cached['ID'].map(position).argsort(kind='stable')].reset_index(drop=True)
+                if len(segments) > MAX_SEGMENTS:
+                    # Compaction: the merged rows as one segment, nothing is built again
+                    segment = str(int(segments[-1]) + 1)
+                    _write_segment(prefix, segment, df)
+                    segments = [segment]
+                _write_meta(meta_file, dict(key, segments=segments, rows=len(df)))
+                _remove_segments(prefix, set(segments))
+
+        if df is None:
+            df = _build(listings, build)
+            if df.empty:
+                return df
+            if os.path.exists(meta_file):
+                os.remove(meta_file)
+            _write_segment(prefix, "0", df)
+            _write_meta(meta_file, dict(key, segments=["0"], rows=len(df)))
+            _remove_segments(prefix, {"0"})
+    except OSError as e:
+        # Cache folder not writable, disk full: the dataset is not cached
+        logger.warning(f"Viewer cache of {file_path} not written, building the frame without it: {e}")
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+        if df is None:
+            return _uniform_columns(build(listings))
+
+    return df.drop(columns=[ROW_HASH], errors='ignore')
@@ -0,0 +1,310 @@
+"""
+Saved-search alerts, evaluated while items are stored.
+
+Rules live in ALERTS_RULES_FILE (alerts/rules.json), a list of saved
+searches. Every key is optional:
+
+    {
+        "name": "RTX 4070 laptop near Berlin",
+        "jobs": ["Gaming Laptops"],             # task_name of the jobs it applies to
+        "min_price": 500, "max_price": 1100,
+        "gpu": ["NVIDIA RTX 4070", "NVIDIA RTX 4080"],   # Ext_GPU values
+        "cpu": ["Intel Gen 13", "Intel Gen 14"],         # Ext_CPU values
+        "min_ram": 16,                          # Ext_RAM in GB
+        "plz": "10115", "max_distance_km": 50,  # needs pgeocode
+        "keywords": ["oled"],                   # all of them, title or description
+        "exclude_keywords": ["defekt"]
+    }
+
+EbayScraperPipeline hands every new listing and every price drop to
+AlertEngine.check(). The rules are compiled into indexes by GPU, CPU and
+price bucket, so a listing is only compared in full with the rules that
+can match its values. That keeps the cost per item flat with hundreds of rules.
+
+Matches go to ALERTS_SINK, either a JSON Lines file or an http(s) URL that
+gets one JSON POST per match. The pipeline delivers them in a thread of its
+own after the batch is written, so a slow webhook doesn't hold up the writes.
+To try webhooks locally:
+
+    python -m ebay_scraper.alerts serve --port 8099
+    python -m ebay_scraper.alerts test data/data_gaming_laptops.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from itertools import chain
+
+from dataset_viewer.feature_extractor import EXTRACTOR_VERSION, SPEC_COLUMNS, extract_listing_specs
+from ebay_scraper.items import to_price
+
+try:
+    import pgeocode
+except ImportError:
+    pgeocode = None
+
+logger = logging.getLogger(__name__)
+
+# Price index: one bucket per 100 €, everything from 10,000 € on shares the last one
+PRICE_BUCKET = 100
+MAX_BUCKET = 100
+
+PLZ_PATTERN = re.compile(r"^(\d{5})")
+
+WEBHOOK_TIMEOUT = 5
+
+NO_RULES = frozenset()
+# Matches an engine remembers so they alert once, the oldest are forgotten first
+MAX_SENT = 10000
+
+# Several crawlers of a runner batch may append to the same file sink
+_sink_lock = threading.Lock()
+
+
+def listing_specs(listing):
+    """Ext_* values of a listing: title first, then description (like enrich_dataframe)."""
+    if listing.get("Ext_Version") == EXTRACTOR_VERSION:
+        # Enriched while it was stored
+        return {column: listing.get(column) for column in SPEC_COLUMNS}
+    found = extract_listing_specs(str(listing.get("Artikelstitel", "")), str(listing.get("Artikelsbeschreibung", "")))
+    return {column: found.get(column) for column in SPEC_COLUMNS}
+
+
+def _bucket(price):
+    return min(max(price, 0) // PRICE_BUCKET, MAX_BUCKET)
+
+
+class AlertRule:
+
+    def __init__(self, number, config):
+        self.number = number
+        self.name = config.get("name") or f"rule {number + 1}"
+        self.jobs = set(config.get("jobs", ()))
+        self.min_price = config.get("min_price")
+        self.max_price = config.get("max_price")
+        self.gpu = set(config.get("gpu", ()))
+        self.cpu = set(config.get("cpu", ()))
+        self.min_ram = config.get("min_ram")
+        self.plz = str(config["plz"]) if config.get("plz") else None
+        self.max_distance = config.get("max_distance_km")
+        self.keywords = [keyword.lower() for keyword in config.get("keywords", ())]
+        self.exclude_keywords = [keyword.lower() for keyword in config.get("exclude_keywords", ())]
+
+    def buckets(self):
+        low = _bucket(self.min_price or 0)
+        high = _bucket(self.max_price) if self.max_price is not None else MAX_BUCKET
+        return range(low, high + 1)
+
+    def matches(self, price, specs, text, distance):
+        """Full check of the conditions the indexes don't decide."""
+        if self.min_price is not None and price < self.min_price:
+            return False
+        if self.max_price is not None and price > self.max_price:
+            return False
+        if self.min_ram is not None and (specs.get("Ext_RAM") or 0) < self.min_ram:
+            return False
+        if any(keyword not in text for keyword in self.keywords):
+            return False
+        if any(keyword in text for keyword in self.exclude_keywords):
+            return False
+        if self.max_distance is not None and self.plz:
+            km = distance(self.plz)
+            if km is None or km > self.max_distance:
+                return False
+        return True
+
+
+class AlertEngine:
+
+    def __init__(self, rules, sink, job=None):
+        self.sink = sink
+        self.rules = []
+        for number, config in enumerate(rules):
+            rule = AlertRule(number, config)
+            if rule.jobs and job not in rule.jobs:
+                continue
+            if rule.max_distance is not None and rule.plz and pgeocode is None:
+                logger.warning(f"Alert rule '{rule.name}' needs pgeocode for max_distance_km, it is disabled.")
+                continue
+            self.rules.append(rule)
+        self._compile()
+        self._geo = pgeocode.GeoDistance('de') if pgeocode is not None and any(r.plz for r in self.rules) else None
+        self._distances = {}
+        # (rule, ID, price) already matched, in insertion order
+        self._sent = {}
+
+    @classmethod
+    def from_settings(cls, settings, job=None):
+        """Engine for a job, or None if there is no rules file."""
+        filename = settings.get("ALERTS_RULES_FILE")
+        if not filename or not os.path.exists(filename):
+            return None
+        with open(filename, 'r', encoding='utf-8') as rules_file:
+            rules = json.load(rules_file)
+        engine = cls(rules, settings.get("ALERTS_SINK"), job)
+        return engine if engine.rules else None
+
+    def _compile(self):
+        # Spec value -> rules that want it; rules without that condition match every value
+        self.by_gpu, self.any_gpu = {}, set()
+        self.by_cpu, self.any_cpu = {}, set()
+        for rule in self.rules:
+            for values, index, any_rules in ((rule.gpu, self.by_gpu, self.any_gpu), (rule.cpu, self.by_cpu, self.any_cpu)):
+                if not values:
+                    any_rules.add(rule.number)
+                for value in values:
+                    index.setdefault(value, set()).add(rule.number)
+        # Price bucket -> rules whose price range overlaps it
+        self.by_bucket = [set() for _ in range(MAX_BUCKET + 1)]
+        for rule in self.rules:
+            for bucket in rule.buckets():
+                self.by_bucket[bucket].add(rule.number)
+        self.rules_by_number = {rule.number: rule for rule in self.rules}
+
+    def _distance(self, item_plz, rule_plz):
+        if self._geo is None or not item_plz:
+            return None
+        key = (rule_plz, item_plz)
+        if key not in self._distances:
+            km = self._geo.query_postal_code(rule_plz, item_plz)
+            self._distances[key] = None if km != km else float(km)  # NaN: unknown PLZ
+        return self._distances[key]
+
+    def candidates(self, price, specs):
+        """
+        Rule numbers the indexes can't rule out. The smallest index entry
+        drives, the others are only asked for membership, so the work depends
+        on how many rules could match and not on how many rules there are.
+        """
+        dimensions = [
+            (self.by_bucket[_bucket(price)], NO_RULES),
+            (self.by_gpu.get(specs.get("Ext_GPU"), NO_RULES), self.any_gpu),
+            (self.by_cpu.get(specs.get("Ext_CPU"), NO_RULES), self.any_cpu),
+        ]
+        dimensions.sort(key=lambda dimension: len(dimension[0]) + len(dimension[1]))
+        (wanted, any_value), others = dimensions[0], dimensions[1:]
+        return [
+            number for number in chain(wanted, any_value)
+            if all(number in wanted_other or number in any_other for wanted_other, any_other in others)
+        ]
+
+    def check(self, listing, event="new", old_price=None, deliver=True):
+        """Matches of one listing, delivered to the sink unless deliver is False. Returns the match records."""
+        price = to_price(listing.get("Preis"))
+        specs = listing_specs(listing)
+        numbers = self.candidates(price, specs)
+        if not numbers:
+            return []
+
+        text = f"{listing.get('Artikelstitel', '')} {listing.get('Artikelsbeschreibung', '')}".lower()
+        item_plz = listing.get("PLZ")
+        if item_plz is None:
+            plz_match = PLZ_PATTERN.match(str(listing.get("Place", "")))
+            item_plz = plz_match.group(1) if plz_match else None
+        distance = lambda rule_plz: self._distance(item_plz, rule_plz)
+
+        matches = []
+        for number in sorted(numbers):
+            rule = self.rules_by_number[number]
+            if rule.matches(price, specs, text, distance):
+                key = (rule.name, listing.get("ID"), price)
+                if key in self._sent:
+                    continue
+                self._sent[key] = None
+                if len(self._sent) > MAX_SENT:
+                    del self._sent[next(iter(self._sent))]
+                match = {
+                    "rule": rule.name,
+                    "event": event,
+                    "matched": datetime.now().isoformat(timespec="seconds"),
+                    "ID": listing.get("ID"),
+                    "Preis": price,
+                    "Old_Preis": old_price,
+                    "Artikelstitel": listing.get("Artikelstitel"),
+                    "URL": listing.get("URL"),
+                    "Place": listing.get("Place"),
+                }
+                match.update({column: value for column, value in specs.items() if value is not None})
+                if rule.plz and rule.max_distance is not None:
+                    match["Distance_km"] = round(distance(rule.plz), 1)
+                matches.append(match)
+        if matches and deliver:
+            self.deliver(matches)
+        return matches
+
+    def deliver(self, matches):
+        if not self.sink:
+            return
+        if self.sink.startswith(("http://", "https://")):
+            for match in matches:
+                request = urllib.request.Request(
+                    self.sink, data=json.dumps(match, ensure_ascii=False).encode("utf-8"),
+                    headers={"Content-Type": "application/json"}, method="POST",
+                )
+                try:
+                    urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT).close()
+                except OSError as e:
+                    logger.error(f"Alert webhook {self.sink} failed: {e}")
+            return
+        with _sink_lock:
+            os.makedirs(os.path.dirname(self.sink) or ".", exist_ok=True)
+            with open(self.sink, 'a', encoding='utf-8') as sink_file:
+                sink_file.write("".join(json.dumps(match, ensure_ascii=False) + "\n" for match in matches))
+
+
+class _PrintingHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            match = json.loads(body)
+            print(f"🔔 [{match.get('rule')}] {match.get('Preis')} € {match.get('Artikelstitel')} {match.get('URL')}")
+        except ValueError:
+            print(f"!!! Not JSON: {body[:200]!r}")
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def main(argv=None):
+    from scrapy.utils.project import get_project_settings
+    from ebay_scraper.storage import load_listings
+
+    parser = argparse.ArgumentParser(description="Saved-search alerts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Local webhook receiver that prints alerts")
+    serve_parser.add_argument("--port", type=int, default=8099)
+    test_parser = subparsers.add_parser("test", help="Run the rules over a dataset, without delivering")
+    test_parser.add_argument("dataset")
+    test_parser.add_argument("--job", help="task_name, for rules limited to jobs")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        print(f"Waiting for alerts on http://127.0.0.1:{args.port}/ (Ctrl+C to stop)")
+        HTTPServer(("127.0.0.1", args.port), _PrintingHandler).serve_forever()
+        return
+
+    settings = get_project_settings()
+    engine = AlertEngine.from_settings(settings, args.job)
+    if engine is None:
+        print(f"No rules in {settings.get('ALERTS_RULES_FILE')}")
+        return
+    engine.sink = None
+    total = 0
+    for listing in load_listings(args.dataset):
+        for match in engine.check(listing):
+            total += 1
+            print(f"[{match['rule']}] {match['Preis']} € {match['Artikelstitel']} {match['URL']}")
+    print(f"{total} matches for {len(engine.rules)} rules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Checkpoint of a running crawl, so an interrupted job (crash, ban, Ctrl+C)
+continues where it stopped instead of starting again from page 1.
+
+Per job, state/jobs/<job>/checkpoint.json holds:
+    pending_pages   search pages that were scheduled but not parsed yet
+    done_pages      search pages that were parsed
+    articles        every new ad the crawl wanted (ID -> URL); on resume the
+                    ones missing from the dataset are requested again, which
+                    covers in-flight downloads and unflushed pipeline buffers
+    pagination      fan-out pagination state per start URL
+    watermarks      first-page observations for CrawlState
+
+The file is written atomically every CHECKPOINT_INTERVAL seconds and when
+the spider closes, and removed once the crawl finishes.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlCheckpoint:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pending_pages = {}
+        self.done_pages = set()
+        self.articles = {}
+        self.pagination = {}
+        self.watermarks = {}
+        self.dirty = False
+
+    def load(self):
+        """Reads the checkpoint of an interrupted crawl. Returns False if there is none."""
+        if not os.path.exists(self.filename):
+            return False
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except json.decoder.JSONDecodeError:
+            logger.warning(f"Checkpoint {self.filename} is not valid JSON, starting fresh.")
+            return False
+        self.pending_pages = data.get("pending_pages", {})
+        self.done_pages = set(data.get("done_pages", []))
+        self.articles = data.get("articles", {})
+        self.pagination = data.get("pagination", {})
+        self.watermarks = data.get("watermarks", {})
+        return True
+
+    def page_scheduled(self, url, meta):
+        if url not in self.done_pages:
+            self.pending_pages[url] = dict(meta)
+            self.dirty = True
+
+    def page_done(self, url):
+        self.pending_pages.pop(url, None)
+        self.done_pages.add(url)
+        self.dirty = True
+
+    def article_wanted(self, doc_id, url):
+        self.articles[doc_id] = url
+        self.dirty = True
+
+    def save(self, pagination, watermarks):
+        self.pagination = pagination
+        self.watermarks = watermarks
+        data = {
+            "pending_pages": self.pending_pages,
+            "done_pages": sorted(self.done_pages),
+            "articles": self.articles,
+            "pagination": self.pagination,
+            "watermarks": self.watermarks,
+        }
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(data, checkpoint_file, ensure_ascii=False)
+        os.replace(tmp_filename, self.filename)
+        self.dirty = False
+
+    def discard(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
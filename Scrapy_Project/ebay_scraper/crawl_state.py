@@ -0,0 +1,89 @@
+"""
+Crawl watermarks per start URL, kept between runs.
+
+For every start URL the state file remembers the newest listing IDs and the
+newest listing date seen on its first results page. Together with the
+"N consecutive known ads" rule in KleinanzeigenSpider.parse this decides
+how deep a repeat run has to paginate.
+"""
+
+import json
+import logging
+import os
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Kleinanzeigen sorts by newest first unless the URL says otherwise
+SORT_DATE = "date"
+SORT_PRICE = "price"
+
+# How many IDs of the first results page are remembered per start URL
+NEWEST_IDS_LIMIT = 50
+
+
+def detect_sort_order(url):
+    if "sortierung:preis" in url:
+        return SORT_PRICE
+    return SORT_DATE
+
+
+class CrawlState:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.watermarks = {}
+        # Observations of the running crawl, merged into watermarks on save
+        self.seen = {}
+
+        if os.path.exists(filename):
+            try:
+                with open(filename, 'r', encoding='utf-8') as state_file:
+                    self.watermarks = json.load(state_file)
+            except json.decoder.JSONDecodeError:
+                logger.warning(f"Crawl state {filename} is not valid JSON, starting fresh.")
+
+    def newest_date(self, start_url):
+        value = self.watermarks.get(start_url, {}).get("newest_date")
+        return date.fromisoformat(value) if value else None
+
+    def is_newest_id(self, start_url, doc_id):
+        return doc_id in self.watermarks.get(start_url, {}).get("newest_ids", ())
+
+    def observe(self, start_url, page, doc_id, listing_date):
+        """Records an ad card of this run. Only the first page moves the watermark."""
+        if page != 1:
+            return
+        seen = self.seen.setdefault(start_url, {"newest_ids": [], "newest_date": None})
+        if len(seen["newest_ids"]) < NEWEST_IDS_LIMIT:
+            seen["newest_ids"].append(doc_id)
+        if listing_date and (seen["newest_date"] is None or listing_date > seen["newest_date"]):
+            seen["newest_date"] = listing_date
+
+    def seen_snapshot(self):
+        """Observations of the running crawl as JSON, for CrawlCheckpoint."""
+        return {
+            start_url: {"newest_ids": seen["newest_ids"], "newest_date": seen["newest_date"].isoformat() if seen["newest_date"] else None}
+            for start_url, seen in self.seen.items()
+        }
+
+    def restore_seen(self, snapshot):
+        for start_url, seen in snapshot.items():
+            newest_date = date.fromisoformat(seen["newest_date"]) if seen.get("newest_date") else None
+            self.seen[start_url] = {"newest_ids": list(seen.get("newest_ids", [])), "newest_date": newest_date}
+
+    def save(self):
+        for start_url, seen in self.seen.items():
+            watermark = self.watermarks.setdefault(start_url, {})
+            watermark["newest_ids"] = seen["newest_ids"]
+            old_date = self.newest_date(start_url)
+            if seen["newest_date"] and (old_date is None or seen["newest_date"] > old_date):
+                watermark["newest_date"] = seen["newest_date"].isoformat()
+            watermark["last_run"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as state_file:
+            json.dump(self.watermarks, state_file, ensure_ascii=False, indent=4)
+        os.replace(tmp_filename, self.filename)
+        self.seen = {}
@@ -0,0 +1,79 @@
+"""
+Change-data-capture files: what one run changed in a job's dataset.
+
+Consumers (alerts, reports) read these instead of diffing data/*.json
+between runs. Every run writes one JSON Lines file
+
+    data/deltas/<dataset>/<run id>.jsonl
+
+with one record per line, written by EbayScraperPipeline as batches are
+stored (so only real changes show up):
+
+    {"op": "run", "run_id": ..., "job": ..., "mode": ..., "dataset": ..., "started": ...}
+    {"op": "added", "ID": ..., "listing": {...}}
+    {"op": "price", "ID": ..., "old": 450, "new": 399}
+    {"op": "removed", "ID": ..., "status": "sold" | "removed"}
+    {"op": "end", "finished": ..., "reason": "finished", "counts": {...}}
+
+The file is named *.jsonl.part while the run is going and renamed once it
+ended, so a consumer only has to pick up *.jsonl files it hasn't seen.
+"""
+
+import json
+import os
+from datetime import datetime
+
+from ebay_scraper.revalidation import FINAL_STATUSES
+
+DELTA_SUFFIX = ".jsonl"
+PARTIAL_SUFFIX = ".part"
+
+
+def delta_folder(output_filename, deltas_dir="deltas"):
+    """Folder of a job's delta files, next to its dataset."""
+    folder, filename = os.path.split(output_filename)
+    return os.path.join(folder, deltas_dir, os.path.splitext(filename)[0])
+
+
+class DeltaWriter:
+
+    def __init__(self, folder, metadata):
+        self.started = datetime.now()
+        self.run_id = self.started.strftime("%Y%m%d-%H%M%S-%f")
+        self.filename = os.path.join(folder, self.run_id + DELTA_SUFFIX)
+        self.counts = {"added": 0, "price": 0, "removed": 0}
+
+        os.makedirs(folder, exist_ok=True)
+        self._file = open(self.filename + PARTIAL_SUFFIX, 'w', encoding='utf-8')
+        run = {"op": "run", "run_id": self.run_id, "started": self.started.isoformat(timespec="seconds")}
+        run.update(metadata)
+        self._write([run])
+
+    def _write(self, records):
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._file.flush()
+
+    def write_batch(self, added, changed, listing_updates):
+        """Takes the results of one pipeline batch, see EbayScraperPipeline._write_batch."""
+        records = [{"op": "added", "ID": listing.get("ID"), "listing": listing} for listing in added]
+        records += [{"op": "price", "ID": doc_id, "old": old_price, "new": new_price} for doc_id, old_price, new_price in changed]
+        for doc_id, fields in listing_updates:
+            if fields.get("Status") in FINAL_STATUSES:
+                records.append({"op": "removed", "ID": doc_id, "status": fields["Status"]})
+        for record in records:
+            self.counts[record["op"]] += 1
+        if records:
+            self._write(records)
+
+    def close(self, reason):
+        if self._file is None:
+            return
+        self._write([{
+            "op": "end",
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "reason": reason,
+            "counts": self.counts,
+        }])
+        self._file.close()
+        self._file = None
+        os.replace(self.filename + PARTIAL_SUFFIX, self.filename)
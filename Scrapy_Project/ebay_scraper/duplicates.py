@@ -0,0 +1,308 @@
+"""
+Near-duplicate and repost detection.
+
+Sellers repost the same item under a new ID, or copy an ad's text. Comparing
+every new listing with every stored one is quadratic, so listings are
+reduced to MinHash signatures, and locality-sensitive hashing (LSH) finds the
+few stored listings worth comparing:
+
+    text        Artikelstitel + Artikelsbeschreibung, lowercased
+    shingles    every 3 consecutive words
+    signature   NUM_HASHES minimum hashes (one per hash function), the share of
+                equal positions estimates the Jaccard similarity of two texts
+    LSH         the signature cut into BANDS bands; listings that share
+                a band are candidates
+
+A candidate is a duplicate with a similarity of at least REPOST_SIMILARITY
+and the same Seller_ID (a repost), or at least COPY_SIMILARITY across
+sellers. Duplicates join the cluster of the listing they match. The cluster
+ID is the ID of its first listing, and the pipeline stores it as
+Duplicate_Of. A listing that matches several clusters merges them into the
+oldest; the pipeline then rewrites Duplicate_Of of the moved listings in its
+job's dataset.
+
+For search result cards (title + description snippet, no seller), a second,
+shorter "card" signature over the title and the first CARD_WORDS words of
+the description is kept. An ad whose card matches a stored listing's card
+closely and has about the same price is a known duplicate. The spider then
+stores it from the card instead of fetching its detail page.
+
+The index is an SQLite file shared by all jobs (state/duplicates.sqlite)
+and grows incrementally as listings are stored.
+"""
+
+import logging
+import os
+import random
+import hashlib
+import re
+import sqlite3
+import struct
+import threading
+import zlib
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+NUM_HASHES = 64
+# 16 bands of 4 rows: texts with a similarity of 0.8 share a band with 99.9% probability
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+SHINGLE_WORDS = 3
+
+REPOST_SIMILARITY = 0.8
+COPY_SIMILARITY = 0.9
+
+CARD_WORDS = 15
+CARD_SIMILARITY = 0.9
+# Card matches must also have about the same price
+CARD_PRICE_TOLERANCE = 0.1
+
+# Stored in PRAGMA user_version: band keys of older versions are recomputed on open
+BAND_KEY_VERSION = 1
+
+# Template ads (dealers, shops) fill band buckets with thousands of IDs. The
+# newest ones of a bucket are enough: members of a cluster share their bands.
+BUCKET_LIMIT = 10
+
+WORD_PATTERN = re.compile(r"\w+")
+UNKNOWN_SELLERS = ("", "0", "None")
+
+# Universal hashing (a * x + b) mod p, fixed seed so signatures stay comparable between runs
+PRIME = (1 << 31) - 1
+_random = random.Random(20240229)
+HASH_A = [_random.randrange(1, PRIME) for _ in range(NUM_HASHES)]
+HASH_B = [_random.randrange(0, PRIME) for _ in range(NUM_HASHES)]
+if np is not None:
+    _A = np.array(HASH_A, dtype=np.uint64).reshape(-1, 1)
+    _B = np.array(HASH_B, dtype=np.uint64).reshape(-1, 1)
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    words = WORD_PATTERN.findall(str(text).lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set):
+    """Signature of a shingle set (None for an empty text)."""
+    if not shingle_set:
+        return None
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set]
+    if np is not None:
+        # a < 2^31 and x < 2^32, so a * x + b fits in uint64: same values as below
+        values = (_A * np.array(hashes, dtype=np.uint64) + _B) % PRIME
+        return array('I', values.min(axis=1).astype(np.uint32).tobytes())
+    return array('I', [min((a * x + b) % PRIME for x in hashes) for a, b in zip(HASH_A, HASH_B)])
+
+
+def similarity(signature, other):
+    return sum(1 for a, b in zip(signature, other) if a == b) / NUM_HASHES
+
+
+def band_keys(signature):
+    # Keys are stored, so they must not depend on the interpreter like hash() does:
+    # 8 bytes of BLAKE2b over the band's values (little-endian), as a positive SQLite INTEGER
+    keys = []
+    for band in range(BANDS):
+        data = struct.pack(f"<{ROWS}I", *signature[band * ROWS:(band + 1) * ROWS])
+        digest = hashlib.blake2b(data, digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, "little") & 0x7FFFFFFFFFFFFFFF))
+    return keys
+
+
+def listing_text(listing):
+    return f"{listing.get('Artikelstitel', '')} {listing.get('Artikelsbeschreibung', '')}"
+
+
+def card_text(title, description):
+    # Snippets on the cards end in "..." and are cut at varying length
+    words = WORD_PATTERN.findall(str(description).lower())[:CARD_WORDS]
+    return f"{title} {' '.join(words)}"
+
+
+def _price(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class DuplicateIndex:
+
+    def __init__(self, filename):
+        self.filename = filename
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        # The pipeline adds from worker threads, the spider looks up cards in the reactor thread
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS listings (
+                ID TEXT PRIMARY KEY,
+                Seller_ID TEXT,
+                Preis INTEGER,
+                cluster TEXT NOT NULL,
+                signature BLOB,
+                card_signature BLOB
+            );
+            CREATE INDEX IF NOT EXISTS idx_listings_cluster ON listings (cluster);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, key INTEGER, ID TEXT);
+            CREATE INDEX IF NOT EXISTS idx_bands ON bands (band, key);
+            CREATE TABLE IF NOT EXISTS card_bands (band INTEGER, key INTEGER, ID TEXT);
+            CREATE INDEX IF NOT EXISTS idx_card_bands ON card_bands (band, key);
+        """)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < BAND_KEY_VERSION:
+            self._rekey_bands()
+
+    def _rekey_bands(self):
+        # Same listings per table as before, only their keys change
+        for table, column in (("bands", "signature"), ("card_bands", "card_signature")):
+            rows = self.connection.execute(
+                f"SELECT ID, {column} FROM listings WHERE ID IN (SELECT DISTINCT ID FROM {table})").fetchall()
+            self.connection.execute(f"DELETE FROM {table}")
+            self.connection.executemany(
+                f"INSERT INTO {table} (band, key, ID) VALUES (?, ?, ?)",
+                [(band, key, doc_id) for doc_id, signature in rows if signature is not None
+                 for band, key in band_keys(array('I', signature))])
+        self.connection.execute(f"PRAGMA user_version = {BAND_KEY_VERSION}")
+        self.connection.commit()
+
+    def __contains__(self, doc_id):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM listings WHERE ID = ?", (doc_id,)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def known_ids(self):
+        with self.lock:
+            return {row[0] for row in self.connection.execute("SELECT ID FROM listings")}
+
+    def _candidates(self, table, signature, own_id=None):
+        # Only shared bands bring a stored listing into the comparison: (ID, Seller_ID, Preis, cluster, similarity)
+        column = "signature" if table == "bands" else "card_signature"
+        ids = set()
+        for band, key in band_keys(signature):
+            ids.update(row[0] for row in self.connection.execute(
+                f"SELECT ID FROM {table} WHERE band = ? AND key = ? ORDER BY rowid DESC LIMIT ?", (band, key, BUCKET_LIMIT)))
+        ids.discard(own_id)
+        if not ids:
+            return
+        ids = list(ids)
+        rows = self.connection.execute(
+            f"SELECT ID, Seller_ID, Preis, cluster, {column} FROM listings WHERE ID IN ({','.join('?' * len(ids))})", ids)
+        rows = [row for row in rows if row[4] is not None]
+        if np is not None and rows:
+            # All candidates at once, one row of 64 hashes per candidate
+            others = np.frombuffer(b"".join(row[4] for row in rows), dtype=np.uint32).reshape(len(rows), NUM_HASHES)
+            scores = (others == np.frombuffer(signature.tobytes(), dtype=np.uint32)).sum(axis=1) / NUM_HASHES
+        else:
+            scores = [similarity(signature, array('I', row[4])) for row in rows]
+        for (doc_id, seller, price, cluster, _), score in zip(rows, scores):
+            yield doc_id, seller, price, cluster, float(score)
+
+    def _oldest(self, clusters):
+        # A cluster ID is the ID of its first listing, its rowid tells the insertion order
+        clusters = list(clusters)
+        row = self.connection.execute(
+            f"SELECT ID FROM listings WHERE ID IN ({','.join('?' * len(clusters))}) ORDER BY rowid LIMIT 1", clusters).fetchone()
+        return row[0] if row else min(clusters)
+
+    def cluster_of(self, doc_id):
+        with self.lock:
+            row = self.connection.execute("SELECT cluster FROM listings WHERE ID = ?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, listing):
+        """
+        Indexes a stored listing. Returns (cluster, moved): the ID of the
+        cluster it belongs to, which is its own ID unless it duplicates an
+        earlier listing, and the IDs of indexed listings that were moved into
+        that cluster by a merge.
+        """
+        doc_id = listing.get("ID")
+        seller = str(listing.get("Seller_ID"))
+        signature = minhash(shingles(listing_text(listing)))
+        card_signature = minhash(shingles(card_text(listing.get("Artikelstitel", ""), listing.get("Artikelsbeschreibung", ""))))
+
+        with self.lock:
+            row = self.connection.execute("SELECT cluster FROM listings WHERE ID = ?", (doc_id,)).fetchone()
+            if row is not None:
+                return row[0], []
+
+            clusters = set()
+            # Card-only listings have no seller and only a snippet, they are matched on their card
+            if signature is not None and not listing.get("Card_Only"):
+                for _, other_seller, _, cluster, score in self._candidates("bands", signature, doc_id):
+                    same_seller = seller not in UNKNOWN_SELLERS and seller == other_seller
+                    if score >= COPY_SIMILARITY or (same_seller and score >= REPOST_SIMILARITY):
+                        clusters.add(cluster)
+            elif card_signature is not None:
+                clusters.update(self._card_matches(card_signature, _price(listing.get("Preis")), doc_id))
+
+            # Joining several clusters merges them into the oldest one
+            cluster = self._oldest(clusters) if clusters else doc_id
+            moved = []
+            for other_cluster in clusters - {cluster}:
+                moved += [row[0] for row in self.connection.execute("SELECT ID FROM listings WHERE cluster = ?", (other_cluster,))]
+                self.connection.execute("UPDATE listings SET cluster = ? WHERE cluster = ?", (cluster, other_cluster))
+
+            self.connection.execute(
+                "INSERT INTO listings (ID, Seller_ID, Preis, cluster, signature, card_signature) VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, seller, _price(listing.get("Preis")), cluster,
+                 signature.tobytes() if signature is not None else None,
+                 card_signature.tobytes() if card_signature is not None else None),
+            )
+            if signature is not None and not listing.get("Card_Only"):
+                self.connection.executemany("INSERT INTO bands (band, key, ID) VALUES (?, ?, ?)",
+                                            [(band, key, doc_id) for band, key in band_keys(signature)])
+            if card_signature is not None:
+                self.connection.executemany("INSERT INTO card_bands (band, key, ID) VALUES (?, ?, ?)",
+                                            [(band, key, doc_id) for band, key in band_keys(card_signature)])
+        return cluster, moved
+
+    def add_many(self, listings):
+        """Indexes listings the index doesn't know yet, e.g. a dataset from before the index existed."""
+        known = self.known_ids()
+        added = 0
+        for listing in listings:
+            if listing.get("ID") not in known:
+                self.add(listing)
+                added += 1
+        self.commit()
+        return added
+
+    def _card_matches(self, card_signature, price, own_id=None):
+        clusters = set()
+        for _, _, other_price, cluster, score in self._candidates("card_bands", card_signature, own_id):
+            if score < CARD_SIMILARITY:
+                continue
+            if abs(price - other_price) > CARD_PRICE_TOLERANCE * max(price, other_price):
+                continue
+            clusters.add(cluster)
+        return clusters
+
+    def match_card(self, title, snippet, price):
+        """Cluster of a stored listing a search result card duplicates, or None."""
+        card_signature = minhash(shingles(card_text(title, snippet)))
+        if card_signature is None:
+            return None
+        with self.lock:
+            clusters = self._card_matches(card_signature, _price(price))
+            return self._oldest(clusters) if clusters else None
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
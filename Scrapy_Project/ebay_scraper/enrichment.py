@@ -0,0 +1,269 @@
+"""
+Ingest-time enrichment: derived fields stored with every listing.
+
+The viewer used to compute these on every load of a dataset. They are now
+computed once per listing while it is stored and saved next to it:
+
+    Ext_RAM, Ext_SSD, Ext_CPU, Ext_GPU, Ext_Display   specs (dataset_viewer/feature_extractor.py)
+    PLZ                                               zip code at the start of Place
+    Item_Lat, Item_Lon                                coordinates of the PLZ (needs pgeocode)
+    Ext_Version                                       EXTRACTOR_VERSION they were computed with
+
+EbayScraperPipeline enriches new listings and backfilled detail pages before
+writing them. At the start of a crawl it also re-enriches the job's stored
+listings whose Ext_Version is missing or older than EXTRACTOR_VERSION, so a
+rule change reaches old listings with the next crawl. Datasets that are not
+crawled can be brought up to date from the command line:
+
+    python -m ebay_scraper.enrichment data/data_mums_laptops.json
+    python -m ebay_scraper.enrichment data/gaming.jsonl --all --no-geocode
+
+Without files it goes through every dataset in data/. After a change of the
+spec rules, --all re-enriches everything; the extraction is split into
+chunks over a process pool (--workers, default one per core). Per spec it
+prints the share of listings with a value, the most common values and how
+many stored values changed. --dry-run only prints that, so the effect of a
+rule change can be checked before anything is written:
+
+    python -m ebay_scraper.enrichment --all --dry-run
+"""
+
+import argparse
+import glob
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset_viewer.feature_extractor import EXTRACTOR_VERSION, SPEC_COLUMNS, extract_listing_specs
+from ebay_scraper.storage import open_listing_store
+
+try:
+    import pgeocode
+except ImportError:
+    pgeocode = None
+
+logger = logging.getLogger(__name__)
+
+PLZ_PATTERN = re.compile(r"^(\d{5})")
+
+ENRICHMENT_FIELDS = list(SPEC_COLUMNS) + ["PLZ", "Item_Lat", "Item_Lon", "Ext_Version"]
+
+
+def needs_enrichment(listing):
+    return listing.get("Ext_Version") != EXTRACTOR_VERSION
+
+
+def listing_plz(listing):
+    match = PLZ_PATTERN.match(str(listing.get("Place", "")))
+    return match.group(1) if match else None
+
+
+class Geocoder:
+    """
+    PLZ -> (lat, lon) with pgeocode, every PLZ is looked up once per process.
+    pgeocode downloads its data on first use; without pgeocode or that data,
+    no coordinates are stored and the viewer geocodes on load instead.
+    """
+
+    def __init__(self):
+        self._nomi = None
+        self._failed = pgeocode is None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def coordinates(self, plzs):
+        """{plz: (lat, lon) or None} of the given PLZs."""
+        wanted = {plz for plz in plzs if plz}
+        with self._lock:
+            missing = sorted(wanted - self._cache.keys())
+            if missing and not self._failed:
+                try:
+                    if self._nomi is None:
+                        self._nomi = pgeocode.Nominatim('de')
+                    result = self._nomi.query_postal_code(missing)
+                except Exception as e:
+                    logger.warning(f"Geocoding unavailable, storing listings without coordinates: {e}")
+                    self._failed = True
+                else:
+                    for plz, lat, lon in zip(missing, result['latitude'], result['longitude']):
+                        # NaN: unknown PLZ
+                        self._cache[plz] = None if lat != lat or lon != lon else (float(lat), float(lon))
+            return {plz: self._cache.get(plz) for plz in wanted}
+
+
+# Shared by the crawlers of a runner batch
+_geocoder = Geocoder()
+
+
+def enrich_listings(listings, geocode=True):
+    """
+    Sets the enrichment fields of the listings in place and returns them.
+    Like enrich_dataframe: title first, then description; specs not found are None.
+    """
+    coordinates = _geocoder.coordinates(listing_plz(listing) for listing in listings) if geocode else {}
+    for listing in listings:
+        found = extract_listing_specs(str(listing.get("Artikelstitel", "")), str(listing.get("Artikelsbeschreibung", "")))
+        for column in SPEC_COLUMNS:
+            listing[column] = found.get(column)
+        plz = listing_plz(listing)
+        listing["PLZ"] = plz
+        position = coordinates.get(plz)
+        if position is not None:
+            listing["Item_Lat"], listing["Item_Lon"] = position
+        listing["Ext_Version"] = EXTRACTOR_VERSION
+    return listings
+
+
+def enrichment_updates(listings, geocode=True):
+    """(ID, fields) pairs for update_listings, the listings themselves are left unchanged."""
+    enriched = enrich_listings([dict(listing) for listing in listings], geocode)
+    return [(listing.get("ID"), {field: listing[field] for field in ENRICHMENT_FIELDS if field in listing})
+            for listing in enriched]
+
+
+# What the spec extraction reads, the rest of a listing is not sent to the workers
+WORKER_FIELDS = ("ID", "Artikelstitel", "Artikelsbeschreibung", "Place")
+
+
+def _enrich_chunk(chunk):
+    # Runs in a worker process, coordinates are added by the parent
+    return enrichment_updates(chunk, geocode=False)
+
+
+def bulk_enrichment_updates(listings, executor=None, chunk_size=2000, geocode=True):
+    """
+    enrichment_updates() for many listings, with the spec extraction split
+    into chunks over the executor's processes (in this process without one).
+    The PLZs are geocoded once, in this process.
+    """
+    slim = [{field: listing[field] for field in WORKER_FIELDS if field in listing} for listing in listings]
+    chunks = [slim[start:start + chunk_size] for start in range(0, len(slim), chunk_size)]
+    results = executor.map(_enrich_chunk, chunks) if executor is not None else map(_enrich_chunk, chunks)
+    updates = [update for result in results for update in result]
+    if geocode:
+        coordinates = _geocoder.coordinates(fields["PLZ"] for _, fields in updates)
+        for _, fields in updates:
+            position = coordinates.get(fields["PLZ"])
+            if position is not None:
+                fields["Item_Lat"], fields["Item_Lon"] = position
+    return updates
+
+
+class Coverage:
+    """Per spec: listings with a value, value counts, and values that differ from the stored ones."""
+
+    def __init__(self):
+        self.listings = 0
+        self.hits = Counter()
+        self.values = {column: Counter() for column in SPEC_COLUMNS}
+        self.changed = Counter()
+
+    def add(self, listing, fields=None):
+        self.listings += 1
+        for column in SPEC_COLUMNS:
+            value = listing.get(column) if fields is None else fields.get(column)
+            if value is not None:
+                self.hits[column] += 1
+                self.values[column][value] += 1
+            # Only listings enriched before can change, the others had no value yet
+            if fields is not None and "Ext_Version" in listing and listing.get(column) != value:
+                self.changed[column] += 1
+
+    def update(self, other):
+        self.listings += other.listings
+        self.hits.update(other.hits)
+        self.changed.update(other.changed)
+        for column in SPEC_COLUMNS:
+            self.values[column].update(other.values[column])
+
+    def report(self, top=5):
+        lines = []
+        for column in SPEC_COLUMNS:
+            rate = 100 * self.hits[column] / self.listings if self.listings else 0.0
+            common = ", ".join(f"{value}: {count}" for value, count in self.values[column].most_common(top))
+            lines.append(f"  {column:<12} {rate:5.1f}%  {self.hits[column]:>7} found  {self.changed[column]:>6} changed  {common}")
+        return "\n".join(lines)
+
+
+def dataset_files(folder):
+    """Datasets in a folder. A SQLite store counts once, its JSON export is skipped."""
+    files = sorted(glob.glob(os.path.join(folder, "*.json")) + glob.glob(os.path.join(folder, "*.jsonl"))
+                   + glob.glob(os.path.join(folder, "*.sqlite")))
+    exports = {os.path.splitext(filename)[0] + ".json" for filename in files if filename.endswith(".sqlite")}
+    return [filename for filename in files if filename not in exports]
+
+
+def enrich_dataset(filename, executor=None, chunk_size=2000, everything=False, geocode=True, dry_run=False):
+    """
+    Enriches one dataset file, returns (listings enriched, Coverage).
+    The stores have no streaming reader, so the dataset is loaded with
+    load_all(); the extraction itself runs in chunks of chunk_size.
+    """
+    if filename.endswith(".sqlite"):
+        store = open_listing_store(filename[:-len(".sqlite")] + ".json", "sqlite")
+        if dry_run:
+            # close() would rewrite the JSON export
+            store.export_filename = None
+    else:
+        store = open_listing_store(filename)
+    try:
+        listings = store.load_all()
+        stale = listings if everything else [listing for listing in listings if needs_enrichment(listing)]
+        updates = dict(bulk_enrichment_updates(stale, executor, chunk_size, geocode)) if stale else {}
+        coverage = Coverage()
+        for listing in listings:
+            coverage.add(listing, updates.get(listing.get("ID")))
+        if updates and not dry_run:
+            store.update_listings(updates.items())
+            store.commit()
+    finally:
+        store.close()
+    return len(updates), coverage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store the enrichment fields (Ext_*, PLZ, coordinates) in datasets")
+    parser.add_argument("files", nargs="*", help="Dataset files (.json, .jsonl or .sqlite), default: all in --data-dir")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--all", action="store_true", help="Re-enrich every listing, not only outdated ones")
+    parser.add_argument("--no-geocode", action="store_true", help="Do not look up coordinates")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for the spec extraction")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Listings per task of a worker")
+    parser.add_argument("--dry-run", action="store_true", help="Only report coverage, write nothing")
+    args = parser.parse_args(argv)
+
+    files = args.files or dataset_files(args.data_dir)
+    if not files:
+        print(f"No datasets in {args.data_dir}")
+        return
+
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    total = Coverage()
+    enriched = 0
+    start = time.perf_counter()
+    try:
+        for filename in files:
+            file_start = time.perf_counter()
+            count, coverage = enrich_dataset(filename, executor, args.chunk_size, args.all, not args.no_geocode, args.dry_run)
+            enriched += count
+            total.update(coverage)
+            print(f"{filename}: enriched {count} of {coverage.listings} listings (version {EXTRACTOR_VERSION}) "
+                  f"in {time.perf_counter() - file_start:.2f}s{' (dry run)' if args.dry_run else ''}")
+            print(coverage.report())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f"Total: {enriched} of {total.listings} listings enriched in {elapsed:.2f}s "
+          f"({enriched / elapsed if elapsed else 0.0:.0f} listings/s, {args.workers} workers)")
+    if len(files) > 1:
+        print(total.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Single-pass field extraction for article pages.
+
+parse_article_page used to run one full-document XPath per field and
+another one per fallback. extract_article() instead collects every element
+it may need in one walk over the parsed page and reads the fields from
+those with small precompiled XPaths. Structured data (JSON-LD Product/Offer) wins over the
+HTML where a page carries it.
+
+The result is the same as the old XPath chain: the first
+#viewad-title / h1.boxedarticle--title, #viewad-price / h2.boxedarticle--price,
+div#viewad-description-text / p[itemprop=description], #viewad-locality /
+address locality, the first date in #viewad-extra-info and the first
+userId= link.
+"""
+
+import json
+import re
+
+from lxml import etree
+
+from ebay_scraper.items import to_price
+
+# One walk over these tags collects the candidates for every field (in
+# document order). Iterating in Python is cheaper than a single XPath with
+# all conditions, libxml2 evaluates such predicates slowly on large pages.
+CANDIDATE_TAGS = ("h1", "h2", "div", "span", "p", "a", "script")
+OWN_TEXT = etree.XPath("text()")
+ALL_TEXT = etree.XPath(".//text()")
+EXTRA_INFO_DATE = etree.XPath("div/span/text()")
+
+PRICE_NOISE = re.compile(r"[€VB\s]")
+
+# Plain lxml elements parse and iterate faster than the parsel/lxml.html tree
+_parsers = {}
+
+STRUCTURED_TYPES = {"Product", "Offer", "IndividualProduct", "Car", "Vehicle"}
+
+
+def parse_html(response):
+    """Root element of the page, parsed with a plain lxml parser (None for an empty page)."""
+    encoding = response.encoding
+    if encoding not in _parsers:
+        _parsers[encoding] = etree.HTMLParser(recover=True, encoding=encoding, huge_tree=True)
+    body = response.body.strip()
+    return etree.fromstring(body, _parsers[encoding]) if body else None
+
+
+def _first(texts):
+    return texts[0] if texts else None
+
+
+def clean_price(price_text):
+    """'1.299 € VB' -> '1299', missing/empty -> '0' (string, as parse_article_page always had it)."""
+    if not price_text:
+        return "0"
+    price = PRICE_NOISE.sub("", price_text).strip().replace(".", "")
+    return price or "0"
+
+
+def _structured_nodes(data):
+    if isinstance(data, list):
+        for entry in data:
+            yield from _structured_nodes(entry)
+    elif isinstance(data, dict):
+        if "@graph" in data:
+            yield from _structured_nodes(data["@graph"])
+        types = data.get("@type")
+        types = set(types) if isinstance(types, list) else {types}
+        if types & STRUCTURED_TYPES:
+            yield data
+
+
+def structured_fields(scripts):
+    """Title, description and price from JSON-LD script elements, where present."""
+    fields = {}
+    for script in scripts:
+        try:
+            data = json.loads(script.text or "")
+        except ValueError:
+            continue
+        for node in _structured_nodes(data):
+            if node.get("name") and "title" not in fields:
+                fields["title"] = str(node["name"]).strip()
+            if node.get("description") and "description" not in fields:
+                fields["description"] = " ".join(str(node["description"]).split())
+            offers = node.get("offers", node if "price" in node else None)
+            if isinstance(offers, list):
+                offers = offers[0] if offers else None
+            if isinstance(offers, dict) and offers.get("price") not in (None, "") and "price" not in fields:
+                try:
+                    # Whole euros like the HTML price, "149.99" must not become 14999
+                    fields["price"] = str(to_price(float(offers["price"])))
+                except (TypeError, ValueError):
+                    pass
+    return fields
+
+
+def extract_article(response):
+    """
+    Returns the raw fields of an article page (Artikelstitel, Preis,
+    Artikelsbeschreibung, Place, Date, Seller_ID), or None if the page has
+    no title (layout changed or blocked).
+    """
+    root = parse_html(response)
+    if root is None:
+        return None
+
+    found = {}
+    scripts = []
+    for element in root.iter(*CANDIDATE_TAGS):
+        attributes = element.attrib
+        if not attributes:
+            continue
+        tag = element.tag
+        if tag == "script":
+            if attributes.get("type") == "application/ld+json":
+                scripts.append(element)
+            continue
+        if tag == "a":
+            if "seller_link" not in found and "userId=" in attributes.get("href", ""):
+                found["seller_link"] = element
+            continue
+
+        element_id = attributes.get("id")
+        if element_id == "viewad-title" and tag == "h1":
+            found.setdefault("title", element)
+        elif element_id == "viewad-price" and tag == "h2":
+            found.setdefault("price", element)
+        elif element_id == "viewad-description-text" and tag == "div":
+            found.setdefault("description", element)
+        elif element_id == "viewad-locality" and tag == "span":
+            found.setdefault("locality", element)
+        elif element_id == "viewad-extra-info" and tag == "div":
+            found.setdefault("extra_info", element)
+
+        # Fallbacks of the older layout
+        class_name = attributes.get("class")
+        if class_name == "boxedarticle--title" and tag == "h1":
+            found.setdefault("title_fallback", element)
+        elif class_name == "boxedarticle--price" and tag == "h2":
+            found.setdefault("price_fallback", element)
+        itemprop = attributes.get("itemprop")
+        if itemprop == "description" and tag == "p":
+            found.setdefault("description_fallback", element)
+        elif itemprop == "locality" and tag == "span":
+            parent = element.getparent()
+            if parent is not None and parent.tag == "div" and parent.get("itemprop") == "address":
+                found.setdefault("locality_fallback", element)
+
+    structured = structured_fields(scripts) if scripts else {}
+
+    title = structured.get("title")
+    if not title and "title" in found:
+        title = _first(OWN_TEXT(found["title"]))
+    if not title and "title_fallback" in found:
+        title = _first(ALL_TEXT(found["title_fallback"]))
+    if not title:
+        return None
+
+    if "price" in structured:
+        price = structured["price"]
+    else:
+        price_text = _first(OWN_TEXT(found["price"])) if "price" in found else None
+        if not price_text and "price_fallback" in found:
+            price_text = _first(ALL_TEXT(found["price_fallback"]))
+        price = clean_price(price_text)
+
+    description = structured.get("description")
+    if description is None:
+        desc_lines = ALL_TEXT(found["description"]) if "description" in found else []
+        if not desc_lines and "description_fallback" in found:
+            desc_lines = ALL_TEXT(found["description_fallback"])
+        description = " ".join([line.strip() for line in desc_lines if line.strip()])
+
+    locality = _first(OWN_TEXT(found["locality"])) if "locality" in found else None
+    if locality:
+        locality = locality.strip()
+    else:
+        loc_raw = _first(OWN_TEXT(found["locality_fallback"])) if "locality_fallback" in found else None
+        locality = loc_raw.strip() if loc_raw else "Unknown"
+
+    date = _first(EXTRA_INFO_DATE(found["extra_info"])) if "extra_info" in found else None
+    if date:
+        date = date.strip()
+
+    seller_id = "0"
+    if "seller_link" in found:
+        seller_id = found["seller_link"].get("href").split("userId=")[-1].split("&")[0]
+
+    return {
+        "Preis": price,
+        "Seller_ID": seller_id,
+        "Artikelstitel": str(title).strip(),
+        "Artikelsbeschreibung": description,
+        "Date": str(date) if date is not None else None,
+        "Place": str(locality),
+    }
@@ -0,0 +1,248 @@
+"""
+Disk cache for downloaded pages, plugged into Scrapy's HttpCacheMiddleware
+via HTTPCACHE_STORAGE and HTTPCACHE_POLICY (see settings.py).
+
+ListingCacheStorage keeps an SQLite index (request fingerprint -> URL,
+status, headers, body hash, stored/last used time) next to the page bodies,
+which are stored once per content hash. When the bodies outgrow
+HTTPCACHE_MAX_SIZE_MB, the least recently used pages are evicted.
+
+ListingCachePolicy gives search and article pages their own TTL
+(HTTPCACHE_TTL). Stale pages are revalidated with If-None-Match /
+If-Modified-Since if the server sent validators. With HTTPCACHE_OFFLINE
+(plus HTTPCACHE_IGNORE_MISSING) every cached page counts as fresh and
+nothing else is downloaded, so parse and parse_article_page run from disk:
+
+    python -m ebay_scraper.runner --offline --output-dir data_offline
+
+The cache is off unless HTTPCACHE_ENABLED is set, e.g. by runner --cache.
+Revalidation runs (runner --mode revalidate) always use it, every ad page
+they request is sent with the validators of its last download.
+ListingCacheMiddleware replaces Scrapy's HttpCacheMiddleware so that a page
+the server confirmed with 304 counts as fresh again for its whole TTL.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.project import data_path
+
+logger = logging.getLogger(__name__)
+
+SEARCH = "search"
+ARTICLE = "article"
+# Article pages requested by a revalidation run: a cached copy is never fresh
+REVALIDATE = "revalidate"
+DEFAULT_TTL = {SEARCH: 15 * 60, ARTICLE: 7 * 24 * 3600, REVALIDATE: 0}
+
+# Added to cached responses, the policy computes the age from it
+STORED_AT_HEADER = b"X-Cache-Stored-At"
+
+# Evict down to this share of HTTPCACHE_MAX_SIZE_MB, not just below it
+EVICT_TO = 0.9
+EVICT_EVERY = 200
+
+
+def request_type(request):
+    """'article' for ad detail pages, 'search' for everything else (or meta 'cache_type')."""
+    if "cache_type" in request.meta:
+        return request.meta["cache_type"]
+    return ARTICLE if "/s-anzeige/" in request.url else SEARCH
+
+
+class ListingCachePolicy:
+
+    def __init__(self, settings):
+        self.ttl = dict(DEFAULT_TTL)
+        self.ttl.update(settings.getdict("HTTPCACHE_TTL"))
+        self.offline = settings.getbool("HTTPCACHE_OFFLINE")
+        self.ignore_schemes = settings.getlist("HTTPCACHE_IGNORE_SCHEMES")
+
+    def should_cache_request(self, request):
+        return request.method == "GET" and urlparse_cached(request).scheme not in self.ignore_schemes
+
+    def should_cache_response(self, response, request):
+        # Block and captcha pages must never be replayed as content
+        if response.status != 200:
+            return False
+        if request_type(request) in (ARTICLE, REVALIDATE):
+            return b"viewad-title" in response.body
+        return b"aditem" in response.body
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if self.offline:
+            return True
+        stored_at = cachedresponse.headers.get(STORED_AT_HEADER)
+        if stored_at and time.time() - float(stored_at) < self.ttl.get(request_type(request), 0):
+            return True
+
+        # Stale: let the server answer 304 if the page didn't change
+        etag = cachedresponse.headers.get(b"ETag")
+        if etag:
+            request.headers[b"If-None-Match"] = etag
+        last_modified = cachedresponse.headers.get(b"Last-Modified")
+        if last_modified:
+            request.headers[b"If-Modified-Since"] = last_modified
+        return False
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        return response.status == 304
+
+
+class ListingCacheMiddleware(HttpCacheMiddleware):
+
+    def process_response(self, request, response, spider):
+        # Set by process_request when the cached copy was stale and sent for revalidation
+        cachedresponse = request.meta.get("cached_response")
+        result = super().process_response(request, response, spider)
+        if cachedresponse is not None and result is cachedresponse and hasattr(self.storage, "refresh"):
+            self.storage.refresh(spider, request)
+        return result
+
+
+class ListingCacheStorage:
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"], createdir=True)
+        self.max_size = int(settings.getfloat("HTTPCACHE_MAX_SIZE_MB") * 1024 * 1024)
+        self.use_gzip = settings.getbool("HTTPCACHE_GZIP")
+        self.db = None
+        self.stores = 0
+
+    def open_spider(self, spider):
+        self.root = os.path.join(self.cachedir, spider.name)
+        os.makedirs(os.path.join(self.root, "bodies"), exist_ok=True)
+        self._fingerprinter = spider.crawler.request_fingerprinter
+
+        # Autocommit: the crawlers of a multi-job run share this index
+        self.db = sqlite3.connect(os.path.join(self.root, "index.sqlite"), isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "fingerprint TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, "
+            "body_hash TEXT, stored_at REAL, accessed_at REAL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, size INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_entries_body ON entries (body_hash)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+
+    def close_spider(self, spider):
+        if self.db is None:
+            return
+        self.evict()
+        self.db.close()
+        self.db = None
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.root, "bodies", body_hash[:2], body_hash + (".gz" if self.use_gzip else ""))
+
+    def _read_body(self, body_hash):
+        path = self._body_path(body_hash)
+        if not os.path.exists(path):
+            # Written with the other HTTPCACHE_GZIP setting?
+            path = path[:-3] if path.endswith(".gz") else path + ".gz"
+            if not os.path.exists(path):
+                return None
+        with open(path, 'rb') as body_file:
+            body = body_file.read()
+        return gzip.decompress(body) if path.endswith(".gz") else body
+
+    def retrieve_response(self, spider, request):
+        fingerprint = self._fingerprinter.fingerprint(request).hex()
+        row = self.db.execute(
+            "SELECT url, status, headers, body_hash, stored_at FROM entries WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body_hash, stored_at = row
+
+        body = self._read_body(body_hash)
+        if body is None:
+            self.db.execute("DELETE FROM entries WHERE fingerprint = ?", (fingerprint,))
+            return None
+        self.db.execute("UPDATE entries SET accessed_at = ? WHERE fingerprint = ?", (time.time(), fingerprint))
+
+        headers = Headers(json.loads(headers))
+        headers[STORED_AT_HEADER] = str(stored_at)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def refresh(self, spider, request):
+        """The server confirmed the cached page (304): its TTL starts again."""
+        now = time.time()
+        self.db.execute(
+            "UPDATE entries SET stored_at = ?, accessed_at = ? WHERE fingerprint = ?",
+            (now, now, self._fingerprinter.fingerprint(request).hex()),
+        )
+
+    def store_response(self, spider, request, response):
+        fingerprint = self._fingerprinter.fingerprint(request).hex()
+        body_hash = hashlib.sha1(response.body).hexdigest()
+
+        # Same content (e.g. an unchanged page fetched again) is kept once
+        if self.db.execute("SELECT 1 FROM bodies WHERE hash = ?", (body_hash,)).fetchone() is None:
+            path = self._body_path(body_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = gzip.compress(response.body) if self.use_gzip else response.body
+            temp_path = path + ".tmp"
+            with open(temp_path, 'wb') as body_file:
+                body_file.write(data)
+            os.replace(temp_path, path)
+            self.db.execute("INSERT INTO bodies (hash, size) VALUES (?, ?)", (body_hash, len(data)))
+
+        headers = {
+            key.decode("latin1"): [value.decode("latin1") for value in values]
+            for key, values in response.headers.items()
+            if key.lower() != STORED_AT_HEADER.lower()
+        }
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries (fingerprint, url, status, headers, body_hash, stored_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (fingerprint, response.url, response.status, json.dumps(headers), body_hash, now, now),
+        )
+
+        self.stores += 1
+        if self.stores % EVICT_EVERY == 0:
+            self.evict()
+
+    def _delete_body(self, body_hash):
+        for path in (self._body_path(body_hash), self._body_path(body_hash) + ".gz"):
+            if os.path.exists(path):
+                os.remove(path)
+        self.db.execute("DELETE FROM bodies WHERE hash = ?", (body_hash,))
+
+    def evict(self):
+        """Drops unreferenced bodies, then least recently used pages until the cache fits HTTPCACHE_MAX_SIZE_MB."""
+        orphans = self.db.execute(
+            "SELECT hash FROM bodies WHERE hash NOT IN (SELECT body_hash FROM entries)"
+        ).fetchall()
+        for (body_hash,) in orphans:
+            self._delete_body(body_hash)
+
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+        if not self.max_size or total <= self.max_size:
+            return
+
+        target = self.max_size * EVICT_TO
+        evicted = 0
+        rows = self.db.execute("SELECT fingerprint, body_hash FROM entries ORDER BY accessed_at").fetchall()
+        for fingerprint, body_hash in rows:
+            if total <= target:
+                break
+            self.db.execute("DELETE FROM entries WHERE fingerprint = ?", (fingerprint,))
+            evicted += 1
+            if self.db.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone() is None:
+                size = self.db.execute("SELECT size FROM bodies WHERE hash = ?", (body_hash,)).fetchone()
+                self._delete_body(body_hash)
+                total -= size[0] if size else 0
+        logger.info(f"HTTP cache: evicted {evicted} pages, {total / 1024 / 1024:.1f} MB left")
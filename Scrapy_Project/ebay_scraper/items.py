@@ -3,10 +3,123 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
 import scrapy
 
+DATE_FORMAT = "%d.%m.%Y"
+NON_DIGITS = re.compile(r"[^\d]")
+# "149,99 €", "1.299,50" (cents), but not "1.299" (thousands separator)
+DECIMAL_PRICE = re.compile(r"(\d+(?:\.\d{3})*)[.,](\d{1,2})(?!\d)")
+
+
+def to_text(value):
+    return "" if value is None else str(value).strip()
+
+
+def to_optional_text(value):
+    return None if value is None else to_text(value)
+
+
+def whole_euros(amount):
+    # Cents round half up, "0,50" -> 1 (round() would give 0)
+    return int(Decimal(str(amount)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_price(value):
+    # "1299" -> 1299, "149,99 €" -> 150, "Zu verschenken" / "VB" / None -> 0
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return whole_euros(value)
+    decimal = DECIMAL_PRICE.search(str(value or ""))
+    if decimal:
+        return whole_euros(f"{decimal.group(1).replace('.', '')}.{decimal.group(2)}")
+    digits = NON_DIGITS.sub("", str(value or ""))
+    return int(digits) if digits else 0
+
+
+def to_date(value):
+    # "28.12.2025" -> date(2025, 12, 28), anything unreadable -> None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date) or value is None:
+        return value
+    try:
+        return datetime.strptime(str(value).strip()[:10], DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+
+def to_flag(value):
+    return None if value is None else bool(value)
+
+
+@dataclass(slots=True)
+class EbayScraperItem:
+    # A scraped listing. Build it with from_raw(), which runs the converter
+    # of every field once; to_dict() gives the dict stored in the datasets.
+    ID: str
+    URL: str
+    Preis: int
+    Seller_ID: str
+    Artikelstitel: str
+    Artikelsbeschreibung: str
+    Date: date
+    Place: str
+    # Only set for listings stored from their search result card (and after their backfill)
+    Card_Only: bool = None
+    # ID of the earlier listing this one reposts/copies (see ebay_scraper/duplicates.py)
+    Duplicate_Of: str = None
+
+    @classmethod
+    def from_raw(cls, **raw):
+        return cls(**{name: convert(raw[name]) for name, convert in SCHEMA.items() if name in raw})
+
+    def to_dict(self):
+        listing = {
+            "ID": self.ID,
+            "URL": self.URL,
+            "Preis": self.Preis,
+            "Seller_ID": self.Seller_ID,
+            "Artikelstitel": self.Artikelstitel,
+            "Artikelsbeschreibung": self.Artikelsbeschreibung,
+            "Date": self.Date.strftime(DATE_FORMAT) if self.Date else None,
+            "Place": self.Place,
+        }
+        if self.Card_Only is not None:
+            listing["Card_Only"] = self.Card_Only
+        if self.Duplicate_Of is not None:
+            listing["Duplicate_Of"] = self.Duplicate_Of
+        return listing
+
+
+# Field -> converter, applied once in EbayScraperItem.from_raw()
+SCHEMA = {
+    "ID": to_text,
+    "URL": to_text,
+    "Preis": to_price,
+    "Seller_ID": to_text,
+    "Artikelstitel": to_text,
+    "Artikelsbeschreibung": to_text,
+    "Date": to_date,
+    "Place": to_text,
+    "Card_Only": to_flag,
+    "Duplicate_Of": to_optional_text,
+}
+
+
+class ListingUpdateItem(scrapy.Item):
+    # Changed fields of an already stored listing, e.g. details of a card-only listing
+    ID = scrapy.Field()
+    Fields = scrapy.Field()
+
 
-class EbayScraperItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+class PriceUpdateItem(scrapy.Item):
+    # Price change of an already stored listing, seen on a search results page
+    ID = scrapy.Field()
+    Preis = scrapy.Field()
+    Old_Preis = scrapy.Field()
@@ -3,11 +3,18 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import re
+import time
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from ebay_scraper.revalidation import marker_pattern
+
 
 class EbayScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -57,47 +64,207 @@ class EbayScraperSpiderMiddleware:
 
 
 class EbayScraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    # Adaptive rate control and ban detection per download slot (= domain).
+    #
+    # After ADAPTIVE_INCREASE_AFTER healthy responses (no block, latency below
+    # ADAPTIVE_TARGET_LATENCY) the slot first halves a running backoff delay,
+    # then gets one more concurrent request, up to ADAPTIVE_MAX_CONCURRENCY.
+    # Slow responses take one request away again. A block (ban status code,
+    # captcha page, article page without title) halves the concurrency,
+    # doubles the delay and re-queues the request.
+    #
+    # The limits are written to Scrapy's downloader slots, the same knobs
+    # AutoThrottle turns, so keep AutoThrottle disabled.
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ADAPTIVE_THROTTLE_ENABLED"):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+
+        self.max_concurrency = settings.getint("ADAPTIVE_MAX_CONCURRENCY") or settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+        self.min_concurrency = max(1, min(settings.getint("ADAPTIVE_MIN_CONCURRENCY", 1), self.max_concurrency))
+        self.start_concurrency = max(self.min_concurrency, min(settings.getint("ADAPTIVE_START_CONCURRENCY", 2), self.max_concurrency))
+        self.min_delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.backoff_start = settings.getfloat("ADAPTIVE_BACKOFF_START", 5.0)
+        self.max_delay = settings.getfloat("ADAPTIVE_MAX_DELAY", 300.0)
+        self.increase_after = settings.getint("ADAPTIVE_INCREASE_AFTER", 10)
+        self.target_latency = settings.getfloat("ADAPTIVE_TARGET_LATENCY", 2.0)
+        self.max_block_retries = settings.getint("ADAPTIVE_MAX_BLOCK_RETRIES", 5)
+        self.ban_codes = {int(code) for code in settings.getlist("ADAPTIVE_BAN_HTTP_CODES", [403, 429])}
+
+        # Captcha/challenge pages: a marker without any real listing content
+        markers = settings.getlist("ADAPTIVE_CAPTCHA_MARKERS")
+        self.captcha_pattern = re.compile(b"|".join(re.escape(m.encode("utf-8")) for m in markers), re.I) if markers else None
+        self.content_markers = [m.encode("utf-8") for m in settings.getlist("ADAPTIVE_CONTENT_MARKERS", ["viewad-title", "aditem"])]
+        # Pages of deleted ads have no title either, but they are no block
+        self.removed_pattern = marker_pattern(settings.getlist("REMOVED_AD_MARKERS"))
+
+        # Slot key -> {"concurrency", "delay", "healthy", "latency", "cooldown_until"}
+        self.slots = {}
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        s = cls(crawler)
+        crawler.signals.connect(s.request_reached_downloader, signal=signals.request_reached_downloader)
         return s
 
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+    def _state(self, key):
+        if key not in self.slots:
+            self.slots[key] = {
+                "concurrency": self.start_concurrency,
+                "delay": self.min_delay,
+                "healthy": 0,
+                "latency": None,
+                "cooldown_until": 0.0,
+            }
+        return self.slots[key]
+
+    def _apply(self, key):
+        # Slots are created lazily and garbage collected when idle, so the
+        # limits are (re)applied whenever a request reaches one
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+        state = self._state(key)
+        slot.concurrency = state["concurrency"]
+        slot.delay = state["delay"]
+
+    def request_reached_downloader(self, request, spider):
+        key = request.meta.get("download_slot")
+        if key is not None:
+            self._apply(key)
+
+    def block_reason(self, request, response):
+        """Returns why the response looks like a block, or None."""
+        if response.status in self.ban_codes:
+            return f"http_{response.status}"
+        if response.status != 200:
+            return None
+        body = response.body
+        # Same case parse_article_page reports as "Layout changed or blocked?"
+        if "/s-anzeige/" in request.url and b"viewad-title" not in body:
+            if self.removed_pattern is not None and self.removed_pattern.search(body):
+                return None
+            return "missing_title"
+        if self.captcha_pattern is not None and self.captcha_pattern.search(body):
+            if not any(marker in body for marker in self.content_markers):
+                return "captcha"
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        # Pages from the HTTP cache say nothing about the server
+        if "cached" in response.flags:
+            return response
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
-        return response
+        key = request.meta.get("download_slot") or urlparse_cached(request).hostname
+        state = self._state(key)
+        reason = self.block_reason(request, response)
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        if reason is None:
+            self._healthy(key, state, request.meta.get("download_latency"), spider)
+            return response
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+        self.stats.inc_value("adaptive/blocks")
+        self.stats.inc_value(f"adaptive/blocks/{reason}")
+        self._back_off(key, state, reason, response, spider)
 
-    def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+        retries = request.meta.get("block_retries", 0)
+        if retries >= self.max_block_retries:
+            self.stats.inc_value("adaptive/gave_up")
+            spider.logger.warning(f"Still blocked ({reason}) after {retries} retries, giving up on {request.url}")
+            return response
+
+        # Back into the scheduler, it goes out again at the slowed-down rate
+        retry_request = request.copy()
+        retry_request.meta["block_retries"] = retries + 1
+        retry_request.dont_filter = True
+        self.stats.inc_value("adaptive/requeued")
+        return retry_request
+
+    def _healthy(self, key, state, latency, spider):
+        if latency is not None:
+            state["latency"] = latency if state["latency"] is None else 0.8 * state["latency"] + 0.2 * latency
+        if state["latency"] is not None and state["latency"] > self.target_latency:
+            # Server is getting slow: one request less, and start counting again
+            state["healthy"] = 0
+            if state["concurrency"] > self.min_concurrency:
+                state["concurrency"] -= 1
+                self._apply(key)
+            return
+
+        state["healthy"] += 1
+        if state["healthy"] < self.increase_after:
+            return
+        state["healthy"] = 0
+
+        if state["delay"] > self.min_delay:
+            # Leave a backoff gradually before adding concurrency again
+            delay = state["delay"] / 2
+            state["delay"] = self.min_delay if delay < self.min_delay + 0.1 else delay
+        elif state["concurrency"] < self.max_concurrency:
+            state["concurrency"] += 1
+        else:
+            return
+        self._apply(key)
+        self.stats.max_value("adaptive/max_concurrency", state["concurrency"])
+        spider.logger.debug(f"Adaptive rate for {key}: concurrency {state['concurrency']}, delay {state['delay']:.2f}s")
+
+    def _back_off(self, key, state, reason, response, spider):
+        state["healthy"] = 0
+        now = time.time()
+        # Requests that were already in flight get blocked too, one backoff step per wave
+        if now < state["cooldown_until"]:
+            return
+
+        old_concurrency, old_delay = state["concurrency"], state["delay"]
+        delay = max(self.backoff_start, old_delay * 2)
+        retry_after = response.headers.get(b"Retry-After")
+        if retry_after and retry_after.strip().isdigit():
+            delay = max(delay, float(retry_after.strip()))
+        state["delay"] = min(self.max_delay, delay)
+        state["concurrency"] = max(self.min_concurrency, old_concurrency // 2)
+        state["cooldown_until"] = now + state["delay"]
+        self._apply(key)
+
+        spider.logger.warning(
+            f"Blocked ({reason}) on {key}: concurrency {old_concurrency} -> {state['concurrency']}, "
+            f"delay {old_delay:.1f}s -> {state['delay']:.1f}s"
+        )
+
+
+class ConcurrencyBudgetMiddleware:
+    # Shares one global and one per-domain concurrency budget between all
+    # crawlers of a multi-job run (see ebay_scraper/runner.py). Each crawler
+    # may use the whole budget on its own, the budget caps them together.
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.acquired = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        budget = crawler.settings.get("CONCURRENCY_BUDGET")
+        if budget is None:
+            raise NotConfigured
+        return cls(budget)
+
+    def process_request(self, request, spider):
+        # Waits (without blocking the reactor) until a slot is free
+        domain = urlparse_cached(request).hostname
+        d = self.budget.acquire(domain)
+        d.addCallback(lambda _: self.acquired.__setitem__(id(request), domain))
+        return d
+
+    def _release(self, request):
+        domain = self.acquired.pop(id(request), None)
+        if domain is not None:
+            self.budget.release(domain)
+
+    def process_response(self, request, response, spider):
+        self._release(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._release(request)
@@ -3,11 +3,249 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import threading
+import time
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy import signals
+from twisted.internet import defer, task, threads
+
+from ebay_scraper.alerts import AlertEngine
+from ebay_scraper.deltas import DeltaWriter, delta_folder
+from ebay_scraper.enrichment import enrich_listings, enrichment_updates
+from ebay_scraper.items import EbayScraperItem, ListingUpdateItem, PriceUpdateItem, to_price
 
 
 class EbayScraperPipeline:
+    """
+    Write-behind persistence for the spider's listing store.
+
+    Items are buffered in memory and written in batches, once
+    PERSIST_BATCH_SIZE items are buffered or PERSIST_FLUSH_INTERVAL seconds
+    have passed. Writes run in a worker thread so the reactor keeps
+    downloading, and everything left is flushed in close_spider.
+
+    What each batch actually changed (new listings, price changes, sold and
+    removed ads) also goes to the run's delta file, see ebay_scraper/deltas.py.
+    New listings and price drops are checked against the saved-search alert
+    rules (ebay_scraper/alerts.py); the matches are delivered in another thread
+    once the batch is written. New listings also go to the near-duplicate
+    index (ebay_scraper/duplicates.py), reposts are stored with Duplicate_Of.
+    Listings are stored with their Ext_* specs, PLZ and coordinates
+    (ebay_scraper/enrichment.py); stored listings of an older extractor
+    version are re-enriched with the first batch.
+    """
+
+    def __init__(self, batch_size=50, flush_interval=5.0, stats=None, deltas_dir=None, enrich=True, geocode=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.deltas_dir = deltas_dir
+        self.enrich = enrich
+        self.geocode = geocode
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            batch_size=crawler.settings.getint("PERSIST_BATCH_SIZE", 50),
+            flush_interval=crawler.settings.getfloat("PERSIST_FLUSH_INTERVAL", 5.0),
+            stats=crawler.stats,
+            deltas_dir=crawler.settings.get("DELTAS_DIR") if crawler.settings.getbool("DELTAS_ENABLED") else None,
+            enrich=crawler.settings.getbool("ENRICHMENT_ENABLED", True),
+            geocode=crawler.settings.getbool("ENRICHMENT_GEOCODE", True),
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.store = getattr(spider, "store", None)
+        self.listing_index = getattr(spider, "listing_index", None)
+        self.price_history = getattr(spider, "price_history", None)
+        self.duplicate_index = getattr(spider, "duplicate_index", None)
+        self.deltas = None
+        self.alerts = AlertEngine.from_settings(spider.crawler.settings, spider.config.get("task_name")) if self.store is not None else None
+        if self.store is not None and self.deltas_dir:
+            self.deltas = DeltaWriter(delta_folder(spider.config["output_filename"], self.deltas_dir), {
+                "job": spider.config.get("task_name"),
+                "mode": getattr(spider, "mode", "crawl"),
+                "dataset": getattr(spider, "dataset_filename", None),
+            })
+        # Lets the spider hand in listings fetched by other jobs of the run
+        spider.persistence = self
+        self.listings = []
+        self.price_updates = []
+        self.listing_updates = []
+        # Stored listings enriched by an older extractor version, redone in the first batch
+        self.stale_listings = getattr(spider, "stale_enrichment", []) if self.enrich else []
+        spider.stale_enrichment = []
+        self.pending_flushes = set()
+        self.pending_alerts = set()
+        # Batches are written one after the other, in flush order: a DeferredLock
+        # hands out the lock first come, first served. An update for an ID added
+        # by an earlier batch must not reach the store before that batch.
+        self.write_queue = defer.DeferredLock()
+        # Guard only, the queue already keeps writes apart
+        self.write_lock = threading.Lock()
+
+        self.flush_task = task.LoopingCall(self.flush, spider)
+        self.flush_task.start(self.flush_interval, now=False)
+
     def process_item(self, item, spider):
+        if self.store is None:
+            return item
+
+        # The index is updated right away, so the spider sees buffered items as known
+        if isinstance(item, PriceUpdateItem):
+            self.price_updates.append((item["ID"], item["Preis"]))
+            if self.listing_index is not None:
+                self.listing_index.update_price(item["ID"], item["Preis"])
+        elif isinstance(item, ListingUpdateItem):
+            self.listing_updates.append((item["ID"], item["Fields"]))
+            if self.listing_index is not None:
+                self.listing_index.update(item["ID"], item["Fields"])
+        else:
+            # Typed listings are stored in their dataset form (Date as dd.mm.yyyy)
+            listing = item.to_dict() if isinstance(item, EbayScraperItem) else ItemAdapter(item).asdict()
+            self.listings.append(listing)
+            if self.listing_index is not None:
+                self.listing_index.add(listing)
+
+        if len(self.listings) + len(self.price_updates) + len(self.listing_updates) >= self.batch_size:
+            self.flush(spider)
         return item
+
+    def flush(self, spider):
+        if not self.listings and not self.price_updates and not self.listing_updates and not self.stale_listings:
+            return defer.succeed(None)
+
+        listings, price_updates, listing_updates = self.listings, self.price_updates, self.listing_updates
+        self.listings, self.price_updates, self.listing_updates = [], [], []
+        stale_listings, self.stale_listings = self.stale_listings, []
+
+        d = self.write_queue.run(threads.deferToThread, self._write_batch, listings, price_updates, listing_updates, spider, stale_listings)
+        # Added after run(): the write queue is released before alerts are sent
+        d.addCallback(self._deliver_alerts, spider)
+        d.addErrback(lambda failure: spider.logger.error(f"Persisting batch failed: {failure.getErrorMessage()}"))
+        self.pending_flushes.add(d)
+        d.addBoth(lambda _: self.pending_flushes.discard(d))
+        return d
+
+    def _write_batch(self, listings, price_updates, listing_updates, spider, stale_listings=()):
+        """Writes one batch, returns its alert matches (delivered by _deliver_alerts)."""
+        alerts = []
+        with self.write_lock:
+            start = time.perf_counter()
+            merged = []
+            if self.duplicate_index is not None and listings:
+                merged = self._tag_duplicates(listings)
+            if self.enrich:
+                self._enrich(listings, listing_updates)
+            added = self.store.add_listings(listings)
+            changed = self.store.update_prices(price_updates)
+            updated = self.store.update_listings(listing_updates)
+            if merged:
+                # Not part of the delta either: Duplicate_Of of listings whose cluster was merged
+                updated += self.store.update_listings(merged)
+            if stale_listings:
+                # Not part of the delta: only derived fields change
+                updated += self.store.update_listings(enrichment_updates(stale_listings, self.geocode))
+                if self.stats is not None:
+                    self.stats.inc_value("enrichment/reprocessed", len(stale_listings))
+            self.store.commit()
+            if self.price_history is not None:
+                # First price of new listings and every change (unchanged prices are skipped)
+                events = [(listing.get("ID"), listing.get("Preis")) for listing in added]
+                events += [(doc_id, new_price) for doc_id, _, new_price in changed]
+                events += [(doc_id, fields["Preis"]) for doc_id, fields in listing_updates if "Preis" in fields]
+                self.price_history.record_many(events)
+            if self.deltas is not None:
+                self.deltas.write_batch(added, changed, listing_updates)
+            if self.alerts is not None:
+                alerts = self._check_alerts(added, changed)
+                if alerts and self.stats is not None:
+                    self.stats.inc_value("alerts/matches", len(alerts))
+            elapsed = time.perf_counter() - start
+
+        for listing in added:
+            spider.logger.info(f"Listing with ID {listing['ID']} added")
+        for doc_id, old_price, new_price in changed:
+            spider.logger.info(f"📉 Price update for {doc_id}: {old_price} -> {new_price}")
+
+        if self.stats is not None:
+            self.stats.inc_value("persistence/flushes")
+            self.stats.inc_value("persistence/listings_added", len(added))
+            self.stats.inc_value("persistence/prices_updated", len(changed))
+            self.stats.inc_value("persistence/listings_updated", updated)
+            self.stats.inc_value("persistence/flush_time", elapsed)
+        return alerts
+
+    def _deliver_alerts(self, matches, spider):
+        # Webhooks can be slow, later batches don't wait for them
+        if not matches:
+            return
+        d = threads.deferToThread(self.alerts.deliver, matches)
+        d.addErrback(lambda failure: spider.logger.error(f"Delivering alerts failed: {failure.getErrorMessage()}"))
+        self.pending_alerts.add(d)
+        d.addBoth(lambda _: self.pending_alerts.discard(d))
+
+    def _enrich(self, listings, listing_updates):
+        # Backfilled detail pages bring the full text, their specs are redone too
+        backfilled = [fields for _, fields in listing_updates if "Artikelstitel" in fields]
+        enrich_listings(listings + backfilled, self.geocode)
+        if self.stats is not None and (listings or backfilled):
+            self.stats.inc_value("enrichment/listings", len(listings) + len(backfilled))
+
+    def _tag_duplicates(self, listings):
+        """Sets Duplicate_Of of new listings, returns the updates for stored ones moved by a cluster merge."""
+        duplicates = 0
+        merged = {}
+        for listing in listings:
+            cluster, moved = self.duplicate_index.add(listing)
+            merged.update((doc_id, cluster) for doc_id in moved)
+            if cluster != listing.get("ID"):
+                listing["Duplicate_Of"] = cluster
+                duplicates += 1
+        self.duplicate_index.commit()
+        if duplicates and self.stats is not None:
+            self.stats.inc_value("duplicates/found", duplicates)
+        # Moved listings of this batch are not stored yet, the others get an update
+        batch = {listing.get("ID"): listing for listing in listings}
+        updates = []
+        for doc_id, cluster in merged.items():
+            if doc_id in batch:
+                batch[doc_id]["Duplicate_Of"] = cluster
+            else:
+                updates.append((doc_id, {"Duplicate_Of": cluster}))
+        if merged and self.stats is not None:
+            self.stats.inc_value("duplicates/merged", len(merged))
+        return updates
+
+    def _check_alerts(self, added, changed):
+        matches = []
+        for listing in added:
+            # A repost already alerted as the listing it copies
+            if listing.get("Duplicate_Of"):
+                continue
+            matches += self.alerts.check(listing, deliver=False)
+        for doc_id, old_price, new_price in changed:
+            # Only a cheaper price can newly match a saved search
+            if new_price < to_price(old_price):
+                listing = self.store.get(doc_id)
+                if listing is not None:
+                    matches += self.alerts.check(listing, "price_drop", old_price, deliver=False)
+        return matches
+
+    def close_spider(self, spider):
+        if self.flush_task.running:
+            self.flush_task.stop()
+        self.flush(spider)
+        # The store itself is closed by the spider once these (and the alerts they matched) are done
+        d = defer.DeferredList(list(self.pending_flushes))
+        d.addCallback(lambda _: defer.DeferredList(list(self.pending_alerts)))
+        return d
+
+    def spider_closed(self, spider, reason):
+        # Sent after close_spider's flushes completed, with the finish reason
+        if getattr(self, "deltas", None) is not None:
+            self.deltas.close(reason)
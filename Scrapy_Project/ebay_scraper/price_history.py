@@ -0,0 +1,221 @@
+"""
+Price history of a job's listings.
+
+Stores only ever hold the current Preis. Every observed price change is kept
+here instead, as an append-only log of fixed-size change events next to the
+dataset:
+
+    data/<dataset>.prices        12-byte records (ID number, unix time, price)
+    data/<dataset>.prices.ids    listing IDs, one per line; line n = ID number n
+
+A listing's first event is the price it was stored with, every later event
+a change. Events are appended in time order, so "what changed since T" is a
+binary search on the timestamps plus the events after it, and the trajectory
+of a listing is looked up through the per-ID event list built at load time.
+Neither scans the listings.
+
+Query from the command line (inside Scrapy_Project/):
+
+    python -m ebay_scraper.price_history data/data_gaming_laptops.json trajectory 2712345678-278-1234
+    python -m ebay_scraper.price_history data/data_gaming_laptops.json drops --percent 10 --days 7
+"""
+
+import argparse
+import logging
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# ID number, unix timestamp, price in whole euros
+RECORD = struct.Struct("<IIi")
+
+DAY = 24 * 3600
+
+
+def price_history_filename(output_filename):
+    """The history file that belongs to a job's output file (any storage engine)."""
+    return os.path.splitext(output_filename)[0] + ".prices"
+
+
+def _timestamp(value):
+    # Listing dates are dd.mm.yyyy
+    try:
+        return int(datetime.strptime(str(value), '%d.%m.%Y').timestamp())
+    except ValueError:
+        return None
+
+
+class PriceHistory:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.ids_filename = filename + ".ids"
+        self.is_new = not os.path.exists(filename)
+
+        # Column arrays of all events, in time order
+        self.id_numbers = array('I')
+        self.timestamps = array('I')
+        self.prices = array('i')
+        # ID -> ID number, and ID number -> positions of its events
+        self.ids = []
+        self.id_index = {}
+        self.positions = {}
+
+        self._records_file = None
+        self._ids_file = None
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.ids_filename):
+            with open(self.ids_filename, 'r', encoding='utf-8') as ids_file:
+                self.ids = [line.rstrip("\n") for line in ids_file]
+            self.id_index = {doc_id: number for number, doc_id in enumerate(self.ids)}
+        if self.is_new:
+            return
+
+        with open(self.filename, 'rb') as records_file:
+            data = records_file.read()
+        # A crash can leave half a record at the end
+        usable = len(data) - len(data) % RECORD.size
+        events = [event for event in RECORD.iter_unpack(data[:usable]) if event[0] < len(self.ids)]
+        if usable != len(data) or len(events) != usable // RECORD.size:
+            logger.warning(f"Price history {self.filename}: ignored an incomplete write at the end")
+
+        # Appends are in time order, only a clock change could break it
+        if any(events[i][1] > events[i + 1][1] for i in range(len(events) - 1)):
+            events.sort(key=lambda event: event[1])
+        for id_number, timestamp, price in events:
+            self._add(id_number, timestamp, price)
+
+    def _add(self, id_number, timestamp, price):
+        self.positions.setdefault(id_number, []).append(len(self.timestamps))
+        self.id_numbers.append(id_number)
+        self.timestamps.append(timestamp)
+        self.prices.append(price)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def last_price(self, doc_id):
+        positions = self.positions.get(self.id_index.get(doc_id))
+        return self.prices[positions[-1]] if positions else None
+
+    def record_many(self, events):
+        """
+        Appends (ID, price[, unix time]) events. Prices equal to the last
+        recorded one are skipped. Returns the number of events written.
+        """
+        now = int(time.time())
+        records = []
+        new_ids = []
+        for event in events:
+            doc_id, price = event[0], event[1]
+            timestamp = event[2] if len(event) > 2 and event[2] is not None else now
+            try:
+                price = int(price)
+            except (TypeError, ValueError):
+                continue
+            if self.last_price(doc_id) == price:
+                continue
+            if doc_id not in self.id_index:
+                self.id_index[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                new_ids.append(doc_id)
+            # Never before the last event, binary search relies on the order
+            if self.timestamps and timestamp < self.timestamps[-1]:
+                timestamp = self.timestamps[-1]
+            id_number = self.id_index[doc_id]
+            self._add(id_number, timestamp, price)
+            records.append(RECORD.pack(id_number, timestamp, price))
+
+        if records:
+            # IDs first: a record must never point past the ID table
+            if self._ids_file is None:
+                os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+                self._ids_file = open(self.ids_filename, 'a', encoding='utf-8')
+                self._records_file = open(self.filename, 'ab')
+            if new_ids:
+                self._ids_file.write("".join(doc_id + "\n" for doc_id in new_ids))
+                self._ids_file.flush()
+            self._records_file.write(b"".join(records))
+            self._records_file.flush()
+            self.is_new = False
+        return len(records)
+
+    def record(self, doc_id, price, timestamp=None):
+        return bool(self.record_many([(doc_id, price, timestamp)]))
+
+    def import_listings(self, listings):
+        """Seeds a new history from stored listings: Preis at the listing date."""
+        events = []
+        for listing in listings:
+            listed = _timestamp(listing.get("Date"))
+            events.append((listing.get("ID"), listing.get("Preis"), listed or int(time.time())))
+        events.sort(key=lambda event: event[2])
+        return self.record_many(events)
+
+    def trajectory(self, doc_id):
+        """(datetime, price) of every recorded price of a listing, oldest first."""
+        positions = self.positions.get(self.id_index.get(doc_id), [])
+        return [(datetime.fromtimestamp(self.timestamps[p]), self.prices[p]) for p in positions]
+
+    def price_drops(self, min_percent=0.0, days=7, now=None):
+        """
+        Listings whose price fell by at least ``min_percent`` within the last
+        ``days``: {ID: (price before, current price, drop in percent)}. The
+        price before is the one in effect when the period started, or the
+        first one for listings added during it.
+        """
+        since = int(now if now is not None else time.time()) - int(days * DAY)
+        start = bisect_left(self.timestamps, since)
+        drops = {}
+        for id_number in set(self.id_numbers[start:]):
+            positions = self.positions[id_number]
+            before = bisect_left(positions, start)
+            old_price = self.prices[positions[before - 1] if before else positions[0]]
+            new_price = self.prices[positions[-1]]
+            if old_price <= 0 or new_price >= old_price:
+                continue
+            drop = 100.0 * (old_price - new_price) / old_price
+            if drop >= min_percent:
+                drops[self.ids[id_number]] = (old_price, new_price, drop)
+        return drops
+
+    def close(self):
+        for history_file in (self._records_file, self._ids_file):
+            if history_file is not None:
+                history_file.close()
+        self._records_file = self._ids_file = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the price history of a dataset")
+    parser.add_argument("dataset", help="Dataset or job output file, e.g. data/data_gaming_laptops.json")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    trajectory_parser = subparsers.add_parser("trajectory", help="Price history of one listing")
+    trajectory_parser.add_argument("id")
+
+    drops_parser = subparsers.add_parser("drops", help="Listings that got cheaper recently")
+    drops_parser.add_argument("--percent", type=float, default=10.0)
+    drops_parser.add_argument("--days", type=float, default=7.0)
+
+    args = parser.parse_args(argv)
+    history = PriceHistory(price_history_filename(args.dataset))
+    if args.command == "trajectory":
+        for when, price in history.trajectory(args.id):
+            print(f"{when:%Y-%m-%d %H:%M}  {price:>7} €")
+    else:
+        drops = history.price_drops(args.percent, args.days)
+        for doc_id, (old_price, new_price, drop) in sorted(drops.items(), key=lambda item: -item[1][2]):
+            print(f"{doc_id:<24} {old_price:>7} € -> {new_price:>7} €  (-{drop:.0f}%)")
+        print(f"{len(drops)} listings dropped by {args.percent:.0f}% or more in the last {args.days:g} days")
+
+
+if __name__ == "__main__":
+    main()
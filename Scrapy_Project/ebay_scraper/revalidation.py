@@ -0,0 +1,127 @@
+"""
+Revalidation of stored listings (runner --mode revalidate).
+
+A crawl only sees the ads that are on its search pages, so prices of ads that
+dropped off those pages go stale and deleted ads are never noticed. A
+revalidation run requests the ad pages of stored listings directly, within a
+request budget per run, and records on each listing:
+
+    Status          "active", "sold" or "removed"
+    Last_Checked    when the ad page was last requested
+
+Price changes update Preis and go to the job's price history (price_history.py).
+
+Listings are picked by priority: the longer a listing was not checked the
+higher, with a bonus for recently listed ads (they sell fast), cheap ones and
+ones that match the job's keywords. Sold and removed listings are final and
+not requested again.
+
+Job config, all keys optional:
+
+    "revalidate": {
+        "budget": 200,            # requests per run (runner --budget overrides)
+        "min_age_hours": 24,      # don't check a listing again before that
+        "cheap_below": 500,       # price bonus
+        "keywords": ["RTX 4070"]  # title/description bonus
+    }
+"""
+
+import heapq
+import re
+from datetime import datetime
+
+from ebay_scraper.items import to_date, to_price
+
+STATUS_ACTIVE = "active"
+STATUS_SOLD = "sold"
+STATUS_REMOVED = "removed"
+FINAL_STATUSES = (STATUS_SOLD, STATUS_REMOVED)
+
+CHECKED_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+DEFAULT_BUDGET = 200
+DEFAULT_MIN_AGE_HOURS = 24
+# Listed within this many days counts as recent
+RECENT_DAYS = 7
+# Staleness counts up to this many days, so very old listings don't crowd out the rest
+MAX_STALENESS_DAYS = 30
+RECENT_BONUS = 10
+CHEAP_BONUS = 5
+KEYWORD_BONUS = 10
+
+# Status codes of deleted ads (requested with handle_httpstatus_list)
+REMOVED_HTTP_CODES = [404, 410]
+
+
+def marker_pattern(markers):
+    """Case-insensitive byte pattern for a list of page markers (None for no markers)."""
+    if not markers:
+        return None
+    return re.compile(b"|".join(re.escape(marker.encode("utf-8")) for marker in markers), re.I)
+
+
+def revalidation_priority(listing, now, rules):
+    """Priority of a stored listing, or None if it is not due for a check."""
+    if listing.get("Status") in FINAL_STATUSES or not listing.get("URL"):
+        return None
+
+    listed = to_date(listing.get("Date"))
+    last_checked = None
+    if listing.get("Last_Checked"):
+        try:
+            last_checked = datetime.strptime(listing["Last_Checked"], CHECKED_FORMAT)
+        except ValueError:
+            pass
+
+    if last_checked is not None:
+        age_hours = (now - last_checked).total_seconds() / 3600
+        if age_hours < rules.get("min_age_hours", DEFAULT_MIN_AGE_HOURS):
+            return None
+    elif listed is not None:
+        age_hours = (now.date() - listed).days * 24
+    else:
+        age_hours = MAX_STALENESS_DAYS * 24
+
+    priority = min(max(age_hours, 0) / 24, MAX_STALENESS_DAYS)
+    if listed is not None and (now.date() - listed).days <= RECENT_DAYS:
+        priority += RECENT_BONUS
+    cheap_below = rules.get("cheap_below")
+    if cheap_below and 0 < to_price(listing.get("Preis")) <= cheap_below:
+        priority += CHEAP_BONUS
+    keywords = rules.get("keywords")
+    if keywords:
+        text = f"{listing.get('Artikelstitel', '')} {listing.get('Artikelsbeschreibung', '')}".lower()
+        if any(keyword.lower() in text for keyword in keywords):
+            priority += KEYWORD_BONUS
+    return priority
+
+
+def select_for_revalidation(listings, budget, rules, now=None):
+    """The ``budget`` due listings with the highest priority, highest first."""
+    now = now or datetime.now()
+    candidates = []
+    for listing in listings:
+        priority = revalidation_priority(listing, now, rules)
+        if priority is not None:
+            candidates.append((priority, listing))
+    return [listing for _, listing in heapq.nlargest(budget, candidates, key=lambda candidate: candidate[0])]
+
+
+def ad_status(response, sold_pattern=None, removed_pattern=None):
+    """
+    Status of an ad page response: "removed" for 404/410, a redirect away from
+    the ad or a "no longer available" page, "sold" if a sold marker is on the
+    page, "active" for a normal ad page and None if it can't tell (block page).
+    """
+    if response.status in REMOVED_HTTP_CODES:
+        return STATUS_REMOVED
+    if response.meta.get("redirect_urls") and "/s-anzeige/" not in response.url:
+        return STATUS_REMOVED
+    body = response.body
+    if b"viewad-title" not in body:
+        if removed_pattern is not None and removed_pattern.search(body):
+            return STATUS_REMOVED
+        return None
+    if sold_pattern is not None and sold_pattern.search(body):
+        return STATUS_SOLD
+    return STATUS_ACTIVE
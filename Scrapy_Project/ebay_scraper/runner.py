@@ -0,0 +1,179 @@
+"""
+Runs several scrape jobs in a single process.
+
+Every job gets its own crawler inside one CrawlerProcess, so interpreter,
+Scrapy and reactor start-up is paid once per batch. All crawlers share a
+global and a per-domain concurrency budget (ConcurrencyBudgetMiddleware),
+which keeps the batch as polite as a single crawl while letting one job use
+the whole budget when the others are done.
+
+Run inside Scrapy_Project/:
+
+    python -m ebay_scraper.runner                          # every jobs/*.json
+    python -m ebay_scraper.runner job_gaming_laptop.json   # selected jobs
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from twisted.internet import defer
+
+from ebay_scraper.duplicates import DuplicateIndex
+from ebay_scraper.seen_registry import SeenRegistry
+from ebay_scraper.spiders.kleinanzeigen_spider import KleinanzeigenSpider
+
+JOBS_FOLDER = "jobs"
+STATE_FOLDER = "state"
+
+
+class ConcurrencyBudget:
+    """Global + per-domain request slots shared by all crawlers of a run."""
+
+    def __init__(self, total, per_domain):
+        self.total = defer.DeferredSemaphore(total)
+        self.per_domain = per_domain
+        self.domains = {}
+
+    def _domain_semaphore(self, domain):
+        if domain not in self.domains:
+            self.domains[domain] = defer.DeferredSemaphore(self.per_domain)
+        return self.domains[domain]
+
+    def acquire(self, domain):
+        # Always domain first, then global, so waiting requests can't deadlock
+        d = self._domain_semaphore(domain).acquire()
+        d.addCallback(lambda _: self.total.acquire())
+        return d
+
+    def release(self, domain):
+        self.total.release()
+        self._domain_semaphore(domain).release()
+
+
+def resolve_job_files(jobs):
+    if not jobs:
+        return sorted(glob.glob(os.path.join(JOBS_FOLDER, "*.json")))
+
+    job_files = []
+    for job in jobs:
+        # Accept both "jobs/job_x.json" and "job_x.json"
+        if not os.path.exists(job) and os.path.exists(os.path.join(JOBS_FOLDER, job)):
+            job = os.path.join(JOBS_FOLDER, job)
+        if not os.path.exists(job):
+            print(f"!!! ERROR: Config file not found: {job}")
+            continue
+        job_files.append(job)
+    return job_files
+
+
+def print_summary(results):
+    print("==========================================")
+    print("Batch Summary")
+    print("==========================================")
+    header = f"{'Job':<32} {'Status':<12} {'Requests':>8} {'Items':>6} {'Added':>6} {'Prices':>6} {'Errors':>6} {'Time':>8}"
+    print(header)
+    print("-" * len(header))
+
+    totals = {"requests": 0, "items": 0, "added": 0, "prices": 0, "errors": 0}
+    for job_file, stats in results:
+        row = {
+            "requests": stats.get("downloader/request_count", 0),
+            "items": stats.get("item_scraped_count", 0),
+            "added": stats.get("persistence/listings_added", 0),
+            "prices": stats.get("persistence/prices_updated", 0),
+            "errors": stats.get("log_count/ERROR", 0),
+        }
+        for key, value in row.items():
+            totals[key] += value
+        print(
+            f"{os.path.basename(job_file):<32} {stats.get('finish_reason', 'not run'):<12} "
+            f"{row['requests']:>8} {row['items']:>6} {row['added']:>6} {row['prices']:>6} {row['errors']:>6} "
+            f"{stats.get('elapsed_time_seconds', 0):>7.1f}s"
+        )
+
+    print("-" * len(header))
+    print(
+        f"{'Total':<32} {'':<12} {totals['requests']:>8} {totals['items']:>6} {totals['added']:>6} "
+        f"{totals['prices']:>6} {totals['errors']:>6}"
+    )
+
+
+def main(argv=None):
+    settings = get_project_settings()
+
+    parser = argparse.ArgumentParser(description="Run Kleinanzeigen scrape jobs in one process")
+    parser.add_argument("jobs", nargs="*", help="Job config files (default: every jobs/*.json)")
+    parser.add_argument("--concurrency", type=int, default=settings.getint("CONCURRENT_REQUESTS"),
+                        help="Concurrent requests across all jobs")
+    parser.add_argument("--per-domain", type=int, default=settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN"),
+                        help="Concurrent requests per domain across all jobs")
+    parser.add_argument("--output-dir", default="data", help="Folder for the job datasets")
+    parser.add_argument("--mode", choices=("crawl", "backfill", "revalidate"), default="crawl",
+                        help="'backfill' fetches the detail pages of card-only listings, "
+                             "'revalidate' re-checks stored listings for price changes, sold and removed ads")
+    parser.add_argument("--budget", type=int,
+                        help="Requests per job for --mode revalidate (default: job config or REVALIDATE_BUDGET)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Cache downloaded pages and reuse them within HTTPCACHE_TTL")
+    parser.add_argument("--offline", action="store_true",
+                        help="Replay pages from the HTTP cache only, nothing is downloaded")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore checkpoints of interrupted crawls and start from page 1")
+    args = parser.parse_args(argv)
+
+    if args.cache:
+        settings.set("HTTPCACHE_ENABLED", True)
+    if args.mode == "revalidate":
+        # The ETag/Last-Modified of a checked ad live in the cache: with it a
+        # revalidation is a conditional request, an unchanged ad answers 304
+        settings.set("HTTPCACHE_ENABLED", True)
+    if args.offline:
+        settings.set("HTTPCACHE_ENABLED", True)
+        settings.set("HTTPCACHE_OFFLINE", True)
+        settings.set("HTTPCACHE_IGNORE_MISSING", True)
+
+    job_files = resolve_job_files(args.jobs)
+    if not job_files:
+        print("No jobs to run.")
+        return 1
+
+    budget = ConcurrencyBudget(args.concurrency, args.per_domain)
+    # Ads that show up in several jobs are downloaded once and routed to each
+    # (offline runs don't copy from other datasets, every page should be parsed)
+    seen_registry = SeenRegistry(None if args.offline else os.path.join(STATE_FOLDER, "seen_ids.tsv"))
+    # Reposts across jobs end up in the same duplicate clusters
+    duplicate_index = DuplicateIndex(os.path.join(STATE_FOLDER, "duplicates.sqlite"))
+    process = CrawlerProcess(settings)
+
+    crawlers = []
+    for job_file in job_files:
+        crawler = process.create_crawler(KleinanzeigenSpider)
+        # A single job may use the whole budget, the shared middleware caps the sum
+        crawler.settings.set("CONCURRENT_REQUESTS", args.concurrency)
+        crawler.settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", args.per_domain)
+        crawler.settings.set("CONCURRENCY_BUDGET", budget)
+        middlewares = dict(crawler.settings.getdict("DOWNLOADER_MIDDLEWARES"))
+        middlewares["ebay_scraper.middlewares.ConcurrencyBudgetMiddleware"] = 950
+        crawler.settings.set("DOWNLOADER_MIDDLEWARES", middlewares)
+
+        print(f">>> Scheduling Job: {job_file}")
+        process.crawl(crawler, job_config=job_file, output_dir=args.output_dir, state_dir=STATE_FOLDER,
+                      mode=args.mode, seen_registry=seen_registry, resume=not args.fresh,
+                      budget=args.budget, duplicate_index=duplicate_index)
+        crawlers.append((job_file, crawler))
+
+    process.start()
+    seen_registry.close()
+    duplicate_index.close()
+
+    print_summary([(job_file, crawler.stats.get_stats()) for job_file, crawler in crawlers])
+    failed = [job_file for job_file, crawler in crawlers if crawler.stats.get_value("finish_reason") != "finished"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Cross-job deduplication of article page fetches.
+
+Several jobs (and the start URLs inside one job) overlap, so the same ad
+shows up in many searches. The runner hands one SeenRegistry to all of its
+crawlers: the first spider that wants an ad claims it and downloads the
+detail page, every other spider gets the finished listing routed into its
+own dataset instead of downloading it again.
+
+Across runs, the registry remembers which dataset already holds an ad in an
+append-only "ID<TAB>dataset" file, so a job can copy the listing from there.
+Such a copy may be old: it only replaces the fetch when the caller passes the
+price of the ad's current search result card, which then replaces its Preis.
+"""
+
+import logging
+import os
+
+from ebay_scraper.storage import load_listings
+
+logger = logging.getLogger(__name__)
+
+# Results of SeenRegistry.claim() besides a finished listing
+CLAIMED = "claimed"
+WAITING = "waiting"
+
+
+class SeenRegistry:
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        # This run: finished listings, and the spiders waiting for in-flight fetches
+        self.fetched = {}
+        self.owners = {}
+        self.waiters = {}
+        # Previous runs: ID -> dataset file that holds the listing
+        self.locations = {}
+        self.datasets = {}
+        self._file = None
+
+        if filename and os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as seen_file:
+                for line in seen_file:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 2:
+                        self.locations[parts[0]] = parts[1]
+
+    def _dataset_listing(self, doc_id, own_dataset):
+        dataset = self.locations.get(doc_id)
+        if dataset is None or dataset == own_dataset or not os.path.exists(dataset):
+            return None
+        if dataset not in self.datasets:
+            # Read once per run; an unreadable file just means the ad gets fetched
+            self.datasets[dataset] = {listing.get("ID"): listing for listing in load_listings(dataset)}
+        return self.datasets[dataset].get(doc_id)
+
+    def claim(self, doc_id, spider, price=None):
+        """
+        Called before fetching a detail page. Returns the finished listing if
+        it is already known, CLAIMED if the spider should fetch it itself, or
+        WAITING if another spider is fetching it and will route it over.
+        Listings of earlier runs are only returned with the card's price.
+        """
+        if doc_id in self.fetched:
+            return dict(self.fetched[doc_id])
+
+        owner = self.owners.get(doc_id)
+        if owner is not None:
+            if owner is not spider:
+                self.waiters.setdefault(doc_id, []).append(spider)
+            return WAITING
+
+        listing = self._dataset_listing(doc_id, spider.dataset_filename) if price is not None else None
+        if listing is not None:
+            # The stored price is from the other job's last crawl
+            return dict(listing, Preis=price)
+
+        self.owners[doc_id] = spider
+        return CLAIMED
+
+    def complete(self, doc_id, listing, spider):
+        """Stores a fetched listing and routes it to every spider waiting for it."""
+        self.owners.pop(doc_id, None)
+        self.fetched[doc_id] = dict(listing)
+        self._remember(doc_id, spider.dataset_filename)
+        for waiter in self.waiters.pop(doc_id, []):
+            waiter.receive_shared_listing(dict(listing))
+
+    def fail(self, doc_id):
+        """The owner couldn't fetch the ad. Waiting spiders will see it next run."""
+        self.owners.pop(doc_id, None)
+        waiters = self.waiters.pop(doc_id, [])
+        if waiters:
+            logger.warning(f"Shared fetch of {doc_id} failed, not routed to {len(waiters)} other job(s)")
+
+    def release(self, spider):
+        """Drops the claims and subscriptions of a closing spider."""
+        for doc_id in [doc_id for doc_id, owner in self.owners.items() if owner is spider]:
+            self.fail(doc_id)
+        for doc_id in list(self.waiters):
+            self.waiters[doc_id] = [waiter for waiter in self.waiters[doc_id] if waiter is not spider]
+            if not self.waiters[doc_id]:
+                del self.waiters[doc_id]
+
+    def is_waiting(self, spider):
+        return any(spider in waiters for waiters in self.waiters.values())
+
+    def _remember(self, doc_id, dataset):
+        if not self.filename or self.locations.get(doc_id) == dataset:
+            return
+        self.locations[doc_id] = dataset
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            self._file = open(self.filename, 'a', encoding='utf-8')
+        self._file.write(f"{doc_id}\t{dataset}\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
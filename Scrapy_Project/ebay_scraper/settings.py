@@ -52,9 +52,43 @@ ROBOTSTXT_OBEY = False#True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "ebay_scraper.middlewares.EbayScraperDownloaderMiddleware": 543,
-#}
+# Above RetryMiddleware (550), so blocked responses reach the adaptive
+# controller before the generic retry does
+DOWNLOADER_MIDDLEWARES = {
+    "ebay_scraper.middlewares.EbayScraperDownloaderMiddleware": 560,
+    # HttpCacheMiddleware that also renews a page's age after a 304 (ebay_scraper/httpcache.py)
+    "scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware": None,
+    "ebay_scraper.httpcache.ListingCacheMiddleware": 900,
+}
+
+# Adaptive rate control + ban detection (EbayScraperDownloaderMiddleware)
+ADAPTIVE_THROTTLE_ENABLED = True
+# Concurrency per domain starts here and moves between min and max
+# (max defaults to CONCURRENT_REQUESTS_PER_DOMAIN)
+ADAPTIVE_START_CONCURRENCY = 2
+ADAPTIVE_MIN_CONCURRENCY = 1
+#ADAPTIVE_MAX_CONCURRENCY = 8
+# One step up after this many healthy responses
+ADAPTIVE_INCREASE_AFTER = 10
+# Responses slower than this (seconds, moving average) count as overload
+ADAPTIVE_TARGET_LATENCY = 2.0
+# Exponential backoff on blocks: first delay, doubled per block, capped
+ADAPTIVE_BACKOFF_START = 5.0
+ADAPTIVE_MAX_DELAY = 300.0
+# A blocked request is re-queued at most this often
+ADAPTIVE_MAX_BLOCK_RETRIES = 5
+ADAPTIVE_BAN_HTTP_CODES = [403, 429]
+# Challenge pages: one of these markers and none of ADAPTIVE_CONTENT_MARKERS
+ADAPTIVE_CAPTCHA_MARKERS = ["captcha", "Bitte bestätige, dass du ein Mensch bist"]
+ADAPTIVE_CONTENT_MARKERS = ["viewad-title", "aditem"]
+
+# Revalidation (runner --mode revalidate, see ebay_scraper/revalidation.py)
+# Requests per job and run, unless the job config or runner --budget say otherwise
+REVALIDATE_BUDGET = 200
+# Ad pages without title that belong to a deleted ad (no block)
+REMOVED_AD_MARKERS = ["nicht mehr verfügbar", "Anzeige wurde gelöscht"]
+# Markers of an ad that is marked as sold
+SOLD_AD_MARKERS = ["Verkauft</span>", "is-sold"]
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -64,11 +98,38 @@ ROBOTSTXT_OBEY = False#True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "ebay_scraper.pipelines.EbayScraperPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "ebay_scraper.pipelines.EbayScraperPipeline": 300,
+}
+
+# Write-behind persistence: the pipeline buffers items and writes them to the
+# job's store in a worker thread once this many are buffered ...
+PERSIST_BATCH_SIZE = 50
+# ... or at the latest after this many seconds
+PERSIST_FLUSH_INTERVAL = 5.0
+
+# Seconds between checkpoint writes of a running crawl (state/jobs/<job>/),
+# an interrupted crawl resumes from the last one
+CHECKPOINT_INTERVAL = 10.0
+
+# Per-run delta files (new listings, price changes, sold/removed ads) in
+# <output dir>/DELTAS_DIR/<dataset>/, see ebay_scraper/deltas.py
+DELTAS_ENABLED = True
+DELTAS_DIR = "deltas"
+
+# Saved-search alerts, checked for new listings and price drops (see ebay_scraper/alerts.py).
+# No rules file, no alerts. The sink is a JSON Lines file or an http(s) webhook URL.
+ALERTS_RULES_FILE = "alerts/rules.json"
+ALERTS_SINK = "alerts/matches.jsonl"
+
+# Ext_* specs, PLZ and coordinates are stored with every listing (see
+# ebay_scraper/enrichment.py), the viewer only computes what is missing.
+# Coordinates need pgeocode, without it they are left to the viewer.
+ENRICHMENT_ENABLED = True
+ENRICHMENT_GEOCODE = True
 
 # Enable and configure the AutoThrottle extension (disabled by default)
+# Leave it off while ADAPTIVE_THROTTLE_ENABLED is set, both adjust the same delays
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 #AUTOTHROTTLE_ENABLED = True
 # The initial download delay
@@ -83,11 +144,22 @@ ROBOTSTXT_OBEY = False#True
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Pages are cached in .scrapy/httpcache/ (see ebay_scraper/httpcache.py).
+# Off by default, a cached page would hide changes within its TTL:
+# enable it with runner --cache (or --offline to replay from it).
+# runner --mode revalidate turns it on for its conditional requests.
+HTTPCACHE_ENABLED = False
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_STORAGE = "ebay_scraper.httpcache.ListingCacheStorage"
+HTTPCACHE_POLICY = "ebay_scraper.httpcache.ListingCachePolicy"
+HTTPCACHE_GZIP = True
+# Seconds a cached page counts as fresh, per request type
+HTTPCACHE_TTL = {"search": 15 * 60, "article": 7 * 24 * 3600}
+# Least recently used pages are evicted above this size
+HTTPCACHE_MAX_SIZE_MB = 500
+# Offline mode: serve everything from the cache, never download
+# (use together with HTTPCACHE_IGNORE_MISSING = True, or runner --offline)
+HTTPCACHE_OFFLINE = False
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
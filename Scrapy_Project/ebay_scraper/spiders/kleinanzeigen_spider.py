@@ -1,19 +1,55 @@
 from pathlib import Path
 import re
 import os
+from datetime import datetime
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.internet import task
 
 #from Scrapy_Project\ebay_scraper\ebay_scraper\spiders\utilities import Utilities
 #from utilities import Utilities
+from ebay_scraper.checkpoint import CrawlCheckpoint
+from ebay_scraper.duplicates import DuplicateIndex
+from ebay_scraper.enrichment import needs_enrichment
+from ebay_scraper.crawl_state import SORT_DATE, CrawlState, detect_sort_order
+from ebay_scraper.extraction import extract_article
+from ebay_scraper.httpcache import REVALIDATE
+from ebay_scraper.items import EbayScraperItem, ListingUpdateItem, PriceUpdateItem, to_price
+from ebay_scraper.revalidation import (
+    CHECKED_FORMAT, DEFAULT_BUDGET, REMOVED_HTTP_CODES, ad_status, marker_pattern, select_for_revalidation,
+)
 from ebay_scraper.spiders.utilities import Utilities
+from ebay_scraper.seen_registry import CLAIMED, WAITING, SeenRegistry
+from ebay_scraper.price_history import PriceHistory, price_history_filename
+from ebay_scraper.storage import ListingIndex, dataset_filename, open_listing_store
+from dataset_viewer.feature_extractor import extract_specs
 
 
 class KleinanzeigenSpider(scrapy.Spider):
     name = "kleinanzeigen_scraper"
+
+    # Page number in search URLs, e.g. /s-anzeige:angebote/seite:3/laptop-3060/k0
+    PAGE_PATTERN = re.compile(r"seite:(\d+)")
     
-    def __init__(self, job_config=None, *args, **kwargs):
+    def __init__(self, job_config=None, output_dir="data", state_dir="state", mode="crawl", seen_registry=None, resume=True, budget=None, duplicate_index=None, *args, **kwargs):
         super(KleinanzeigenSpider, self).__init__(*args, **kwargs)
         
+        # "crawl": search pages as configured, "backfill": fetch details of card-only listings,
+        # "revalidate": re-check stored listings for price changes, sold and removed ads
+        self.mode = mode
+        self.revalidate_budget = budget
+
+        # Shared by all jobs of a runner batch, so every ad page is fetched once per run
+        self.owns_seen_registry = seen_registry is None
+        if seen_registry is None:
+            seen_registry = SeenRegistry(os.path.join(state_dir, "seen_ids.tsv"))
+        self.seen_registry = seen_registry
+        # Near-duplicate index, also shared by the jobs of a runner batch
+        self.owns_duplicate_index = duplicate_index is None
+        if duplicate_index is None:
+            duplicate_index = DuplicateIndex(os.path.join(state_dir, "duplicates.sqlite"))
+        self.duplicate_index = duplicate_index
         self.utilities = Utilities()
         self.utilities.log_scraper_run("run_log.txt")
 
@@ -24,15 +60,173 @@ class KleinanzeigenSpider(scrapy.Spider):
             self.logger.info(f"Loaded Job: {self.config['task_name']}")
 
             raw_filename = self.config.get("output_filename", "fallback.json")
-            self.config["output_filename"] = os.path.join("data", raw_filename)
+            self.config["output_filename"] = os.path.join(output_dir, raw_filename)
+
+            # Storage engine per job: "json" (default), "jsonl" or "sqlite"
+            self.store = open_listing_store(self.config["output_filename"], self.config.get("storage"))
+            # ID -> last price etc., loaded once per crawl and kept current by the pipeline
+            listings = self.store.load_all()
+            self.listing_index = ListingIndex(listings)
+            self.logger.info(f"Known listings: {len(self.listing_index)}")
+            indexed = self.duplicate_index.add_many(listings)
+            if indexed:
+                self.logger.info(f"Duplicate index: added {indexed} stored listings")
+            # Stored before the current extractor version, the pipeline enriches them again
+            self.stale_enrichment = [listing for listing in listings if needs_enrichment(listing)]
+            if self.stale_enrichment:
+                self.logger.info(f"Enrichment: {len(self.stale_enrichment)} stored listings are outdated")
+            self.dataset_filename = dataset_filename(self.config["output_filename"], self.config.get("storage"))
+
+            # Price change events of the job, appended by the pipeline
+            self.price_history = PriceHistory(price_history_filename(self.config["output_filename"]))
+            if self.price_history.is_new and listings:
+                imported = self.price_history.import_listings(listings)
+                self.logger.info(f"Price history started with {imported} prices of the stored listings")
 
+            # Watermarks per start URL from previous runs (incremental crawling)
+            state_name = os.path.splitext(os.path.basename(raw_filename))[0]
+            self.crawl_state = CrawlState(os.path.join(state_dir, f"{state_name}.crawl_state.json"))
+
+            # An interrupted crawl continues from its checkpoint (crawl mode only)
+            self.checkpoint = CrawlCheckpoint(os.path.join(state_dir, "jobs", state_name, "checkpoint.json"))
+            self.resuming = mode == "crawl" and resume and self.checkpoint.load()
+            if self.resuming:
+                self.crawl_state.restore_seen(self.checkpoint.watermarks)
+                self.logger.info(f"Resuming interrupted crawl from {self.checkpoint.filename}")
 
         else:
             # Fallback or Error if no file is provided
             self.logger.error("No job_config file provided! Use -a job_config=path/to/file.json")
             self.start_urls = []
             self.config = {}
+            self.store = None
+            self.listing_index = ListingIndex()
+            self.stale_enrichment = []
+            self.crawl_state = None
+            self.dataset_filename = None
+            self.price_history = None
+            self.checkpoint = None
+            self.resuming = False
+
+        # Pagination state per start URL (fan-out mode)
+        self.pagination = self.checkpoint.pagination if self.resuming else {}
+        self.checkpoint_task = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(KleinanzeigenSpider, cls).from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        return spider
+
+    def spider_opened(self):
+        if self.checkpoint is not None and self.mode == "crawl":
+            self.checkpoint_task = task.LoopingCall(self.save_checkpoint)
+            self.checkpoint_task.start(self.crawler.settings.getfloat("CHECKPOINT_INTERVAL", 10.0), now=False)
 
+    def save_checkpoint(self):
+        if self.checkpoint.dirty:
+            self.checkpoint.save(self.pagination, self.crawl_state.seen_snapshot())
+
+    def spider_idle(self):
+        # Stay open while another job still fetches an ad this one wants
+        if self.seen_registry.is_waiting(self):
+            raise DontCloseSpider
+
+    def receive_shared_listing(self, listing):
+        # An ad this job wanted was fetched by another job of the run
+        self.crawler.stats.inc_value("dedup/routed_from_other_job")
+        self.persistence.process_item(listing, self)
+
+    def start_requests(self):
+        if self.mode == "backfill":
+            yield from self.backfill_requests()
+            return
+        if self.mode == "revalidate":
+            yield from self.revalidation_requests()
+            return
+        if self.resuming:
+            yield from self.resume_requests()
+            return
+        for url in self.start_urls:
+            request = scrapy.Request(url, callback=self.parse, dont_filter=True, meta={'start_url': url, 'page': 1})
+            self.checkpoint.page_scheduled(request.url, request.meta)
+            yield request
+
+    def resume_requests(self):
+        # Search pages that were never parsed, and new ads that never made it into the dataset
+        pages = list(self.checkpoint.pending_pages.items())
+        articles = [(doc_id, url) for doc_id, url in self.checkpoint.articles.items() if doc_id not in self.listing_index]
+        self.logger.info(f"Resume: {len(pages)} search pages and {len(articles)} ads left from the interrupted crawl")
+        self.crawler.stats.set_value("checkpoint/resumed_pages", len(pages))
+        self.crawler.stats.set_value("checkpoint/resumed_articles", len(articles))
+        for url, meta in pages:
+            yield scrapy.Request(url, callback=self.parse, dont_filter=True, meta=dict(meta))
+        for doc_id, url in articles:
+            yield from self.request_article(doc_id, url)
+
+    def backfill_requests(self):
+        # Detail pages of listings that were stored from their search card only
+        card_only = [listing for listing in self.store.load_all() if listing.get("Card_Only")]
+        limit = self.config.get("backfill_limit")
+        if limit:
+            card_only = card_only[:limit]
+        self.logger.info(f"Backfill: fetching details of {len(card_only)} card-only listings")
+        for listing in card_only:
+            yield scrapy.Request(
+                url=listing["URL"],
+                callback=self.parse_article_page,
+                dont_filter=True,
+                meta={'doc_id': listing["ID"], 'backfill': True}
+            )
+
+    def revalidation_requests(self):
+        # Stored listings by priority, as many as the request budget allows
+        rules = self.config.get("revalidate", {})
+        budget = self.revalidate_budget or rules.get("budget") or self.crawler.settings.getint("REVALIDATE_BUDGET", DEFAULT_BUDGET)
+        listings = select_for_revalidation(self.store.load_all(), budget, rules)
+        self.logger.info(f"Revalidation: checking {len(listings)} of {len(self.listing_index)} listings (budget {budget})")
+        self.sold_pattern = marker_pattern(self.crawler.settings.getlist("SOLD_AD_MARKERS"))
+        self.removed_pattern = marker_pattern(self.crawler.settings.getlist("REMOVED_AD_MARKERS"))
+        for listing in listings:
+            yield scrapy.Request(
+                url=listing["URL"],
+                callback=self.parse_revalidation,
+                errback=self.revalidation_failed,
+                dont_filter=True,
+                meta={
+                    'doc_id': listing["ID"],
+                    'listing': listing,
+                    # Deleted ads answer 404/410, which should reach the callback
+                    'handle_httpstatus_list': REMOVED_HTTP_CODES,
+                    # Cached copies are always stale, the cache only adds If-None-Match/If-Modified-Since
+                    'cache_type': REVALIDATE,
+                }
+            )
+
+    def closed(self, reason):
+        # Runs after EbayScraperPipeline flushed its buffer:
+        # commit pending writes and release open dataset files
+        if self.store is not None:
+            self.store.close()
+        if self.price_history is not None:
+            self.price_history.close()
+        # A finished crawl needs no checkpoint, any other end keeps it for the next run
+        if self.checkpoint_task is not None and self.checkpoint_task.running:
+            self.checkpoint_task.stop()
+        if self.checkpoint is not None and self.mode == "crawl":
+            if reason == "finished":
+                self.checkpoint.discard()
+            else:
+                self.save_checkpoint()
+        # Interrupted crawls keep the previous watermarks
+        if self.crawl_state is not None and reason == "finished":
+            self.crawl_state.save()
+        self.seen_registry.release(self)
+        if self.owns_seen_registry:
+            self.seen_registry.close()
+        if self.owns_duplicate_index:
+            self.duplicate_index.close()
 
     def parse(self, response, **kwargs):
         scrape_next_page = self.config.get("scrape_next_pages", False)
@@ -41,8 +235,19 @@ class KleinanzeigenSpider(scrapy.Spider):
         ad_articles = response.xpath("//article[contains(@class, 'aditem')]")
         self.logger.info(f"Page Analysis: Found {len(ad_articles)} ad containers on {response.url}")
 
-        output_file = self.config.get("output_filename", "fallback_data.json")
-        existing_data = self.utilities.open_json(output_file)
+        # Incremental stop rule: stop paginating after N consecutive known ads.
+        # Only newest-first lists also stop at ads older than the last run's watermark.
+        start_url = response.meta.get('start_url', response.url)
+        page = response.meta.get('page', 1)
+        sort_order = self.config.get("sort_order") or detect_sort_order(start_url)
+        if sort_order == SORT_DATE:
+            stop_after_known = self.config.get("stop_after_known", 5)
+            watermark_date = self.crawl_state.newest_date(start_url)
+        else:
+            # New ads can show up on any page of e.g. price-sorted lists
+            stop_after_known = self.config.get("stop_after_known_unsorted", 50)
+            watermark_date = None
+        known_streak = response.meta.get('known_streak', 0)
 
         for index, ad in enumerate(ad_articles):
             # URL holen
@@ -59,127 +264,236 @@ class KleinanzeigenSpider(scrapy.Spider):
             # ID extraction
             doc_id = url_relative.split("/")[-1].split("?")[0]
 
+            # Datum der Karte ("Heute, 10:15", "Gestern, ..." oder "28.12.2025")
+            date_text = " ".join(ad.xpath(".//div[contains(@class, 'aditem-main--top--right')]//text()").getall())
+            card_date = self.utilities.parse_card_date(date_text)
+            self.crawl_state.observe(start_url, page, doc_id, card_date)
+
+            is_old = watermark_date is not None and card_date is not None and card_date < watermark_date
+            if doc_id in self.listing_index or self.crawl_state.is_newest_id(start_url, doc_id) or is_old:
+                known_streak += 1
+            else:
+                # Bumped or reposted ads between new ones don't stop the crawl
+                known_streak = 0
+            if scrape_next_page and known_streak >= stop_after_known:
+                scrape_next_page = False
+                self.logger.info(f"Pagination: {known_streak} known ads in a row on page {page} of {start_url}, stopping here.")
+
             # --- OPTIMIZATION START ---
             
             # 1. Extract Price from Search Result (List Item)
+            # Same parsing as the detail page: "149,99 €" -> 150, no price / "Zu verschenken" -> 0
             price_text = ad.xpath(".//p[contains(@class, 'price-shipping--price')]/text()").get()
-            current_price_int = 0
+            current_price_int = to_price(price_text)
+
+            # 2. Check against Existing Data (in-memory index, no disk access)
+            existing_item = self.listing_index.get(doc_id)
             
-            if price_text:
-                clean_price = re.sub(r"[€VB\s]", "", price_text).strip().replace(".", "")
-                if clean_price:
-                    current_price_int = int(clean_price)
-
-            # 2. Check against Existing Data
-            if existing_data:
-                # Find the item in our loaded list
-                existing_item = next((item for item in existing_data if item["ID"] == doc_id), None)
-                
-                if existing_item:
-                    raw_old_price = existing_item.get("Preis", 0)
-                    
-                    try:
-                        # Handle cases where price might be "", "VB", or string "150"
-                        old_price = int(raw_old_price)
-                    except (ValueError, TypeError):
-                        # If data is corrupt/empty, assume 0 so we trigger an update if the new price is > 0
-                        old_price = 0
-                    if old_price != current_price_int:
-                        self.logger.info(f"Ad {doc_id}: Price changed ({old_price} -> {current_price_int}). Updating JSON.")
-                        # Update JSON immediately
-                        self.utilities.update_listing_price(doc_id, current_price_int, output_file)
-                    else:
-                        self.logger.info(f"Ad {doc_id}: Already exists, price unchanged. Skipping.")
-                        if scrape_next_page:
-                            scrape_next_page = False
-                    continue 
-            # Request erstellen
+            if existing_item:
+                # Handles older datasets too, where the price might be "", "VB" or the string "150"
+                old_price = to_price(existing_item.get("Preis", 0))
+                if old_price != current_price_int:
+                    self.logger.info(f"Ad {doc_id}: Price changed ({old_price} -> {current_price_int}). Updating JSON.")
+                    # Persisted by EbayScraperPipeline
+                    yield PriceUpdateItem(ID=doc_id, Preis=current_price_int, Old_Preis=old_price)
+                else:
+                    self.logger.info(f"Ad {doc_id}: Already exists, price unchanged. Skipping.")
+                continue 
+
             article_page = response.urljoin(url_relative)
-            yield scrapy.Request(
-                url=article_page, 
-                callback=self.parse_article_page, 
-                dont_filter=True,
-                meta={'doc_id': doc_id} 
-            )
+            self.checkpoint.article_wanted(doc_id, article_page)
+
+            # Opt-in per job: reposts and copies of stored listings are taken from the card
+            # (a card-only record without seller and full description)
+            if self.config.get("skip_duplicate_details", False):
+                listing = self.parse_card(ad, doc_id, article_page, current_price_int, card_date)
+                cluster = listing and self.duplicate_index.match_card(
+                    listing.Artikelstitel, listing.Artikelsbeschreibung, listing.Preis)
+                if cluster:
+                    self.logger.info(f"Ad {doc_id}: Duplicate of {cluster}, stored from the card.")
+                    listing.Duplicate_Of = cluster
+                    self.crawler.stats.inc_value("duplicates/skipped_fetches")
+                    yield listing
+                    continue
+
+            # Card-only mode: the search result card is enough unless required specs are missing
+            if self.config.get("detail_mode") == "card":
+                listing = self.parse_card(ad, doc_id, article_page, current_price_int, card_date)
+                if listing and not self.card_needs_details(listing):
+                    self.crawler.stats.inc_value("card_mode/listings_from_card")
+                    yield listing
+                    continue
+                self.crawler.stats.inc_value("card_mode/detail_fetches")
+
+            yield from self.request_article(doc_id, article_page, current_price_int)
 
         # Pagination
+        if self.config.get("scrape_next_pages", False) and self.config.get("pagination_mode") == "fanout":
+            pages = self.schedule_fanout_pages(response, stop=not scrape_next_page)
+            if pages is not None:
+                yield from pages
+                # Only now, everything this page scheduled is in the checkpoint
+                self.checkpoint.page_done(response.request.url)
+                return
+
         next_page_relative = response.xpath("//a[@class='pagination-next']/@href").get()
         if next_page_relative and scrape_next_page:
             next_page_url = response.urljoin(next_page_relative)
             self.logger.info(f"Pagination: Navigating to next page: {next_page_url}")
-            yield scrapy.Request(next_page_url, callback=self.parse)
+            meta = self.page_meta(response, page + 1)
+            meta['known_streak'] = known_streak
+            request = scrapy.Request(next_page_url, callback=self.parse, meta=meta)
+            self.checkpoint.page_scheduled(request.url, request.meta)
+            yield request
+
+        self.checkpoint.page_done(response.request.url)
+
+    def request_article(self, doc_id, article_page, card_price=None):
+        # Jobs of one run share article fetches; listings stored by other jobs
+        # in earlier runs are only copied with the price of the current card
+        shared = self.seen_registry.claim(doc_id, self, card_price)
+        if shared == WAITING:
+            self.crawler.stats.inc_value("dedup/waiting_for_other_job")
+            return
+        if shared != CLAIMED:
+            self.crawler.stats.inc_value("dedup/copied_listings")
+            yield shared
+            return
+
+        # Request erstellen
+        yield scrapy.Request(
+            url=article_page, 
+            callback=self.parse_article_page, 
+            errback=self.article_failed,
+            dont_filter=True,
+            meta={'doc_id': doc_id} 
+        )
+
+    def parse_card(self, ad, doc_id, article_url, price, card_date):
+        """Builds a listing from a search result card (description is only a snippet)."""
+        title = ad.xpath(".//a[contains(@class, 'ellipsis')]/text()").get()
+        if not title:
+            return None
+
+        snippet = " ".join(line.strip() for line in ad.xpath(".//p[contains(@class, 'aditem-main--middle--description')]//text()").getall() if line.strip())
+        place = " ".join(line.strip() for line in ad.xpath(".//div[contains(@class, 'aditem-main--top--left')]//text()").getall() if line.strip())
+
+        return EbayScraperItem.from_raw(
+            ID=doc_id,
+            URL=article_url,
+            Preis=price,
+            Seller_ID="0",
+            Artikelstitel=title,
+            Artikelsbeschreibung=snippet,
+            Date=card_date,
+            Place=place or "Unknown",
+            Card_Only=True
+        )
+
+    def card_needs_details(self, listing):
+        # "card_required_specs": e.g. ["Ext_GPU", "Ext_CPU"], fetch the full description if the card lacks one
+        text = f"{listing.Artikelstitel} {listing.Artikelsbeschreibung}"
+        required = self.config.get("card_required_specs", [])
+        found = extract_specs(text, required) if required else {}
+        return any(spec not in found for spec in required)
+
+    def page_meta(self, response, page):
+        return {'start_url': response.meta.get('start_url', response.url), 'page': page}
+
+    def schedule_fanout_pages(self, response, stop):
+        """
+        Fan-out pagination: the page-numbered links on a results page give the
+        URL pattern and page count, so up to "pagination_window" pages per start
+        URL are requested at once instead of following pagination-next one by
+        one. Scheduling stops once a page hits the known-listing cut-off.
+        Returns None if the page has no numbered links (sequential fallback).
+        """
+        start_url = response.meta.get('start_url', response.url)
+        state = self.pagination.setdefault(start_url, {"template": None, "last_page": 1, "next_page": 2, "stopped": False})
+
+        for href in response.xpath("//div[contains(@class, 'pagination-pages')]//a/@href").getall():
+            match = self.PAGE_PATTERN.search(href)
+            if match:
+                state["template"] = response.urljoin(self.PAGE_PATTERN.sub("seite:{page}", href))
+                state["last_page"] = max(state["last_page"], int(match.group(1)))
+
+        if state["template"] is None:
+            return None
+
+        if stop and not state["stopped"]:
+            state["stopped"] = True
+            self.logger.info(f"Pagination: Known listings reached on page {response.meta.get('page', 1)} of {start_url}, no further pages.")
+
+        requests = []
+        window_end = response.meta.get('page', 1) + self.config.get("pagination_window", 5)
+        while not state["stopped"] and state["next_page"] <= min(state["last_page"], window_end):
+            page = state["next_page"]
+            state["next_page"] += 1
+            page_url = state["template"].replace("seite:{page}", f"seite:{page}")
+            self.logger.info(f"Pagination: Scheduling page {page}/{state['last_page']}: {page_url}")
+            request = scrapy.Request(page_url, callback=self.parse, meta=self.page_meta(response, page))
+            self.checkpoint.page_scheduled(request.url, request.meta)
+            requests.append(request)
+        return requests
+
+    def article_failed(self, failure):
+        doc_id = failure.request.meta.get('doc_id')
+        self.logger.error(f"Download of ad {doc_id} failed: {failure.getErrorMessage()}")
+        self.seen_registry.fail(doc_id)
+
+    def revalidation_failed(self, failure):
+        self.crawler.stats.inc_value("revalidate/failed")
+        self.logger.error(f"Revalidation of ad {failure.request.meta.get('doc_id')} failed: {failure.getErrorMessage()}")
+
+    def parse_revalidation(self, response):
+        doc_id = response.meta['doc_id']
+        listing = response.meta['listing']
+        status = ad_status(response, self.sold_pattern, self.removed_pattern)
+        if status is None:
+            self.crawler.stats.inc_value("revalidate/unknown")
+            self.logger.warning(f"Revalidation of ad {doc_id}: page not recognized ({response.url}), keeping it as it is.")
+            return
+        self.crawler.stats.inc_value(f"revalidate/{status}")
+
+        now = datetime.now()
+        fields = {"Status": status, "Last_Checked": now.strftime(CHECKED_FORMAT)}
+        article = extract_article(response) if status != "removed" else None
+        if article is not None:
+            old_price, new_price = to_price(listing.get("Preis")), to_price(article["Preis"])
+            if new_price != old_price:
+                self.logger.info(f"Ad {doc_id}: Price changed ({old_price} -> {new_price}) since the last check.")
+                self.crawler.stats.inc_value("revalidate/price_changed")
+                # Same path as price changes on search pages (price history, deltas)
+                yield PriceUpdateItem(ID=doc_id, Preis=new_price, Old_Preis=old_price)
+        if status != listing.get("Status", "active"):
+            self.logger.info(f"Ad {doc_id}: now {status}.")
+
+        # Persisted by EbayScraperPipeline
+        yield ListingUpdateItem(ID=doc_id, Fields=fields)
 
     def parse_article_page(self, response):
         doc_id = response.meta.get('doc_id', 'Unknown')
         article_url = response.url
 
-        # Titel extrahieren
-        article_title = response.xpath("//h1[@id='viewad-title']/text()").get()
-        if not article_title:
-            article_title = response.xpath("//h1[@class='boxedarticle--title']//text()").get()
-        
-        if not article_title:
+        # Alle Felder in einem Durchlauf (JSON-LD falls vorhanden, sonst HTML)
+        fields = extract_article(response)
+        if fields is None:
             self.logger.error(f"FAILED to parse Title for ID {doc_id} ({article_url}). Layout changed or blocked?")
-            return 
+            self.seen_registry.fail(doc_id)
+            return
 
-        article_title = article_title.strip()
+        # Typen werden einmal über das Schema von EbayScraperItem umgewandelt
+        article = EbayScraperItem.from_raw(ID=doc_id, URL=article_url, **fields)
 
-        # Preis
-        article_price = response.xpath("//h2[@id='viewad-price']/text()").get()
-        if not article_price:
-            article_price = response.xpath("//h2[@class='boxedarticle--price']//text()").get()
+        # Backfill: vervollständigt ein bereits gespeichertes Card-only Listing
+        if response.meta.get('backfill'):
+            article.Card_Only = False
+            fields = {key: value for key, value in article.to_dict().items() if key != "ID"}
+            yield ListingUpdateItem(ID=doc_id, Fields=fields)
+            return
 
-        if article_price:
-            article_price = re.sub(r"[€VB\s]", "", article_price).strip().replace(".", "")
-            if article_price == "":
-                article_price = "0"
-        else:
-            article_price = "0"
-
-        # Beschreibung
-        desc_lines = response.xpath("//div[@id='viewad-description-text']//text()").extract()
-        if not desc_lines:
-            desc_lines = response.xpath("//p[@itemprop='description']//text()").extract()
-        article_description = " ".join([line.strip() for line in desc_lines if line.strip()])
-
-        # Ort & Datum
-        locality = response.xpath('//span[@id="viewad-locality"]/text()').get()
-        if locality:
-            locality = locality.strip()
-        else:
-            loc_raw = response.xpath('//div[@itemprop="address"]/span[@itemprop="locality"]/text()').get()
-            locality = loc_raw.strip() if loc_raw else "Unknown"
-
-        date = response.xpath('//div[@id="viewad-extra-info"]/div/span/text()').get()
-        if date: 
-            date = date.strip()
-
-        # Seller ID
-        try:
-            seller_link = response.xpath("//a[contains(@href, 'userId=')]/@href").get()
-            if seller_link:
-                seller_id = seller_link.split("userId=")[-1].split("&")[0]
-            else:
-                seller_id = "0"
-        except Exception:
-            seller_id = "0"
-
-        article = {
-            "ID": doc_id,
-            "URL": article_url,
-            "Preis": article_price,
-            "Seller_ID": seller_id,
-            "Artikelstitel": article_title,
-            "Artikelsbeschreibung": article_description,
-            "Date": date,
-            "Place": locality
-        }
-
-        # Daten verarbeiten
-        article = self.utilities.infer_data_types(article)
-        
-        # Speichern
-        self.utilities.add_listing_to_json(article, self.config.get("output_filename", "fallback_data.json"))
-        
-        # Erfolgsnachricht (Scrapy zählt das Item jetzt)
+        # Weitere Jobs dieses Laufs, die die Anzeige wollen, bekommen eine Kopie
+        self.seen_registry.complete(doc_id, article.to_dict(), self)
+
+        # Speichern übernimmt EbayScraperPipeline (gepuffert, außerhalb des Reactor-Threads)
         yield article
\ No newline at end of file
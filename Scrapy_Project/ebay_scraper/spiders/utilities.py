@@ -2,10 +2,12 @@ import scrapy
 import re
 import os
 import json
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import logging
 import time
 
+from ebay_scraper.storage import load_listings
+
 class Utilities:
 
     def load_config_file(self, filename="config_file.json"):
@@ -13,20 +15,6 @@ class Utilities:
             config = json.load(file)
             return config
 
-    def is_int(self, value):
-        try:
-            int(str(value))
-            return True
-        except ValueError:
-            return False
-
-    def is_float(self, value):
-        try:
-            float(str(value))
-            return True
-        except ValueError:
-            return False
-
     def is_date(self, value):
         try:
             datetime.strptime(str(value), '%d.%m.%Y')
@@ -34,101 +22,27 @@ class Utilities:
         except ValueError:
             return False
 
-    def infer_data_types(self, article):
-        for key in article:
-            if isinstance(article[key], list): continue 
-            elif self.is_int(article[key]): article[key] = int(article[key])
-            elif self.is_float(article[key]): article[key] = float(article[key])
-            #elif self.is_date(article[key]) and str(article[key]) is not None: article[key] = datetime.strptime(str(article[key]), '%d.%m.%Y')
-        return article
-    
-    def open_json(self, existing_filename):
-        try:
-            with open(existing_filename, 'r', encoding='utf-8') as json_file:
-                existing_data = json.load(json_file)
-            return existing_data
-        except FileNotFoundError:
-            print(f'The file {existing_filename} does not exist.')
-            return
-        except json.decoder.JSONDecodeError:
-            print(f'The file {existing_filename} exists but is not a valid JSON file.')
-            return
-        
-    def is_listing_id_in_json(self, doc_id, filename):
-        try:
-            with open(filename, 'r', encoding='utf-8') as json_file:
-                existing_data = json.load(json_file)
-                # Assuming the JSON structure is a list of dictionaries, each representing a listing
-                return any(entry.get("ID") == doc_id for entry in existing_data)
-        except (FileNotFoundError, json.decoder.JSONDecodeError):
-            # Either the file doesn't exist or it's not a valid JSON file, consider the ID not present
-            return False
-
-
-    def add_listing_to_json(self, new_listing, existing_filename):
-        # Check if the file exists
-        if not os.path.exists(existing_filename):
-            print(f'The file {existing_filename} does not exist. Creating a new file.')
-            with open(existing_filename, 'w', encoding='utf-8') as json_file:
-                json.dump([new_listing], json_file, ensure_ascii=False, indent=4)
-            print(f'Listing with ID {new_listing["ID"]} added to {existing_filename}')
-            return
-
-        # Load existing data from the JSON file
-        try:
-            with open(existing_filename, 'r', encoding='utf-8') as json_file:
-                existing_data = json.load(json_file)
-        except json.decoder.JSONDecodeError:
-            print(f'The file {existing_filename} exists but is not a valid JSON file. Creating a new file.')
-            with open(existing_filename, 'w', encoding='utf-8') as json_file:
-                json.dump([new_listing], json_file, ensure_ascii=False, indent=4)
-            print(f'Listing with ID {new_listing["ID"]} added to {existing_filename}')
-            return
-
-        # Check if the listing with the given ID already exists
-        existing_ids = set(entry.get('ID') for entry in existing_data)
-        new_listing_id = new_listing.get('ID')
-
-        if new_listing_id not in existing_ids:
-            # Append the new listing to the existing data
-            existing_data.append(new_listing)
-
-            # Save the updated dataset back to the JSON file
-            with open(existing_filename, 'w', encoding='utf-8') as json_file:
-                json.dump(existing_data, json_file, ensure_ascii=False, indent=4)
-
-            print(f'Listing with ID {new_listing_id} added to {existing_filename}')
-        else:
-            print(f'Listing with ID {new_listing_id} already exists in {existing_filename}. Skipped when writing.')
-
-    def update_listing_price(self, doc_id, new_price, filename):
+    def parse_card_date(self, value, today=None):
         """
-        Updates the price of an existing listing in the JSON file.
+        Parses the date of a search result card: "Heute, 10:15", "Gestern, 18:30"
+        or "28.12.2025". Returns a date or None.
         """
-        if not os.path.exists(filename):
-            return
-
+        if not value:
+            return None
+        value = value.strip()
+        today = today or date.today()
+        if value.startswith("Heute"):
+            return today
+        if value.startswith("Gestern"):
+            return today - timedelta(days=1)
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            updated = False
-            for entry in data:
-                if entry.get("ID") == doc_id:
-                    old_price = entry.get("Preis")
-                    # Only save if it's actually different
-                    if old_price != new_price:
-                        entry["Preis"] = new_price
-                        updated = True
-                        print(f"📉 Price update for {doc_id}: {old_price} -> {new_price}")
-                    break
-            
-            if updated:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
-                    
-        except Exception as e:
-            print(f"Error updating price: {e}")
+            return datetime.strptime(value[:10], '%d.%m.%Y').date()
+        except ValueError:
+            return None
+
+    def open_json(self, existing_filename):
+        """The listings of a dataset, JSON or JSON Lines (empty if missing or unreadable)."""
+        return load_listings(existing_filename)
 
     def log_scraper_run(self, logfile_path):
         # Check if the logfile exists, and create it if missing
@@ -0,0 +1,544 @@
+"""
+Storage backends for scraped listings.
+
+The original dataset format is a single JSON array per job (``data/*.json``).
+Rewriting that array for every scraped article costs O(n) I/O per item, so a
+crawl ends up O(n^2) in dataset size. ``JsonlListingStore`` keeps the same
+records as append-only JSON Lines instead: every new listing or field update is
+one appended line, and the file is compacted from time to time.
+``SqliteListingStore`` keys listings by ID in an SQLite database and exports
+the JSON layout the viewer reads.
+
+All stores share the same interface (``add_listing(s)``, ``update_price(s)``,
+``update_fields``/``update_listings``, ``get``, ``load_all``, ``close``), pick
+one per job with ``open_listing_store``.
+
+Convert existing datasets once with:
+
+    python -m ebay_scraper.storage convert data/data_mums_laptops.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Marker for lines that only carry changed fields of an existing listing
+UPDATE_OP = "update"
+
+# Values for the "storage" key of a job config
+STORAGE_ENGINES = ("json", "jsonl", "sqlite")
+
+
+class JsonListingStore:
+    """
+    The original dataset layout: one JSON array, rewritten on every write.
+    Batched writes (``add_listings``/``update_prices``) rewrite it only once.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.listings = {}
+        for listing in load_listings(filename):
+            self.listings[listing.get("ID")] = listing
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        # Replace atomically, other jobs of a run may read the file meanwhile
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as json_file:
+            json.dump(list(self.listings.values()), json_file, ensure_ascii=False, indent=4)
+        os.replace(tmp_filename, self.filename)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.listings
+
+    def __len__(self):
+        return len(self.listings)
+
+    def get(self, doc_id):
+        return self.listings.get(doc_id)
+
+    def load_all(self):
+        return list(self.listings.values())
+
+    def add_listings(self, listings):
+        """Returns the listings that were actually added (new IDs)."""
+        added = []
+        for listing in listings:
+            doc_id = listing.get("ID")
+            if doc_id not in self.listings:
+                self.listings[doc_id] = dict(listing)
+                added.append(listing)
+        if added:
+            self._save()
+        return added
+
+    def add_listing(self, listing):
+        return bool(self.add_listings([listing]))
+
+    def update_listings(self, updates):
+        """Takes (ID, fields) pairs, returns the number of updated listings."""
+        updated = 0
+        for doc_id, fields in updates:
+            existing = self.listings.get(doc_id)
+            if existing is not None:
+                existing.update(fields)
+                updated += 1
+        if updated:
+            self._save()
+        return updated
+
+    def update_fields(self, doc_id, fields):
+        return bool(self.update_listings([(doc_id, fields)]))
+
+    def update_prices(self, price_updates):
+        """Takes (ID, price) pairs, returns (ID, old price, new price) for the changed ones."""
+        changed = []
+        for doc_id, new_price in price_updates:
+            existing = self.listings.get(doc_id)
+            if existing is None or existing.get("Preis") == new_price:
+                continue
+            changed.append((doc_id, existing.get("Preis"), new_price))
+            existing["Preis"] = new_price
+        if changed:
+            self._save()
+        return changed
+
+    def update_price(self, doc_id, new_price):
+        changed = self.update_prices([(doc_id, new_price)])
+        return changed[0][1] if changed else None
+
+    def commit(self):
+        # Every write already rewrote the file
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlListingStore:
+    """
+    Append-only JSON Lines store. Each line is either a full listing or an
+    update record ({"ID": ..., "_op": "update", <changed fields>}) that is
+    merged into the listing on load. All listings are kept in memory so
+    lookups never touch the disk.
+    """
+
+    def __init__(self, filename, compact_ratio=2.0, min_compact_lines=1000):
+        self.filename = filename
+        self.compact_ratio = compact_ratio
+        self.min_compact_lines = min_compact_lines
+        self.listings = {}
+        self.line_count = 0
+        self._file = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'r', encoding='utf-8') as jsonl_file:
+            for line in jsonl_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    # A crash mid-write can leave a truncated last line
+                    logger.warning(f"Skipping corrupt line in {self.filename}")
+                    continue
+                self._apply(record)
+                self.line_count += 1
+
+    def _apply(self, record):
+        doc_id = record.get("ID")
+        if doc_id is None:
+            return
+        if record.get("_op") == UPDATE_OP:
+            existing = self.listings.get(doc_id)
+            if existing is not None:
+                existing.update({k: v for k, v in record.items() if k != "_op"})
+        else:
+            self.listings[doc_id] = record
+
+    def _append(self, records):
+        if not records:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            self._file = open(self.filename, 'a', encoding='utf-8')
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._file.flush()
+        self.line_count += len(records)
+        self.maybe_compact()
+
+    def __contains__(self, doc_id):
+        return doc_id in self.listings
+
+    def __len__(self):
+        return len(self.listings)
+
+    def get(self, doc_id):
+        return self.listings.get(doc_id)
+
+    def load_all(self):
+        return list(self.listings.values())
+
+    def add_listings(self, listings):
+        """Appends new listings. Returns the ones that were actually added (new IDs)."""
+        added = []
+        for listing in listings:
+            doc_id = listing.get("ID")
+            if doc_id in self.listings:
+                continue
+            self.listings[doc_id] = dict(listing)
+            added.append(listing)
+        self._append(added)
+        return added
+
+    def add_listing(self, listing):
+        """Appends a new listing. Returns False if the ID is already stored."""
+        return bool(self.add_listings([listing]))
+
+    def _update_record(self, doc_id, fields):
+        self.listings[doc_id].update(fields)
+        record = {"ID": doc_id, "_op": UPDATE_OP}
+        record.update(fields)
+        return record
+
+    def update_listings(self, updates):
+        """Takes (ID, fields) pairs, returns the number of updated listings."""
+        records = [self._update_record(doc_id, fields) for doc_id, fields in updates if doc_id in self.listings]
+        self._append(records)
+        return len(records)
+
+    def update_fields(self, doc_id, fields):
+        """Appends an update record for an existing listing."""
+        return bool(self.update_listings([(doc_id, fields)]))
+
+    def update_prices(self, price_updates):
+        """Takes (ID, price) pairs, returns (ID, old price, new price) for the changed ones."""
+        changed = []
+        records = []
+        for doc_id, new_price in price_updates:
+            existing = self.listings.get(doc_id)
+            if existing is None or existing.get("Preis") == new_price:
+                continue
+            changed.append((doc_id, existing.get("Preis"), new_price))
+            records.append(self._update_record(doc_id, {"Preis": new_price}))
+        self._append(records)
+        return changed
+
+    def update_price(self, doc_id, new_price):
+        """Returns the old price if it changed, otherwise None."""
+        changed = self.update_prices([(doc_id, new_price)])
+        return changed[0][1] if changed else None
+
+    def commit(self):
+        # Appends are flushed as they are written
+        pass
+
+    def maybe_compact(self):
+        if self.line_count < self.min_compact_lines:
+            return
+        if self.line_count > self.compact_ratio * max(len(self.listings), 1):
+            self.compact()
+
+    def compact(self):
+        """Rewrites the file with exactly one line per listing."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as jsonl_file:
+            for listing in self.listings.values():
+                jsonl_file.write(json.dumps(listing, ensure_ascii=False) + "\n")
+        os.replace(tmp_filename, self.filename)
+        self.line_count = len(self.listings)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ListingIndex:
+    """
+    In-memory map of listing ID -> last known price and metadata. Loaded once
+    per crawl so the known-ad checks on search pages are dict lookups instead
+    of dataset scans, and kept current by the pipeline as items arrive.
+    """
+
+    FIELDS = ("Preis", "Date", "Seller_ID")
+
+    def __init__(self, listings=()):
+        self.entries = {}
+        for listing in listings:
+            self.add(listing)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.load_all())
+
+    def add(self, listing):
+        self.entries[listing.get("ID")] = {field: listing.get(field) for field in self.FIELDS}
+
+    def update_price(self, doc_id, new_price):
+        entry = self.entries.get(doc_id)
+        if entry is not None:
+            entry["Preis"] = new_price
+
+    def update(self, doc_id, fields):
+        entry = self.entries.get(doc_id)
+        if entry is not None:
+            entry.update({field: fields[field] for field in self.FIELDS if field in fields})
+
+    def __contains__(self, doc_id):
+        return doc_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, doc_id):
+        return self.entries.get(doc_id)
+
+
+def _iso_date(value):
+    # Dates are scraped as dd.mm.yyyy, which doesn't sort as text
+    try:
+        return datetime.strptime(str(value), '%d.%m.%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+class SqliteListingStore:
+    """
+    SQLite store keyed by listing ID. The full record is kept as JSON next to
+    indexed Preis, Date and Seller_ID columns. Writes are grouped into
+    transactions that are committed every ``batch_size`` operations and on
+    ``close``, which also exports the dataset as JSON array for the viewer.
+    """
+
+    def __init__(self, db_filename, export_filename=None, batch_size=100):
+        self.db_filename = db_filename
+        self.export_filename = export_filename
+        self.batch_size = batch_size
+        self.pending_writes = 0
+
+        os.makedirs(os.path.dirname(db_filename) or ".", exist_ok=True)
+        is_new = not os.path.exists(db_filename)
+        # The pipeline may flush from a worker thread, access is serialized there
+        self.connection = sqlite3.connect(db_filename, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                ID TEXT PRIMARY KEY,
+                Preis INTEGER,
+                Date TEXT,
+                Seller_ID TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_listings_preis ON listings (Preis);
+            CREATE INDEX IF NOT EXISTS idx_listings_date ON listings (Date);
+            CREATE INDEX IF NOT EXISTS idx_listings_seller ON listings (Seller_ID);
+        """)
+
+        # First run on an existing job: import its JSON dataset
+        if is_new and export_filename and os.path.exists(export_filename):
+            imported = self.add_listings(load_listings(export_filename))
+            self.commit()
+            logger.info(f"Imported {len(imported)} listings from {export_filename} into {db_filename}")
+
+    def _row(self, listing):
+        seller_id = listing.get("Seller_ID")
+        return (
+            listing.get("ID"),
+            listing.get("Preis"),
+            _iso_date(listing.get("Date")),
+            str(seller_id) if seller_id is not None else None,
+            json.dumps(listing, ensure_ascii=False),
+        )
+
+    def _written(self, count):
+        self.pending_writes += count
+        if self.pending_writes >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.pending_writes = 0
+
+    def __contains__(self, doc_id):
+        cursor = self.connection.execute("SELECT 1 FROM listings WHERE ID = ?", (doc_id,))
+        return cursor.fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def get(self, doc_id):
+        row = self.connection.execute("SELECT data FROM listings WHERE ID = ?", (doc_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_all(self):
+        cursor = self.connection.execute("SELECT data FROM listings ORDER BY rowid")
+        return [json.loads(row[0]) for row in cursor]
+
+    def add_listings(self, listings):
+        """Inserts new listings in one transaction. Returns the ones that were actually added."""
+        added = []
+        for listing in listings:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO listings (ID, Preis, Date, Seller_ID, data) VALUES (?, ?, ?, ?, ?)",
+                self._row(listing),
+            )
+            if cursor.rowcount == 1:
+                added.append(listing)
+        self._written(len(added))
+        return added
+
+    def add_listing(self, listing):
+        return bool(self.add_listings([listing]))
+
+    def _update(self, listing):
+        self.connection.execute(
+            "UPDATE listings SET Preis = ?, Date = ?, Seller_ID = ?, data = ? WHERE ID = ?",
+            self._row(listing)[1:] + (listing.get("ID"),),
+        )
+
+    def update_listings(self, updates):
+        """Takes (ID, fields) pairs, returns the number of updated listings."""
+        updated = 0
+        for doc_id, fields in updates:
+            listing = self.get(doc_id)
+            if listing is None:
+                continue
+            listing.update(fields)
+            self._update(listing)
+            updated += 1
+        self._written(updated)
+        return updated
+
+    def update_fields(self, doc_id, fields):
+        return bool(self.update_listings([(doc_id, fields)]))
+
+    def update_prices(self, price_updates):
+        """Takes (ID, price) pairs, returns (ID, old price, new price) for the changed ones."""
+        changed = []
+        for doc_id, new_price in price_updates:
+            listing = self.get(doc_id)
+            if listing is None or listing.get("Preis") == new_price:
+                continue
+            changed.append((doc_id, listing.get("Preis"), new_price))
+            listing["Preis"] = new_price
+            self._update(listing)
+        self._written(len(changed))
+        return changed
+
+    def update_price(self, doc_id, new_price):
+        changed = self.update_prices([(doc_id, new_price)])
+        return changed[0][1] if changed else None
+
+    def export_json(self, filename):
+        """Writes the dataset in the JSON array layout of data/*.json."""
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as json_file:
+            json.dump(self.load_all(), json_file, ensure_ascii=False, indent=4)
+        os.replace(tmp_filename, filename)
+
+    def close(self):
+        self.commit()
+        if self.export_filename:
+            self.export_json(self.export_filename)
+        self.connection.close()
+
+
+def open_listing_store(output_filename, engine=None):
+    """
+    Opens the store for a job's output file. Without an explicit engine, the
+    file extension decides (.jsonl or .json). The SQLite database sits next to
+    the output file and exports to it as JSON.
+    """
+    if engine is None:
+        engine = "jsonl" if output_filename.endswith(".jsonl") else "json"
+    if engine not in STORAGE_ENGINES:
+        raise ValueError(f"Unknown storage engine '{engine}', expected one of {STORAGE_ENGINES}")
+
+    if engine == "sqlite":
+        stem = os.path.splitext(output_filename)[0]
+        return SqliteListingStore(stem + ".sqlite", export_filename=stem + ".json")
+    if engine == "jsonl":
+        return JsonlListingStore(output_filename)
+    return JsonListingStore(output_filename)
+
+
+def dataset_filename(output_filename, engine=None):
+    """The file of a job's dataset that load_listings can read."""
+    if engine == "sqlite":
+        return os.path.splitext(output_filename)[0] + ".json"
+    return output_filename
+
+
+def load_listings(filename):
+    """
+    Reads a dataset as a list of listing dicts, whatever its format.
+    Missing or unreadable files yield an empty list.
+    """
+    if not os.path.exists(filename):
+        return []
+    if filename.endswith(".jsonl"):
+        return JsonlListingStore(filename).load_all()
+    try:
+        with open(filename, 'r', encoding='utf-8') as json_file:
+            return json.load(json_file) or []
+    except json.decoder.JSONDecodeError:
+        logger.warning(f"The file {filename} exists but is not a valid JSON file.")
+        return []
+
+
+def convert_json_to_jsonl(json_filename, jsonl_filename=None):
+    """One-time conversion of a legacy JSON array dataset to JSON Lines."""
+    if jsonl_filename is None:
+        jsonl_filename = os.path.splitext(json_filename)[0] + ".jsonl"
+    if os.path.exists(jsonl_filename):
+        raise FileExistsError(f"{jsonl_filename} already exists")
+
+    store = JsonlListingStore(jsonl_filename)
+    for listing in load_listings(json_filename):
+        store.add_listing(listing)
+    store.close()
+    return jsonl_filename, len(store)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Listing storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert JSON datasets to JSON Lines")
+    convert_parser.add_argument("files", nargs="+")
+
+    compact_parser = subparsers.add_parser("compact", help="Compact JSON Lines datasets")
+    compact_parser.add_argument("files", nargs="+")
+
+    args = parser.parse_args(argv)
+
+    for filename in args.files:
+        if args.command == "convert":
+            try:
+                jsonl_filename, count = convert_json_to_jsonl(filename)
+            except FileExistsError as e:
+                print(f"Skipped {filename}: {e}")
+                continue
+            print(f"Converted {count} listings: {filename} -> {jsonl_filename}")
+        elif args.command == "compact":
+            store = JsonlListingStore(filename)
+            lines_before = store.line_count
+            store.compact()
+            print(f"Compacted {filename}: {lines_before} -> {store.line_count} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,31 +21,14 @@ JOBS=(
     "job_gaming_PC_4060.json"
 )
 
-# --- 4. EXECUTION LOOP ---
+# --- 4. EXECUTION ---
+# All jobs run in a single Scrapy process that shares one concurrency budget,
+# so there is no start-up cost or sleep between jobs. A summary table is
+# printed at the end.
 echo "=========================================="
 echo "Starting Scraper Batch Run"
 echo "=========================================="
 
-for job_file in "${JOBS[@]}"
-do
-    full_path="jobs/$job_file"
-
-    if [ -f "$full_path" ]; then
-        echo ">>> Running Job: $job_file"
-        
-        # Run the spider with the specific config
-        scrapy crawl kleinanzeigen_scraper -a job_config="$full_path"
-        
-        echo ">>> Finished: $job_file"
-        echo "------------------------------------------"
-        
-        # OPTIONAL: Sleep for 5 seconds between jobs to be polite to the server
-        # and reduce the risk of IP bans.
-        sleep 5
-    else
-        echo "!!! ERROR: Config file not found: $full_path"
-        echo "------------------------------------------"
-    fi
-done
+python -m ebay_scraper.runner "${JOBS[@]}"
 
 echo "Batch Run Complete."